@@ -0,0 +1,116 @@
+"""Maintenance commands for the Twitter Clone backend.
+
+Run from the backend directory, e.g. ``python -m app.cli repair-counters``.
+"""
+import argparse
+from pathlib import Path
+
+from .models.database import AVATARS_DIR, SessionLocal, engine
+from .models.migrations import get_schema_version
+from .startup import prepare
+from .utils.conditional import TWEETS, USERS, bump_versions
+from .utils.counters import repair_tweet_counters, repair_user_counters
+from .utils.entities import backfill_tweet_entities, ENTITY_BACKFILL_CHUNK_SIZE
+from .utils.images import AVATAR_GC_GRACE_SECONDS, collect_avatars
+from .utils.logging_config import configure_logging
+from .utils.search import rebuild_search_index
+from .utils.timeline import rebuild_timelines
+
+def mark_changed(db, *names):
+    # Responses cached by clients may be outdated now
+    bump_versions(db, *names)
+    db.commit()
+
+def repair_counters(args):
+    db = SessionLocal()
+    try:
+        tweets = repair_tweet_counters(db)
+        users = repair_user_counters(db)
+        mark_changed(db, TWEETS, USERS)
+    finally:
+        db.close()
+    print(f"Recomputed counters for {tweets} tweets and {users} users")
+
+def rebuild_home_timelines(args):
+    db = SessionLocal()
+    try:
+        entries = rebuild_timelines(db)
+        mark_changed(db, USERS)
+    finally:
+        db.close()
+    print(f"Rebuilt home timelines with {entries} entries")
+
+def rebuild_search(args):
+    db = SessionLocal()
+    try:
+        rebuild_search_index(db)
+        mark_changed(db, TWEETS)
+    finally:
+        db.close()
+    print("Rebuilt the tweet search index")
+
+def backfill_entities(args):
+    db = SessionLocal()
+    try:
+        processed = backfill_tweet_entities(db, args.chunk_size)
+        mark_changed(db, TWEETS)
+    finally:
+        db.close()
+    print(f"Indexed hashtags and mentions of {processed} tweets")
+
+def gc_avatars(args):
+    db = SessionLocal()
+    try:
+        deleted = collect_avatars(db, Path(AVATARS_DIR), args.grace_seconds)
+    finally:
+        db.close()
+    print(f"Deleted {deleted} unused profile picture files")
+
+def migrate(args):
+    applied = prepare()
+    print(f"Applied {len(applied)} migrations, schema is at version {get_schema_version(engine)}")
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Twitter Clone maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser(
+        "migrate",
+        help="Create the data directories and database schema, and apply pending migrations"
+    ).set_defaults(func=migrate)
+
+    subparsers.add_parser(
+        "repair-counters",
+        help="Recompute tweet reply/reaction and user follow counters from the source tables"
+    ).set_defaults(func=repair_counters)
+
+    subparsers.add_parser(
+        "rebuild-timelines",
+        help="Recreate the materialized home timelines from the followers and tweets tables"
+    ).set_defaults(func=rebuild_home_timelines)
+
+    subparsers.add_parser(
+        "rebuild-search",
+        help="Reindex the content of every tweet for full-text search"
+    ).set_defaults(func=rebuild_search)
+
+    backfill_parser = subparsers.add_parser(
+        "backfill-entities",
+        help="Index the hashtags and mentions of existing tweets"
+    )
+    backfill_parser.add_argument("--chunk-size", type=int, default=ENTITY_BACKFILL_CHUNK_SIZE, help="Tweets indexed per transaction")
+    backfill_parser.set_defaults(func=backfill_entities)
+
+    gc_parser = subparsers.add_parser(
+        "gc-avatars",
+        help="Delete stored profile pictures that no user points at anymore"
+    )
+    gc_parser.add_argument("--grace-seconds", type=float, default=AVATAR_GC_GRACE_SECONDS, help="Keep files changed more recently than this")
+    gc_parser.set_defaults(func=gc_avatars)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,98 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from pathlib import Path
+from fastapi.responses import HTMLResponse, JSONResponse
+from anyio import to_thread
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 import os
+from pathlib import Path
 
-from .models.database import Base, engine, run_migrations
-from .routers import user, tweet, profile
+from .models.database import AVATARS_DIR, SessionLocal, THREADPOOL_SIZE, UPLOADS_DIR
+from .routers import user, tweet, profile, trends, events
+from .startup import MIGRATE_ON_STARTUP, prepare
+from .utils.auth import auth_cache_stats
+from .utils.events import event_hub
+from .utils.images import AVATAR_GC_INTERVAL_SECONDS, collect_avatars
+from .utils.logging_config import configure_logging
+from .utils.pagination import NEXT_CURSOR_HEADER
+from .utils.response_cache import feed_cache
+from .utils.security import password_hasher, PasswordHasherBusy, PASSWORD_HASH_RETRY_AFTER
+from .utils.static import ImmutableStaticFiles, PrecompressedStaticFiles, SpaShell, precompress_directory
+from .utils.trends import trending_hashtags, TRENDS_SNAPSHOT_SECONDS
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Level and format come from LOG_LEVEL and LOG_FORMAT
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# The React build, served by the backend when it is present (nginx serves it in Docker)
+frontend_build_path = os.path.join(os.path.dirname(__file__), "../../../frontend/build")
+frontend_static_path = os.path.join(frontend_build_path, "static")
 
-# Run migrations to update database schema
-run_migrations()
+async def save_trends_periodically():
+    while True:
+        await asyncio.sleep(TRENDS_SNAPSHOT_SECONDS)
+        try:
+            await to_thread.run_sync(trending_hashtags.save_snapshot)
+        except OSError:
+            logger.warning("Could not save the trends snapshot", exc_info=True)
 
-# Create uploads directory if it doesn't exist
-uploads_dir = os.environ.get("UPLOADS_DIR", "uploads")
-Path(uploads_dir).mkdir(exist_ok=True)
+def collect_unused_avatars():
+    db = SessionLocal()
+    try:
+        collect_avatars(db, Path(AVATARS_DIR))
+    finally:
+        db.close()
 
-# Also create it in current working directory for tests
-Path().joinpath("uploads").mkdir(exist_ok=True)
+async def collect_avatars_periodically():
+    while True:
+        await asyncio.sleep(AVATAR_GC_INTERVAL_SECONDS)
+        try:
+            await to_thread.run_sync(collect_unused_avatars)
+        except Exception:
+            logger.warning("Could not collect unused avatars", exc_info=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the data directories and apply pending migrations, unless a
+    # process manager already did it once for all workers
+    if MIGRATE_ON_STARTUP:
+        prepare()
+    
+    # Routes and dependencies using the database are plain functions, which
+    # FastAPI runs in this threadpool instead of on the event loop
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
+    # Trending hashtag counters survive restarts and are merged with the
+    # other workers' through periodic snapshots
+    trending_hashtags.load_snapshot()
+    snapshot_task = asyncio.create_task(save_trends_periodically())
+    
+    # Relays events from the other workers, when they share Redis
+    event_hub.start()
+    
+    # Compressed once here, the build's assets are then served as they are
+    if os.path.isdir(frontend_static_path):
+        try:
+            await to_thread.run_sync(precompress_directory, frontend_static_path)
+        except OSError:
+            logger.warning("Could not precompress the frontend assets", exc_info=True)
+    
+    # Replaced profile pictures are deleted once nothing points at them
+    gc_task = asyncio.create_task(collect_avatars_periodically()) if AVATAR_GC_INTERVAL_SECONDS > 0 else None
+    yield
+    if gc_task is not None:
+        gc_task.cancel()
+    await to_thread.run_sync(event_hub.stop)
+    snapshot_task.cancel()
+    await to_thread.run_sync(trending_hashtags.save_snapshot)
 
 app = FastAPI(
     title="Twitter Clone API",
     description="A simple Twitter clone API built with FastAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -34,31 +102,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Login and registration bursts beyond the hashing pool's capacity get a fast 503
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+    )
+
 # Include routers
 app.include_router(user.router)
 app.include_router(tweet.router)
 app.include_router(profile.router)
+app.include_router(trends.router)
+app.include_router(events.router)
 
-# Mount static files directory for uploads
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Mount static files directory for uploads; profile pictures are named by
+# their content, so they can be cached for good
+app.mount("/uploads/avatars", ImmutableStaticFiles(directory=AVATARS_DIR, check_dir=False), name="avatars")
+app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR, check_dir=False), name="uploads")
 
-# Check if we're running in Docker with frontend build
-frontend_build_path = os.path.join(os.path.dirname(__file__), "../../../frontend/build")
 if os.path.exists(frontend_build_path):
-    # Serve React frontend
-    app.mount("/static", StaticFiles(directory=os.path.join(frontend_build_path, "static")), name="static")
+    # Serve React frontend; its asset names carry content hashes
+    app.mount("/static", PrecompressedStaticFiles(directory=frontend_static_path), name="static")
+    spa_shell = SpaShell(os.path.join(frontend_build_path, "index.html"))
     
     @app.get("/{full_path:path}", response_class=HTMLResponse)
     async def serve_react_app(request: Request, full_path: str = ""):
         # Don't serve React app for API routes
         if full_path.startswith("api") or full_path == "docs" or full_path == "redoc":
             raise HTTPException(status_code=404, detail="API endpoint not found")
-            
-        index_path = os.path.join(frontend_build_path, "index.html")
-        with open(index_path, "r") as f:
-            return f.read()
+        
+        # From memory, reloaded when a new build replaces the file
+        return await spa_shell.response(request)
 
 @app.get("/")
 async def root():
@@ -66,4 +146,13 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
\ No newline at end of file
+    return {"status": "healthy", "version": "1.0.0"}
+
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "password_hashing": password_hasher.stats(),
+        "auth_cache": auth_cache_stats(),
+        "feed_cache": feed_cache.stats(),
+        "events": event_hub.stats()
+    }
\ No newline at end of file
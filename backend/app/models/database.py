@@ -1,115 +1,96 @@
-from sqlalchemy import create_engine
+from anyio import Semaphore, to_thread
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import sqlite3
+from sqlalchemy.pool import StaticPool
 import os
 
-# Directory for configuration files
+# Directory for configuration files; created by app.startup.prepare
 CONFIG_DIR = os.environ.get("CONFIG_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config"))
-os.makedirs(CONFIG_DIR, exist_ok=True)
+
+# Directory for uploaded files, served under /uploads
+UPLOADS_DIR = os.environ.get("UPLOADS_DIR", "uploads")
+
+# Profile pictures, named by content hash and served under /uploads/avatars
+AVATARS_DIR = os.path.join(UPLOADS_DIR, "avatars")
 
 # SQLite database location
 DB_FILE = os.path.join(CONFIG_DIR, "twitter_clone.db")
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_FILE}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite connection tuning
+DB_JOURNAL_MODE = os.environ.get("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", str(64 * 1024)))
+
+# Connection pool for file databases
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# Requests holding a database session at once; kept within the connection
+# pool so a request never blocks a worker thread waiting for a connection
+DB_MAX_SESSIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+# Worker threads running the synchronous routes and dependencies
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", str(DB_MAX_SESSIONS)))
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, **kwargs):
+    """Create an engine tuned for concurrent readers and a single writer.
+
+    File databases run in WAL mode behind a bounded QueuePool, so readers are
+    not blocked by a committing writer. In-memory databases exist per
+    connection, so they use a StaticPool sharing one connection across threads.
+    Extra keyword arguments are passed on to create_engine.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, **kwargs)
+
+    in_memory = url.database in (None, "", ":memory:")
+    if in_memory:
+        kwargs.setdefault("poolclass", StaticPool)
+    else:
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.setdefault("check_same_thread", False)
+    db_engine = create_engine(url, connect_args=connect_args, **kwargs)
+
+    @event.listens_for(db_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        # A negative cache_size is expressed in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        cursor.close()
+
+    return db_engine
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+session_slots = Semaphore(DB_MAX_SESSIONS)
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Function to check if a column exists in a table
-def check_column_exists(table_name, column_name):
-    # Check if database file exists
-    if not os.path.exists(DB_FILE):
-        return False
-        
-    # Connect to SQLite database
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Query to get table info
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = cursor.fetchall()
-    
-    # Close connection
-    conn.close()
-    
-    # Check if column exists
-    return any(column[1] == column_name for column in columns)
-
-# Function to add a column to a table if it doesn't exist
-def add_column_if_not_exists(table_name, column_name, column_type):
-    # Check if database file exists
-    if not os.path.exists(DB_FILE):
-        return
-        
-    if not check_column_exists(table_name, column_name):
-        # Connect to SQLite database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Add column
-        try:
-            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
-            conn.commit()
-            print(f"Added column {column_name} to table {table_name}")
-        except Exception as e:
-            print(f"Error adding column: {e}")
-        
-        # Close connection
-        conn.close()
-
-# Function to create followers table if it doesn't exist
-def create_followers_table():
-    # Check if database file exists
-    if not os.path.exists(DB_FILE):
-        return
-        
-    # Connect to SQLite database
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Check if followers table exists
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='followers'")
-    if not cursor.fetchone():
+async def get_db():
+    # Requests over the limit wait here, on the event loop, rather than in a
+    # worker thread while holding a connection another request is waiting for.
+    # Routes using the session are plain functions run in the threadpool.
+    async with session_slots:
+        db = SessionLocal()
         try:
-            cursor.execute("""
-            CREATE TABLE followers (
-                follower_id INTEGER NOT NULL,
-                followed_id INTEGER NOT NULL,
-                PRIMARY KEY (follower_id, followed_id),
-                FOREIGN KEY(follower_id) REFERENCES users(id),
-                FOREIGN KEY(followed_id) REFERENCES users(id)
-            )
-            """)
-            conn.commit()
-            print("Created followers table")
-        except Exception as e:
-            print(f"Error creating followers table: {e}")
-    
-    # Close connection
-    conn.close()
-
-# Run migrations
-def run_migrations():
-    try:
-        # Add profile_picture column if it doesn't exist
-        add_column_if_not_exists("users", "profile_picture", "TEXT")
-        
-        # Create followers table if it doesn't exist
-        create_followers_table()
-        
-        # Add parent_id column to tweets table for reply functionality
-        add_column_if_not_exists("tweets", "parent_id", "INTEGER")
-    except Exception as e:
-        print(f"Migration error: {e}")
\ No newline at end of file
+            yield db
+        finally:
+            await to_thread.run_sync(db.close)
@@ -0,0 +1,174 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, name)``
+that receives a SQLAlchemy connection inside a transaction. Applied versions
+are recorded in the ``schema_migrations`` table, so ``run_migrations`` only
+executes the steps a database has not seen yet. Steps must still be
+idempotent: a fresh database gets the current model schema from the first
+migration, and later steps then find their columns and indexes already there.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import func
+from typing import Callable, List, Optional, Tuple
+import logging
+
+from .database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata so only the runner manages it
+schema_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now())
+)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+def migration(version: int, name: str):
+    """Register a migration step; versions must be added in increasing order"""
+    def register(func):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} registered after {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((version, name, func))
+        return func
+    return register
+
+def column_exists(conn: Connection, table_name: str, column_name: str) -> bool:
+    return any(column["name"] == column_name for column in inspect(conn).get_columns(table_name))
+
+def add_column_if_not_exists(conn: Connection, table_name: str, column_name: str, column_type: str) -> bool:
+    if column_exists(conn, table_name, column_name):
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+    logger.info("Added column %s to table %s", column_name, table_name)
+    return True
+
+def create_index(conn: Connection, table_name: str, index_name: str):
+    """Create an index declared on the models if the database lacks it"""
+    index = next(index for index in Base.metadata.tables[table_name].indexes if index.name == index_name)
+    index.create(bind=conn, checkfirst=True)
+
+@migration(1, "initial_schema")
+def initial_schema(conn: Connection):
+    # Create missing tables (all of them on a fresh database)
+    Base.metadata.create_all(bind=conn)
+
+@migration(2, "user_profile_picture")
+def user_profile_picture(conn: Connection):
+    add_column_if_not_exists(conn, "users", "profile_picture", "TEXT")
+
+@migration(3, "tweet_parent_id")
+def tweet_parent_id(conn: Connection):
+    # Reply functionality
+    add_column_if_not_exists(conn, "tweets", "parent_id", "INTEGER")
+
+@migration(4, "tweet_counters")
+def tweet_counters(conn: Connection):
+    from ..utils.counters import tweet_counters_update
+
+    added = [
+        add_column_if_not_exists(conn, "tweets", column_name, "INTEGER NOT NULL DEFAULT 0")
+        for column_name in ("replies_count", "likes_count", "dislikes_count")
+    ]
+    if any(added):
+        conn.execute(tweet_counters_update())
+
+@migration(5, "tweet_feed_indexes")
+def tweet_feed_indexes(conn: Connection):
+    # Feed and reply listings (parent_id prefix) and profile feeds (author_id prefix)
+    create_index(conn, "tweets", "ix_tweets_feed")
+    create_index(conn, "tweets", "ix_tweets_author_feed")
+
+@migration(6, "reaction_and_follower_indexes")
+def reaction_and_follower_indexes(conn: Connection):
+    create_index(conn, "tweet_reactions", "ix_tweet_reactions_tweet_id")
+    # The follower index created here is superseded in migration 8
+
+@migration(7, "user_follow_counters")
+def user_follow_counters(conn: Connection):
+    from ..utils.counters import user_counters_update
+
+    added = [
+        add_column_if_not_exists(conn, "users", column_name, "INTEGER NOT NULL DEFAULT 0")
+        for column_name in ("followers_count", "following_count")
+    ]
+    if any(added):
+        conn.execute(user_counters_update())
+
+@migration(8, "follow_timestamps")
+def follow_timestamps(conn: Connection):
+    # SQLite cannot add a column with a CURRENT_TIMESTAMP default, so existing
+    # follows get the migration time and new ones the model's insert default
+    if add_column_if_not_exists(conn, "followers", "created_at", "DATETIME"):
+        conn.exec_driver_sql("UPDATE followers SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_followers_followed_id")
+    create_index(conn, "followers", "ix_followers_followed_feed")
+    create_index(conn, "followers", "ix_followers_follower_feed")
+
+@migration(9, "home_timelines")
+def home_timelines(conn: Connection):
+    from ..utils.timeline import ENTRY_COLUMNS, timeline_rebuild_select
+
+    timeline_entries = Base.metadata.tables["timeline_entries"]
+    timeline_entries.create(bind=conn, checkfirst=True)
+    # The initial schema step may have just created the table on an upgraded
+    # database, so fill it whenever it is empty rather than only when created here
+    if conn.execute(select(timeline_entries.c.user_id).limit(1)).first() is None:
+        conn.execute(timeline_entries.insert().from_select(ENTRY_COLUMNS, timeline_rebuild_select()))
+    # Finds the few accounts merged into timelines on read
+    create_index(conn, "users", "ix_users_followers_count")
+
+@migration(10, "tweet_search")
+def tweet_search(conn: Connection):
+    from .models import TWEET_SEARCH_DDL
+
+    for statement in TWEET_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    # Index the tweets written before the triggers existed
+    conn.exec_driver_sql("INSERT INTO tweets_fts (tweets_fts) VALUES ('rebuild')")
+
+@migration(11, "tweet_entities")
+def tweet_entities(conn: Connection):
+    # Existing tweets are indexed by the chunked backfill-entities command
+    for table_name in ("tweet_hashtags", "tweet_mentions"):
+        Base.metadata.tables[table_name].create(bind=conn, checkfirst=True)
+
+@migration(12, "change_versions")
+def change_versions(conn: Connection):
+    # Missing rows read as version 0 until the first write
+    Base.metadata.tables["change_versions"].create(bind=conn, checkfirst=True)
+
+def get_schema_version(bind: Engine) -> int:
+    """Return the highest applied migration version, 0 for an unmigrated database"""
+    with bind.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return 0
+        return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+def run_migrations(bind: Optional[Engine] = None) -> List[int]:
+    """Apply pending migrations in order and return the versions applied"""
+    bind = bind if bind is not None else engine
+    schema_metadata.create_all(bind=bind)
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        # One transaction per step, re-checking the version inside it
+        with bind.begin() as conn:
+            already_applied = conn.execute(
+                select(schema_migrations.c.version).where(schema_migrations.c.version == version)
+            ).first()
+            if already_applied:
+                continue
+
+            step(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name))
+            applied.append(version)
+            logger.info("Applied migration %s: %s", version, name)
+
+    return applied
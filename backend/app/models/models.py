@@ -1,5 +1,5 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Table, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import DDL, Boolean, Column, Float, ForeignKey, Index, Integer, String, DateTime, Table, Text, event
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.sql import func
 
 from .database import Base
@@ -9,7 +9,13 @@ followers = Table(
     "followers",
     Base.metadata,
     Column("follower_id", Integer, ForeignKey("users.id"), primary_key=True),
-    Column("followed_id", Integer, ForeignKey("users.id"), primary_key=True)
+    Column("followed_id", Integer, ForeignKey("users.id"), primary_key=True),
+    # Follow time; the Python-side default also covers databases where the
+    # column was added by a migration without a server default
+    Column("created_at", DateTime(timezone=True), default=func.now(), server_default=func.now()),
+    # Keyset pagination of a user's followers and following, newest first
+    Index("ix_followers_followed_feed", "followed_id", "created_at", "follower_id"),
+    Index("ix_followers_follower_feed", "follower_id", "created_at", "followed_id")
 )
 
 # Association table for tweet reactions (likes/dislikes)
@@ -18,7 +24,39 @@ tweet_reactions = Table(
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("tweet_id", Integer, ForeignKey("tweets.id"), primary_key=True),
-    Column("reaction_type", String, nullable=False)  # "like" or "dislike"
+    Column("reaction_type", String, nullable=False),  # "like" or "dislike"
+    # The primary key only serves lookups by user
+    Index("ix_tweet_reactions_tweet_id", "tweet_id", "reaction_type")
+)
+
+# Inverted indexes of the hashtags and mentions in tweet content. created_at
+# is copied from the tweet, so tag and mention pages never join tweets.
+tweet_hashtags = Table(
+    "tweet_hashtags",
+    Base.metadata,
+    Column("tag", String, primary_key=True),  # lowercase, without the "#"
+    Column("tweet_id", Integer, ForeignKey("tweets.id"), primary_key=True),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Index("ix_tweet_hashtags_feed", "tag", "created_at", "tweet_id")
+)
+
+tweet_mentions = Table(
+    "tweet_mentions",
+    Base.metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("tweet_id", Integer, ForeignKey("tweets.id"), primary_key=True),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Index("ix_tweet_mentions_feed", "user_id", "created_at", "tweet_id")
+)
+
+# One row per kind of data ("tweets", "users"), bumped in the same transaction
+# as every write to it. The versions are the validators of conditional GETs.
+change_versions = Table(
+    "change_versions",
+    Base.metadata,
+    Column("name", String, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("modified_at", Float, nullable=False)  # Unix time of the last bump
 )
 
 class User(Base):
@@ -31,17 +69,23 @@ class User(Base):
     profile_picture = Column(String, nullable=True, default=None)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)
+    
+    # Denormalized counters, maintained on write by follow/unfollow
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     tweets = relationship("Tweet", back_populates="author")
     
-    # Followers relationship
+    # Followers relationship; both sides are queries, so nothing loads a
+    # whole follower list implicitly. Use the counters for sizes.
     followers = relationship(
         "User", 
         secondary=followers,
         primaryjoin=(followers.c.followed_id == id),
         secondaryjoin=(followers.c.follower_id == id),
-        backref="following"
+        lazy="dynamic",
+        backref=backref("following", lazy="dynamic")
     )
     
     # Tweet reactions relationship
@@ -56,7 +100,52 @@ class Tweet(Base):
     author_id = Column(Integer, ForeignKey("users.id"))
     parent_id = Column(Integer, ForeignKey("tweets.id"), nullable=True)
     
+    # Denormalized counters, maintained on write by the tweet router
+    replies_count = Column(Integer, nullable=False, default=0, server_default="0")
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    dislikes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Relationships
     author = relationship("User", back_populates="tweets")
     replies = relationship("Tweet", backref="parent", remote_side=[id])
-    reacted_by = relationship("User", secondary=tweet_reactions, back_populates="tweet_reactions")
\ No newline at end of file
+    reacted_by = relationship("User", secondary=tweet_reactions, back_populates="tweet_reactions")
+    
+    # Composite indexes backing keyset pagination of the feeds, newest first
+    __table_args__ = (
+        Index("ix_tweets_feed", "parent_id", "created_at", "id"),
+        Index("ix_tweets_author_feed", "author_id", "parent_id", "created_at", "id"),
+    )
+
+class TimelineEntry(Base):
+    """A tweet materialized into a follower's home timeline on write"""
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tweet_id = Column(Integer, ForeignKey("tweets.id"), primary_key=True)
+    # Copied from the tweet, so pages and unfollow pruning never join tweets
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_timeline_entries_feed", "user_id", "created_at", "tweet_id"),
+        Index("ix_timeline_entries_author", "user_id", "author_id"),
+    )
+
+# Full-text index over tweet content: an external-content FTS5 table kept in
+# sync by triggers, so every write to tweets updates it in the same transaction
+TWEET_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts USING fts5("
+    "content, content='tweets', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN "
+    "INSERT INTO tweets_fts (rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN "
+    "INSERT INTO tweets_fts (tweets_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    # Only content changes touch the index, not the counter updates
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF content ON tweets BEGIN "
+    "INSERT INTO tweets_fts (tweets_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO tweets_fts (rowid, content) VALUES (new.id, new.content); END",
+]
+
+for statement in TWEET_SEARCH_DDL:
+    event.listen(Tweet.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Tweet.__table__, "before_drop", DDL("DROP TABLE IF EXISTS tweets_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+import os
+
+from ..utils.events import event_hub, Subscription, TooManySubscribers
+
+# How long EventSource clients wait before reconnecting
+EVENTS_RETRY_MS = int(os.environ.get("EVENTS_RETRY_MS", "3000"))
+
+class EventStreamResponse(StreamingResponse):
+    """Closes the stream's subscription once the response is done, even when
+    the body was never read, as a generator that never started can't clean up"""
+
+    def __init__(self, content, subscription: Subscription, **kwargs):
+        super().__init__(content, **kwargs)
+        self.subscription = subscription
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            event_hub.unsubscribe(self.subscription)
+
+router = APIRouter(
+    prefix="/api/events",
+    tags=["events"],
+)
+
+@router.get("/")
+async def stream_events():
+    """Server-Sent Events stream of new tweets and reaction counts.
+
+    Sends "tweet" events with the new tweet as JSON, and "reaction" events with
+    a tweet's id, likes_count and dislikes_count. The stream ends if the client
+    falls too far behind; reconnect and reload the feed.
+    """
+    # Subscribing here, on the event loop, lets a full hub answer with a 503
+    try:
+        subscription = event_hub.subscribe()
+    except TooManySubscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams",
+            headers={"Retry-After": str(EVENTS_RETRY_MS // 1000 or 1)}
+        )
+
+    async def stream():
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            event = await subscription.get()
+            if event is None:
+                # Dropped for falling behind
+                return
+            yield event.sse
+
+    return EventStreamResponse(
+        stream(),
+        subscription,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Don't let nginx buffer the stream
+            "X-Accel-Buffering": "no",
+        }
+    )
@@ -1,15 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Form, UploadFile
 from sqlalchemy.orm import Session
-import shutil
+from starlette.formparsers import MultiPartException
+import io
 import os
-from typing import List
+import logging
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
 import base64
 from pathlib import Path
 
-from ..models.database import get_db
-from ..models.models import User
-from ..schemas.user import UserProfile, UserUpdate, UserFollow, UserWithFollowers, FollowUser, UserPublic
-from ..utils.auth import get_current_user, get_current_user_optional
+from ..models.database import AVATARS_DIR, get_db
+from ..models.models import User, followers
+from ..schemas.user import TokenData, UserProfile, UserUpdate, UserFollow, UserWithFollowers, FollowUser, UserPublic
+from ..utils.auth import credentials_exception, get_current_user, get_current_user_optional, get_token_data, invalidate_user, load_user
+from ..utils.cache import create_cache
+from ..utils.conditional import USERS, bump_versions, check_not_modified, read_versions
+from ..utils.counters import adjust_follow_counts
+from ..utils.images import AVATAR_MAX_BYTES, AVATAR_URL_PREFIX, InvalidImage, UploadTooLarge, mark_superseded, process_avatar, read_upload
+from ..utils.pagination import paginate_keyset, NEXT_CURSOR_HEADER
+from ..utils.response_cache import feed_cache
+from ..utils.timeline import backfill_timeline, prune_timeline, resume_fan_out
+
+logger = logging.getLogger(__name__)
+
+# Public profile data by username, dropped by the writes that change it
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", "60"))
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "10000"))
+profile_cache = create_cache("profile", PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
 
 router = APIRouter(
     prefix="/api/profile",
@@ -17,186 +33,261 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Created by app.startup.prepare
+AVATAR_DIR = Path(AVATARS_DIR)
+
+def get_profile_data(db: Session, username: str, users_version: int) -> Optional[dict]:
+    """The public part of a user's profile, cached by username; None if there is no such user.
+
+    Entries remember the "users" version they were loaded at, and one loaded
+    at another version is loaded again. The cache may be another worker's or
+    miss an invalidation, and the ETag sent with the body comes from the
+    version, so a body older than it must not be served.
+    """
+    entry = profile_cache.get(username)
+    if entry is not None and entry["version"] == users_version:
+        return entry["profile"]
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        return None
+    # Stored counters, maintained by follow/unfollow
+    profile = {
+        "id": user.id,
+        "username": user.username,
+        "profile_picture": user.profile_picture,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "is_active": user.is_active,
+        "follower_count": user.followers_count,
+        "following_count": user.following_count
+    }
+    profile_cache.set(username, {"version": users_version, "profile": profile})
+    return profile
+
+def invalidate_profiles(*usernames: str):
+    """Drop cached profiles; call after changing their fields or counters"""
+    for username in usernames:
+        profile_cache.delete(username)
 
 @router.get("/me", response_model=UserProfile)
-async def get_my_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Count followers and following
-    follower_count = len(current_user.followers)
-    following_count = len(current_user.following)
+def get_my_profile(request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # The body is built against the versions the validators come from
+    versions = read_versions(db, [USERS])
+    not_modified = check_not_modified(db, request, response, [USERS], current_user, versions)
+    if not_modified:
+        return not_modified
     
-    return {
-        "id": current_user.id,
-        "username": current_user.username,
-        "profile_picture": current_user.profile_picture,
-        "created_at": current_user.created_at,
-        "is_active": current_user.is_active,
-        "follower_count": follower_count,
-        "following_count": following_count
-    }
+    return get_profile_data(db, current_user.username, versions.get(USERS, (0, 0))[0])
 
 @router.get("/{username}", response_model=UserProfile)
-async def get_user_profile(
+def get_user_profile(
     username: str, 
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional)
 ):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+    # The body is built against the versions the validators come from
+    versions = read_versions(db, [USERS])
+    profile = get_profile_data(db, username, versions.get(USERS, (0, 0))[0])
+    if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Count followers and following
-    follower_count = len(user.followers)
-    following_count = len(user.following)
-    
-    # Check authentication status
-    print(f"\nDEBUG - Authentication status: {'Authenticated' if current_user else 'Not authenticated'}")
+    not_modified = check_not_modified(db, request, response, [USERS], current_user, versions)
+    if not_modified:
+        return not_modified
     
     # Check if the current user is following this profile
     is_followed = False
-    if current_user and current_user.id != user.id:
-        # Print debug information
-        print(f"DEBUG - Current user: {current_user.username} (ID: {current_user.id})")
-        print(f"DEBUG - Profile user: {user.username} (ID: {user.id})")
-        
+    if current_user and current_user.id != profile["id"]:
         # Check directly from the database using the followers association table
         from sqlalchemy import select, exists
         from ..models.models import followers
         
         # Query to check if current_user is following user
         stmt = select(exists().where(followers.c.follower_id == current_user.id)
-                              .where(followers.c.followed_id == user.id))
+                              .where(followers.c.followed_id == profile["id"]))
         result = db.execute(stmt).scalar()
         
         is_followed = bool(result)
-        
-        print(f"DEBUG - Direct SQL check - is_followed: {is_followed}")
-        
-        # List all followers for this user to verify relationship
-        print(f"DEBUG - Listing all followers for {user.username}:")
-        for follower in user.followers:
-            print(f"  - {follower.username} (ID: {follower.id})")
     
-    response = {
-        "id": user.id,
-        "username": user.username,
-        "profile_picture": user.profile_picture,
-        "created_at": user.created_at,
-        "is_active": user.is_active,
-        "follower_count": follower_count,
-        "following_count": following_count,
-        "is_followed": is_followed
-    }
+    logger.debug("Profile %s viewed by user %s, is_followed=%s", profile["id"], current_user.id if current_user else None, is_followed)
     
-    print(f"DEBUG - API response is_followed: {is_followed}")
+    # The viewer-specific flag is added to a copy of the shared profile
+    return dict(profile, is_followed=is_followed)
+
+def store_profile_picture(source: BinaryIO) -> Dict[str, str]:
+    """Store an uploaded picture with its thumbnails; returns process_avatar's file names"""
+    try:
+        return process_avatar(source, AVATAR_DIR)
+    except InvalidImage as e:
+        # The reason can quote the file object, so it is only logged
+        logger.info("Rejected profile picture: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid image file"
+        )
+
+def save_profile_picture(db: Session, current_user: User, files: Dict[str, str]) -> dict:
+    """Point the user at a stored profile picture"""
+    # Update the user record with the profile picture path
+    previous_picture = current_user.profile_picture
+    current_user.profile_picture = AVATAR_URL_PREFIX + files.pop("original")
+    bump_versions(db, USERS)
+    own_username = current_user.username
+    db.commit()
+    invalidate_user(current_user.id)
+    invalidate_profiles(own_username)
+    if previous_picture != current_user.profile_picture:
+        mark_superseded(AVATAR_DIR, previous_picture)
+        # Anonymous feed pages may embed the old picture with ?expand=author
+        feed_cache.invalidate()
     
-    return response
+    return {
+        "message": "Profile picture updated successfully",
+        "profile_picture": current_user.profile_picture,
+        "thumbnails": {size: AVATAR_URL_PREFIX + name for size, name in files.items()}
+    }
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Profile pictures are limited to {AVATAR_MAX_BYTES} bytes"
+    )
+
+async def avatar_upload(request: Request) -> AsyncIterator[UploadFile]:
+    """The uploaded file, parsed on the event loop so the body can be cut off
+    at the size cap while it is still arriving"""
+    try:
+        upload = await read_upload(request, "file")
+    except UploadTooLarge:
+        raise upload_too_large()
+    except (MultiPartException, KeyError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart form with the image in its file field"
+        )
+    try:
+        yield upload
+    finally:
+        await upload.close()
+
+def stored_avatar(upload: UploadFile = Depends(avatar_upload)) -> Dict[str, str]:
+    """The uploaded picture, validated and stored"""
+    return store_profile_picture(upload.file)
+
+@router.post("/picture", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+})
+def upload_profile_picture(
+    token_data: TokenData = Depends(get_token_data),
+    files: Dict[str, str] = Depends(stored_avatar),
+    db: Session = Depends(get_db)
+):
+    # Dependencies are resolved in order: the token is checked before the
+    # body is read, and a session slot is only taken once the picture is stored
+    current_user = load_user(db, token_data.user_id)
+    if current_user is None:
+        raise credentials_exception()
+    return save_profile_picture(db, current_user, files)
 
 @router.post("/update-profile-picture")
-async def update_profile_picture(
+def update_profile_picture(
     profile_picture: str = Form(...),
     current_user: User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    # The profile_picture is expected to be a base64 encoded image string
+    # Older clients send the image as a base64 encoded string
+    # Remove header part (e.g., "data:image/png;base64,")
+    if "," in profile_picture:
+        profile_picture = profile_picture.split(",")[1]
+    
+    if len(profile_picture) * 3 // 4 > AVATAR_MAX_BYTES:
+        raise upload_too_large()
     try:
-        # Remove header part (e.g., "data:image/png;base64,")
-        if "," in profile_picture:
-            profile_picture = profile_picture.split(",")[1]
-        
-        # Generate a unique filename based on username
-        file_name = f"profile_{current_user.id}.jpg"
-        file_path = UPLOAD_DIR / file_name
-        
-        # Decode and save the image
-        try:
-            img_data = base64.b64decode(profile_picture)
-            with open(file_path, "wb") as f:
-                f.write(img_data)
-        except Exception as e:
-            print(f"Error decoding/saving image: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid image data: {str(e)}"
-            )
-            
-        # Update the user record with the profile picture path
-        current_user.profile_picture = f"/uploads/{file_name}"
-        db.commit()
-        
-        return {"message": "Profile picture updated successfully", "profile_picture": current_user.profile_picture}
-    except Exception as e:
-        print(f"Profile picture update error: {e}")
+        img_data = base64.b64decode(profile_picture)
+    except ValueError as e:
+        logger.warning("Error decoding image for user %s: %s", current_user.id, e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to update profile picture: {str(e)}"
+            detail=f"Invalid image data: {str(e)}"
         )
+    
+    return save_profile_picture(db, current_user, store_profile_picture(io.BytesIO(img_data)))
 
-@router.get("/followers/list", response_model=List[FollowUser])
-async def get_followers(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    followers_list = []
-    for follower in current_user.followers:
-        followers_list.append({
-            "username": follower.username,
-            "profile_picture": follower.profile_picture
-        })
-    return followers_list
+def list_follow_users(db: Session, response: Response, user_id: int, direction: str, limit: int, cursor: Optional[str]):
+    """One page of a user's followers or followed users, most recent follows first.
 
-@router.get("/{username}/followers", response_model=List[FollowUser])
-async def get_user_followers(username: str, db: Session = Depends(get_db)):
-    # Get the user by username
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+    Only the username and profile picture are selected, and the page position
+    is carried in the X-Next-Cursor header like the tweet feeds.
+    """
+    if direction == "followers":
+        listed_id, owner_id = followers.c.follower_id, followers.c.followed_id
+    else:
+        listed_id, owner_id = followers.c.followed_id, followers.c.follower_id
+
+    query = (
+        db.query(User.username, User.profile_picture)
+        .join(followers, User.id == listed_id)
+        .filter(owner_id == user_id)
+    )
+    rows, next_cursor = paginate_keyset(query, followers.c.created_at, listed_id, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return [
+        {"username": username, "profile_picture": profile_picture}
+        for username, profile_picture in rows
+    ]
+
+def get_user_id(db: Session, username: str) -> int:
+    user_id = db.query(User.id).filter(User.username == username).scalar()
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    
-    # Return the followers list
-    followers_list = []
-    for follower in user.followers:
-        followers_list.append({
-            "username": follower.username,
-            "profile_picture": follower.profile_picture
-        })
-    return followers_list
+    return user_id
+
+@router.get("/followers/list", response_model=List[FollowUser])
+def get_followers(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return list_follow_users(db, response, current_user.id, "followers", limit, cursor)
+
+@router.get("/{username}/followers", response_model=List[FollowUser])
+def get_user_followers(username: str, response: Response, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    return list_follow_users(db, response, get_user_id(db, username), "followers", limit, cursor)
 
 @router.get("/{username}/following", response_model=List[FollowUser])
-async def get_user_following(username: str, db: Session = Depends(get_db)):
-    # Get the user by username
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Return the following list
-    following_list = []
-    for following in user.following:
-        following_list.append({
-            "username": following.username,
-            "profile_picture": following.profile_picture
-        })
-    return following_list
+def get_user_following(username: str, response: Response, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    return list_follow_users(db, response, get_user_id(db, username), "following", limit, cursor)
 
 @router.get("/following/list", response_model=List[FollowUser])
-async def get_following(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    following_list = []
-    for following in current_user.following:
-        following_list.append({
-            "username": following.username,
-            "profile_picture": following.profile_picture
-        })
-    return following_list
+def get_following(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return list_follow_users(db, response, current_user.id, "following", limit, cursor)
 
 @router.post("/follow/{username}")
-async def follow_user(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def follow_user(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.username == username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -232,9 +323,15 @@ async def follow_user(username: str, current_user: User = Depends(get_current_us
         followed_id=user_to_follow.id
     )
     db.execute(stmt)
+    adjust_follow_counts(db, current_user.id, user_to_follow.id, 1)
+    backfill_timeline(db, current_user.id, user_to_follow.id)
+    bump_versions(db, USERS)
+    # Read before commit expires the user, which would reload it from the database
+    own_username = current_user.username
     db.commit()
+    invalidate_profiles(own_username, username)
     
-    print(f"DEBUG - {current_user.username} started following {user_to_follow.username}")
+    logger.debug("User %s started following user %s", current_user.id, user_to_follow.id)
     
     return {
         "message": f"You are now following {username}",
@@ -242,7 +339,7 @@ async def follow_user(username: str, current_user: User = Depends(get_current_us
     }
 
 @router.post("/unfollow/{username}")
-async def unfollow_user(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def unfollow_user(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     user_to_unfollow = db.query(User).filter(User.username == username).first()
     if not user_to_unfollow:
         raise HTTPException(
@@ -271,9 +368,16 @@ async def unfollow_user(username: str, current_user: User = Depends(get_current_
         followers.c.followed_id == user_to_unfollow.id
     )
     db.execute(stmt)
+    adjust_follow_counts(db, current_user.id, user_to_unfollow.id, -1)
+    prune_timeline(db, current_user.id, user_to_unfollow.id)
+    resume_fan_out(db, user_to_unfollow.id)
+    bump_versions(db, USERS)
+    # Read before commit expires the user, which would reload it from the database
+    own_username = current_user.username
     db.commit()
+    invalidate_profiles(own_username, username)
     
-    print(f"DEBUG - {current_user.username} unfollowed {user_to_unfollow.username}")
+    logger.debug("User %s unfollowed user %s", current_user.id, user_to_unfollow.id)
     
     return {
         "message": f"You have unfollowed {username}",
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from typing import List, Optional
+
+from ..schemas.tweet import Trend
+from ..utils.trends import trending_hashtags
+
+router = APIRouter(
+    prefix="/api/trends",
+    tags=["trends"],
+)
+
+@router.get("/", response_model=List[Trend])
+def get_trends(limit: Optional[int] = None):
+    # Served from the in-memory snapshot, never from the database; refreshing
+    # the snapshot ranks every tag in the window, so keep it off the event loop
+    return trending_hashtags.top(limit)
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_
+from pydantic import TypeAdapter
 from typing import List, Optional
 
 from ..models.database import get_db
 from ..models.models import Tweet, User, tweet_reactions
-from ..schemas.tweet import TweetCreate, Tweet as TweetSchema, TweetDetail, ReactionCreate
+from ..schemas.tweet import TweetCreate, Tweet as TweetSchema, FeedTweet, TweetDetail, ReactionCreate, ReactionCounts
 from ..utils.auth import get_current_user, get_current_user_optional
+from ..utils.conditional import TWEETS, USERS, bump_versions, check_not_modified, is_not_modified, not_modified_response, validator_headers
+from ..utils.counters import adjust_reaction_count, adjust_replies_count
+from ..utils.feed import author_summary, hydrate_tweets, parse_expand
+from ..utils.pagination import paginate_tweets, NEXT_CURSOR_HEADER
+from ..utils.entities import extract_hashtags, get_hashtag_tweets, get_mention_tweets, index_tweet_entities
+from ..utils.events import event_hub, REACTION_EVENT, TWEET_EVENT
+from ..utils.response_cache import CachedResponse, feed_cache
+from ..utils.search import search_tweets
+from ..utils.thread import get_thread, THREAD_MAX_DEPTH, THREAD_MAX_NODES
+from ..utils.timeline import fan_out_tweet, get_home_timeline
+from ..utils.trends import trending_hashtags
 
 router = APIRouter(
     prefix="/api/tweets",
@@ -14,8 +26,15 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Validates and serializes feed pages to JSON bytes like the response model would
+tweet_list_adapter = TypeAdapter(List[FeedTweet])
+
+def listing_versions(expand_author: bool) -> List[str]:
+    # Embedded authors change with profile pictures
+    return [TWEETS, USERS] if expand_author else [TWEETS]
+
 @router.post("/", response_model=TweetSchema, status_code=status.HTTP_201_CREATED)
-async def create_tweet(tweet: TweetCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_tweet(tweet: TweetCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     db_tweet = Tweet(
         content=tweet.content,
         author_id=current_user.id,
@@ -23,81 +42,156 @@ async def create_tweet(tweet: TweetCreate, current_user: User = Depends(get_curr
     )
     
     db.add(db_tweet)
+    
+    # Keep the parent's replies counter in the same transaction
+    if db_tweet.parent_id is not None:
+        adjust_replies_count(db, db_tweet.parent_id, 1)
+    
+    db.flush()
+    index_tweet_entities(db, [(db_tweet.id, db_tweet.content)])
+    
+    # Materialize top-level tweets into the followers' home timelines
+    if db_tweet.parent_id is None:
+        fan_out_tweet(db, db_tweet.id)
+    
+    bump_versions(db, TWEETS)
+    
+    # Read before commit expires the user, which would reload it from the database
+    author_username = current_user.username
+    # The picture isn't part of the cached principal, so it's only loaded for streaming
+    author = author_summary(current_user) if event_hub.active else None
     db.commit()
     db.refresh(db_tweet)
     
+    # The new tweet, or the parent's replies count, changes the public feed
+    feed_cache.invalidate()
+    trending_hashtags.record(extract_hashtags(db_tweet.content))
+    
     # Create response with author username
-    return {
+    result = {
         "id": db_tweet.id,
         "content": db_tweet.content,
         "created_at": db_tweet.created_at,
         "author_id": db_tweet.author_id,
-        "author_username": current_user.username,
+        "author_username": author_username,
         "parent_id": db_tweet.parent_id,
         "replies_count": 0,
         "likes_count": 0,
         "dislikes_count": 0,
         "user_reaction": None
     }
+    
+    # Push it to streaming clients, expanded like the feeds they show it in;
+    # user_reaction is None for every viewer of a new tweet
+    if event_hub.active:
+        event_hub.publish(TWEET_EVENT, FeedTweet(**result, author=author).model_dump_json())
+    return result
 
-@router.get("/", response_model=List[TweetSchema])
-async def get_tweets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+def publish_reaction_counts(db: Session, tweet_id: int):
+    """Push a tweet's committed reaction counts to streaming clients, coalesced per tweet"""
+    if not event_hub.active:
+        return
+    likes_count, dislikes_count = db.query(Tweet.likes_count, Tweet.dislikes_count).filter(Tweet.id == tweet_id).one()
+    counts = ReactionCounts(tweet_id=tweet_id, likes_count=likes_count, dislikes_count=dislikes_count)
+    event_hub.publish(REACTION_EVENT, counts.model_dump_json(), coalesce_key=tweet_id)
+
+def get_feed_page(db: Session, skip: int, limit: int, cursor: Optional[str], current_user: Optional[User], expand_author: bool = False):
     # Only get top-level tweets (not replies) for the main feed
-    tweets = db.query(Tweet).filter(Tweet.parent_id == None).order_by(Tweet.created_at.desc()).offset(skip).limit(limit).all()
-    
-    # Add author username to each tweet
-    result = []
-    for tweet in tweets:
-        author = db.query(User).filter(User.id == tweet.author_id).first()
-        # Count replies for each tweet
-        replies_count = db.query(Tweet).filter(Tweet.parent_id == tweet.id).count()
-        
-        # Count likes and dislikes
-        likes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == tweet.id,
-                tweet_reactions.c.reaction_type == "like"
-            )
-        ).scalar()
-        
-        dislikes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == tweet.id,
-                tweet_reactions.c.reaction_type == "dislike"
-            )
-        ).scalar()
-        
-        # Get user's reaction if authenticated
-        user_reaction = None
-        if current_user:
-            reaction = db.execute(
-                tweet_reactions.select().where(
-                    and_(
-                        tweet_reactions.c.user_id == current_user.id,
-                        tweet_reactions.c.tweet_id == tweet.id
-                    )
-                )
-            ).first()
-            if reaction:
-                user_reaction = reaction.reaction_type
+    query = db.query(Tweet).filter(Tweet.parent_id == None)
+    tweets, next_cursor = paginate_tweets(query, limit, skip=skip, cursor=cursor)
+    
+    # Add author, counts and user reaction to the whole page at once
+    return hydrate_tweets(db, tweets, current_user, expand_author), next_cursor
+
+@router.get("/", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def get_tweets(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+    expand_author = "author" in parse_expand(expand)
+    versions = listing_versions(expand_author)
+    
+    # Anonymous pages are the same for everyone, so their serialized JSON is
+    # cached together with the validators it was built from
+    if current_user is None and feed_cache.enabled:
+        def compute():
+            headers = validator_headers(db, request, versions)
+            page, next_cursor = get_feed_page(db, skip, limit, cursor, None, expand_author)
+            if next_cursor:
+                headers[NEXT_CURSOR_HEADER] = next_cursor
+            body = tweet_list_adapter.dump_json(tweet_list_adapter.validate_python(page), exclude_unset=True)
+            return CachedResponse(body, headers)
         
-        result.append({
-            "id": tweet.id,
-            "content": tweet.content,
-            "created_at": tweet.created_at,
-            "author_id": tweet.author_id,
-            "author_username": author.username if author else "Unknown",
-            "parent_id": tweet.parent_id,
-            "replies_count": replies_count,
-            "likes_count": likes_count,
-            "dislikes_count": dislikes_count,
-            "user_reaction": user_reaction
-        })
+        cached = feed_cache.get_or_compute(f"{request.url.path}?{request.url.query}", compute)
+        if is_not_modified(request, cached.headers):
+            return not_modified_response(cached.headers)
+        return Response(cached.body, media_type="application/json", headers=cached.headers)
     
-    return result
+    not_modified = check_not_modified(db, request, response, versions, current_user)
+    if not_modified:
+        return not_modified
+    
+    page, next_cursor = get_feed_page(db, skip, limit, cursor, current_user, expand_author)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return page
+
+@router.get("/timeline", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def get_timeline(request: Request, response: Response, limit: int = 100, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    expand_author = "author" in parse_expand(expand)
+    
+    # Follows change which tweets the timeline holds
+    not_modified = check_not_modified(db, request, response, [TWEETS, USERS], current_user)
+    if not_modified:
+        return not_modified
+    
+    # Tweets of the accounts the user follows, and their own
+    tweets, next_cursor = get_home_timeline(db, current_user.id, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return hydrate_tweets(db, tweets, current_user, expand_author)
+
+@router.get("/search", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def search(q: str, request: Request, response: Response, limit: int = 20, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+    expand_author = "author" in parse_expand(expand)
+    not_modified = check_not_modified(db, request, response, listing_versions(expand_author), current_user)
+    if not_modified:
+        return not_modified
+    
+    # Ranked full-text matches, hydrated like the feeds
+    tweets, next_cursor = search_tweets(db, q, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return hydrate_tweets(db, tweets, current_user, expand_author)
+
+@router.get("/hashtag/{tag}", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def get_hashtag_tweets_page(tag: str, request: Request, response: Response, limit: int = 100, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+    expand_author = "author" in parse_expand(expand)
+    not_modified = check_not_modified(db, request, response, listing_versions(expand_author), current_user)
+    if not_modified:
+        return not_modified
+    
+    tweets, next_cursor = get_hashtag_tweets(db, tag, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return hydrate_tweets(db, tweets, current_user, expand_author)
+
+@router.get("/mentions", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def get_mentions(request: Request, response: Response, limit: int = 100, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    expand_author = "author" in parse_expand(expand)
+    not_modified = check_not_modified(db, request, response, listing_versions(expand_author), current_user)
+    if not_modified:
+        return not_modified
+    
+    # Tweets mentioning the current user
+    tweets, next_cursor = get_mention_tweets(db, current_user.id, limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return hydrate_tweets(db, tweets, current_user, expand_author)
 
 @router.get("/count/{username}")
-async def get_tweet_count(username: str, db: Session = Depends(get_db)):
+def get_tweet_count(username: str, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(
@@ -109,8 +203,8 @@ async def get_tweet_count(username: str, db: Session = Depends(get_db)):
     count = db.query(Tweet).filter(Tweet.author_id == user.id).count()
     return {"count": count, "username": username}
 
-@router.get("/user/{username}", response_model=List[TweetSchema])
-async def get_user_tweets(username: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+@router.get("/user/{username}", response_model=List[FeedTweet], response_model_exclude_unset=True)
+def get_user_tweets(username: str, request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, expand: Optional[str] = None, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(
@@ -118,60 +212,21 @@ async def get_user_tweets(username: str, skip: int = 0, limit: int = 100, db: Se
             detail="User not found"
         )
     
-    # Only get top-level tweets (not replies) for user profile
-    tweets = db.query(Tweet).filter(Tweet.author_id == user.id, Tweet.parent_id == None).order_by(Tweet.created_at.desc()).offset(skip).limit(limit).all()
+    expand_author = "author" in parse_expand(expand)
+    not_modified = check_not_modified(db, request, response, listing_versions(expand_author), current_user)
+    if not_modified:
+        return not_modified
     
-    result = []
-    for tweet in tweets:
-        # Count replies for each tweet
-        replies_count = db.query(Tweet).filter(Tweet.parent_id == tweet.id).count()
-        
-        # Count likes and dislikes
-        likes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == tweet.id,
-                tweet_reactions.c.reaction_type == "like"
-            )
-        ).scalar()
-        
-        dislikes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == tweet.id,
-                tweet_reactions.c.reaction_type == "dislike"
-            )
-        ).scalar()
-        
-        # Get user's reaction if authenticated
-        user_reaction = None
-        if current_user:
-            reaction = db.execute(
-                tweet_reactions.select().where(
-                    and_(
-                        tweet_reactions.c.user_id == current_user.id,
-                        tweet_reactions.c.tweet_id == tweet.id
-                    )
-                )
-            ).first()
-            if reaction:
-                user_reaction = reaction.reaction_type
-        
-        result.append({
-            "id": tweet.id,
-            "content": tweet.content,
-            "created_at": tweet.created_at,
-            "author_id": tweet.author_id,
-            "author_username": user.username,
-            "parent_id": tweet.parent_id,
-            "replies_count": replies_count,
-            "likes_count": likes_count,
-            "dislikes_count": dislikes_count,
-            "user_reaction": user_reaction
-        })
+    # Only get top-level tweets (not replies) for user profile
+    query = db.query(Tweet).filter(Tweet.author_id == user.id, Tweet.parent_id == None)
+    tweets, next_cursor = paginate_tweets(query, limit, skip=skip, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    return result
+    return hydrate_tweets(db, tweets, current_user, expand_author)
 
 @router.get("/{tweet_id}", response_model=TweetDetail)
-async def get_tweet(tweet_id: int, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+def get_tweet(tweet_id: int, request: Request, response: Response, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
     tweet = db.query(Tweet).filter(Tweet.id == tweet_id).first()
     if not tweet:
         raise HTTPException(
@@ -179,107 +234,44 @@ async def get_tweet(tweet_id: int, db: Session = Depends(get_db), current_user:
             detail="Tweet not found"
         )
     
-    author = db.query(User).filter(User.id == tweet.author_id).first()
+    # Replies are only loaded and hydrated when the client's copy is outdated
+    not_modified = check_not_modified(db, request, response, [TWEETS], current_user)
+    if not_modified:
+        return not_modified
     
     # Get replies to this tweet
     replies = db.query(Tweet).filter(Tweet.parent_id == tweet.id).order_by(Tweet.created_at.asc()).all()
     
-    # Count likes and dislikes
-    likes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-        and_(
-            tweet_reactions.c.tweet_id == tweet.id,
-            tweet_reactions.c.reaction_type == "like"
-        )
-    ).scalar()
-    
-    dislikes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-        and_(
-            tweet_reactions.c.tweet_id == tweet.id,
-            tweet_reactions.c.reaction_type == "dislike"
-        )
-    ).scalar()
-    
-    # Get user's reaction if authenticated
-    user_reaction = None
-    if current_user:
-        reaction = db.execute(
-            tweet_reactions.select().where(
-                and_(
-                    tweet_reactions.c.user_id == current_user.id,
-                    tweet_reactions.c.tweet_id == tweet.id
-                )
-            )
-        ).first()
-        if reaction:
-            user_reaction = reaction.reaction_type
+    # Hydrate the tweet and its replies together
+    hydrated = hydrate_tweets(db, [tweet] + replies, current_user)
     
     # Create the response with nested replies
-    result = {
-        "id": tweet.id,
-        "content": tweet.content,
-        "created_at": tweet.created_at,
-        "author_id": tweet.author_id,
-        "author_username": author.username if author else "Unknown",
-        "parent_id": tweet.parent_id,
-        "replies_count": len(replies),
-        "likes_count": likes_count,
-        "dislikes_count": dislikes_count,
-        "user_reaction": user_reaction,
-        "replies": []
-    }
-    
-    # Add replies
-    for reply in replies:
-        reply_author = db.query(User).filter(User.id == reply.author_id).first()
-        reply_replies_count = db.query(Tweet).filter(Tweet.parent_id == reply.id).count()
-        
-        # Count likes and dislikes for reply
-        reply_likes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == reply.id,
-                tweet_reactions.c.reaction_type == "like"
-            )
-        ).scalar()
-        
-        reply_dislikes_count = db.query(func.count(tweet_reactions.c.user_id)).filter(
-            and_(
-                tweet_reactions.c.tweet_id == reply.id,
-                tweet_reactions.c.reaction_type == "dislike"
-            )
-        ).scalar()
-        
-        # Get user's reaction to reply if authenticated
-        reply_user_reaction = None
-        if current_user:
-            reply_reaction = db.execute(
-                tweet_reactions.select().where(
-                    and_(
-                        tweet_reactions.c.user_id == current_user.id,
-                        tweet_reactions.c.tweet_id == reply.id
-                    )
-                )
-            ).first()
-            if reply_reaction:
-                reply_user_reaction = reply_reaction.reaction_type
-        
-        result["replies"].append({
-            "id": reply.id,
-            "content": reply.content,
-            "created_at": reply.created_at,
-            "author_id": reply.author_id,
-            "author_username": reply_author.username if reply_author else "Unknown",
-            "parent_id": reply.parent_id,
-            "replies_count": reply_replies_count,
-            "likes_count": reply_likes_count,
-            "dislikes_count": reply_dislikes_count,
-            "user_reaction": reply_user_reaction,
-            "replies": []
-        })
+    result = hydrated[0]
+    result["replies"] = []
+    for reply in hydrated[1:]:
+        reply["replies"] = []
+        result["replies"].append(reply)
     
     return result
 
+@router.get("/{tweet_id}/thread", response_model=TweetDetail)
+def get_tweet_thread(tweet_id: int, request: Request, response: Response, max_depth: int = THREAD_MAX_DEPTH, max_nodes: int = THREAD_MAX_NODES, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_current_user_optional)):
+    not_modified = check_not_modified(db, request, response, [TWEETS], current_user)
+    if not_modified:
+        return not_modified
+    
+    # The whole reply tree in one recursive query, hydrated in batch; caps above the server's are lowered
+    thread = get_thread(db, tweet_id, current_user, max_depth=max_depth, max_nodes=max_nodes)
+    if thread is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tweet not found"
+        )
+    
+    return thread
+
 @router.post("/{tweet_id}/reaction", status_code=status.HTTP_201_CREATED)
-async def create_reaction(
+def create_reaction(
     tweet_id: int, 
     reaction: ReactionCreate, 
     current_user: User = Depends(get_current_user), 
@@ -314,7 +306,12 @@ async def create_reaction(
                     )
                 ).values(reaction_type=reaction.reaction_type)
             )
+            adjust_reaction_count(db, tweet_id, existing_reaction.reaction_type, -1)
+            adjust_reaction_count(db, tweet_id, reaction.reaction_type, 1)
+            bump_versions(db, TWEETS)
             db.commit()
+            feed_cache.invalidate()
+            publish_reaction_counts(db, tweet_id)
             return {"message": f"Reaction updated to {reaction.reaction_type}"}
         else:
             # If reaction type is the same, remove it (toggle off)
@@ -326,7 +323,11 @@ async def create_reaction(
                     )
                 )
             )
+            adjust_reaction_count(db, tweet_id, existing_reaction.reaction_type, -1)
+            bump_versions(db, TWEETS)
             db.commit()
+            feed_cache.invalidate()
+            publish_reaction_counts(db, tweet_id)
             return {"message": f"Reaction removed"}
     else:
         # Add new reaction
@@ -337,5 +338,9 @@ async def create_reaction(
                 reaction_type=reaction.reaction_type
             )
         )
+        adjust_reaction_count(db, tweet_id, reaction.reaction_type, 1)
+        bump_versions(db, TWEETS)
         db.commit()
+        feed_cache.invalidate()
+        publish_reaction_counts(db, tweet_id)
         return {"message": f"Reaction {reaction.reaction_type} added"}
\ No newline at end of file
@@ -16,7 +16,7 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+def register_user(user: UserCreate, db: Session = Depends(get_db)):
     # Check if username or email already exists
     existing_username = db.query(User).filter(User.username == user.username).first()
     if existing_username:
@@ -53,7 +53,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.post("/login", response_model=Token)
-async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     # Find the user by username
     user = db.query(User).filter(User.username == user_credentials.username).first()
     
@@ -11,6 +11,11 @@ class TweetCreate(TweetBase):
 class ReactionCreate(BaseModel):
     reaction_type: str = Field(..., pattern="^(like|dislike)$")
 
+class TweetAuthor(BaseModel):
+    username: str
+    profile_picture: Optional[str] = None
+    avatar_thumbnail: Optional[str] = None  # Square thumbnail, or the picture if it has none
+
 class Tweet(TweetBase):
     id: int
     created_at: datetime
@@ -25,6 +30,9 @@ class Tweet(TweetBase):
     class Config:
         from_attributes = True
 
+class FeedTweet(Tweet):
+    author: Optional[TweetAuthor] = None  # Only with ?expand=author, left out otherwise
+
 class TweetDetail(Tweet):
     replies: Optional[List["TweetDetail"]] = []
 
@@ -32,4 +40,13 @@ class TweetDetail(Tweet):
         from_attributes = True
 
 # Resolve forward references
-TweetDetail.model_rebuild()
\ No newline at end of file
+TweetDetail.model_rebuild()
+
+class Trend(BaseModel):
+    tag: str
+    count: int  # uses within the trending window
+
+class ReactionCounts(BaseModel):
+    tweet_id: int
+    likes_count: int
+    dislikes_count: int
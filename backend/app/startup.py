@@ -0,0 +1,28 @@
+"""One-shot preparation of a deployment, run before the app serves requests.
+
+Creates the data directories and applies pending migrations. Importing the app
+has no such side effects, so several worker processes can load it without
+racing on schema changes against the same SQLite file:
+
+- gunicorn runs ``prepare`` once in the master process, before forking workers
+  (see ``gunicorn.conf.py``), and sets MIGRATE_ON_STARTUP=0 for the workers.
+- A single ``uvicorn app.main:app`` process runs it from the app's lifespan.
+- ``python -m app.cli migrate`` runs it by hand.
+"""
+import os
+from typing import List
+
+from .models.database import AVATARS_DIR, CONFIG_DIR, UPLOADS_DIR, engine
+from .models.migrations import run_migrations
+
+# Whether the app's lifespan prepares the deployment itself
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "1") != "0"
+
+def prepare() -> List[int]:
+    """Create the data directories and apply pending migrations, returning the versions applied"""
+    for directory in (CONFIG_DIR, UPLOADS_DIR, AVATARS_DIR):
+        os.makedirs(directory, exist_ok=True)
+    applied = run_migrations()
+    # Don't hand pooled SQLite connections down to forked workers
+    engine.dispose()
+    return applied
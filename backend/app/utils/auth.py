@@ -1,51 +1,112 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from typing import Optional
 from jose import JWTError, jwt
+import logging
+import os
+import time
 
 from ..models.database import get_db
 from ..models.models import User
+from ..schemas.user import TokenData
+from ..utils.cache import TTLCache, create_cache
 from ..utils.security import verify_token, SECRET_KEY, ALGORITHM
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/users/login", auto_error=False)
 
-# Dependency to get current user
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+# Decoded tokens and user principals are cached for AUTH_CACHE_TTL seconds
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+
+# Token -> TokenData, never kept past the token's own expiry. Tokens never
+# change, so each process keeps its own
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+# User id -> [id, username, is_active], on the shared cache backend so
+# invalidate_user reaches every worker
+principal_cache = create_cache("principal", AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+def decode_token(token: str) -> Optional[TokenData]:
+    """verify_token with successful results cached"""
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
+
+    token_data = verify_token(token)
+    if token_data is not None:
+        ttl = AUTH_CACHE_TTL
+        expires = jwt.get_unverified_claims(token).get("exp")
+        if expires is not None:
+            ttl = min(ttl, expires - time.time())
+        if ttl > 0:
+            token_cache.set(token, token_data, ttl)
+    return token_data
+
+def load_user(db: Session, user_id: int) -> Optional[User]:
+    """Load a user, attaching a cached principal to the session instead of querying.
+
+    Attributes outside the principal (email, profile_picture, relationships)
+    are left expired, so they are loaded from the database only when used.
+    """
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            principal_cache.set(user_id, [user.id, user.username, user.is_active])
+        return user
+
+    user_id, username, is_active = principal
+    user = User(id=user_id, username=username, is_active=is_active)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def invalidate_user(user_id: int):
+    """Drop a user's cached principal; call after updating or deactivating them"""
+    principal_cache.delete(user_id)
+
+def auth_cache_stats():
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    token_data = verify_token(token)
+
+# Dependency to check the token without a database session, for routes that
+# shouldn't hold one while the request body is still arriving
+def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
+    token_data = decode_token(token)
     if token_data is None:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+        raise credentials_exception()
+    return token_data
+
+# Dependency to get current user
+def get_current_user(token_data: TokenData = Depends(get_token_data), db: Session = Depends(get_db)):
+    user = load_user(db, token_data.user_id)
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
     
     return user
 
 # Dependency to get current user but return None if not authenticated
-async def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Optional[User]:
+def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Optional[User]:
     if token is None:
-        print("DEBUG - No token provided for optional authentication")
         return None
     
     try:
-        token_data = verify_token(token)
+        token_data = decode_token(token)
         if token_data is None:
-            print("DEBUG - Token verification failed for optional authentication")
+            logger.debug("Token verification failed for optional authentication")
             return None
         
-        user = db.query(User).filter(User.id == token_data.user_id).first()
-        if user:
-            print(f"DEBUG - Successfully authenticated optional user: {user.username} (ID: {user.id})")
-        else:
-            print(f"DEBUG - User not found for ID: {token_data.user_id}")
+        user = load_user(db, token_data.user_id)
+        if user is None:
+            logger.debug("User not found for ID: %s", token_data.user_id)
         return user
-    except Exception as e:
-        print(f"DEBUG - Error in optional authentication: {str(e)}")
-        return None
\ No newline at end of file
+    except Exception:
+        logger.warning("Error in optional authentication", exc_info=True)
+        return None
@@ -0,0 +1,140 @@
+"""Key-value caches shared by the routers and utilities.
+
+``CacheBackend`` is the interface; ``create_cache`` returns the implementation
+selected by CACHE_BACKEND:
+
+- ``memory`` (default): ``TTLCache``, an LRU in this process. Each worker has
+  its own copy, so an invalidation only reaches the worker that made it.
+- ``redis``: ``RedisCache``, stored on the Redis server at CACHE_URL and
+  shared by every worker. Values must be JSON-serializable.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import os
+import threading
+import time
+from typing import Any, Hashable, Iterable, List, Optional
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_URL = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
+
+class CacheBackend(ABC):
+    """Interface of the cache implementations"""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """Return the cached values of keys, in order, with None for misses"""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value for ttl seconds, defaulting to the cache's TTL"""
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        """Drop a key, if it is cached"""
+
+    @abstractmethod
+    def incr(self, key: Hashable, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add amount to an integer value and return it; a new key starts at 0 and expires after ttl"""
+
+    @abstractmethod
+    def clear(self):
+        """Drop every key"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Counters for /api/metrics"""
+
+class TTLCache(CacheBackend):
+    """Thread-safe in-process LRU cache whose entries expire after a TTL.
+
+    Once ``max_size`` entries are stored, the least recently used one is
+    evicted to make room. Expired entries are dropped when they are read.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _get(self, key: Hashable, now: float) -> Optional[Any]:
+        # Called with the lock held
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+            del self._entries[key]
+        self._misses += 1
+        return None
+
+    def _set(self, key: Hashable, value: Any, expires_at: float):
+        # Called with the lock held
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._set(key, value, expires_at)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: Hashable, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                value, expires_at = entry[0] + amount, entry[1]
+            else:
+                value, expires_at = amount, now + (self.ttl if ttl is None else ttl)
+            if self.max_size > 0:
+                self._set(key, value, expires_at)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Snapshot of the cache's size and hit counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+def create_cache(namespace: str, max_size: int, ttl: float) -> CacheBackend:
+    """Create a cache on the configured backend; namespace keeps its keys apart on a shared server"""
+    if CACHE_BACKEND == "redis":
+        from .redis_cache import RedisCache, get_redis_client
+        return RedisCache(get_redis_client(), namespace, ttl)
+    if CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected 'memory' or 'redis'")
+    return TTLCache(max_size, ttl)
@@ -0,0 +1,116 @@
+"""Conditional GETs for tweets, feeds and profiles.
+
+Instead of hashing a response body after building it, validators come from the
+change_versions table: every write to tweets or reactions bumps the "tweets"
+version, and every follow or profile change bumps "users", in the same
+transaction. An ETag combines the versions a response depends on with its path,
+query and viewer, so reading it is one primary key lookup and a client whose
+copy is current gets a 304 before any tweets are loaded or hydrated.
+
+ETags are weak because the same data may be serialized with different spacing.
+Last-Modified is only sent once the second of the last change has passed, so
+a later change always moves it forward (the usual one-second resolution rule).
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from hashlib import blake2b
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import time
+
+from ..models.models import User, change_versions
+
+# Names of the versioned kinds of data
+TWEETS = "tweets"
+USERS = "users"
+
+def bump_versions(db: Session, *names: str):
+    """Mark data as changed, in the caller's transaction"""
+    now = time.time()
+    for name in names:
+        stmt = insert(change_versions).values(name=name, version=1, modified_at=now)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[change_versions.c.name],
+            set_={"version": change_versions.c.version + 1, "modified_at": stmt.excluded.modified_at}
+        ))
+
+def read_versions(db: Session, names: Sequence[str]) -> Dict[str, Tuple[int, float]]:
+    """Version and modification time of the named data; names never changed are left out"""
+    return dict(
+        (name, (version, modified_at))
+        for name, version, modified_at in db.execute(
+            change_versions.select().where(change_versions.c.name.in_(names))
+        )
+    )
+
+def validator_headers(
+    db: Session,
+    request: Request,
+    names: Sequence[str],
+    current_user: Optional[User] = None,
+    versions: Optional[Dict[str, Tuple[int, float]]] = None
+) -> Dict[str, str]:
+    """ETag, Last-Modified and caching headers of a response built from the named data.
+
+    Pass versions from read_versions when the body was built against them, so
+    the validators describe that body and not a later change.
+    """
+    rows = versions if versions is not None else read_versions(db, names)
+    stamp = "-".join(str(rows.get(name, (0, 0))[0]) for name in names)
+    # Different pages and viewers (user_reaction, is_followed) get different tags
+    scope = f"{request.url.path}?{request.url.query}|{current_user.id if current_user else ''}"
+    digest = blake2b(scope.encode(), digest_size=6).hexdigest()
+
+    headers = {
+        "ETag": f'W/"{stamp}-{digest}"',
+        # Let clients keep the body, but revalidate it before every use
+        "Cache-Control": "no-cache",
+        "Vary": "Authorization",
+    }
+    modified_at = max((modified_at for _, modified_at in rows.values()), default=None)
+    if modified_at is not None and int(modified_at) < int(time.time()):
+        headers["Last-Modified"] = formatdate(int(modified_at), usegmt=True)
+    return headers
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+    return opaque(etag) in {opaque(tag) for tag in if_none_match.split(",")}
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """Whether the client's copy is current; If-None-Match takes precedence over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, headers["ETag"])
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def check_not_modified(
+    db: Session,
+    request: Request,
+    response: Response,
+    names: Iterable[str],
+    current_user: Optional[User] = None,
+    versions: Optional[Dict[str, Tuple[int, float]]] = None
+) -> Optional[Response]:
+    """Add validators to response, and return a 304 to send instead when the client's copy is current"""
+    headers = validator_headers(db, request, list(names), current_user, versions)
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,67 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+
+from ..models.models import Tweet, User, followers, tweet_reactions
+
+# Counter column for each reaction type
+REACTION_COUNTERS = {
+    "like": Tweet.likes_count,
+    "dislike": Tweet.dislikes_count,
+}
+
+def adjust_reaction_count(db: Session, tweet_id: int, reaction_type: str, delta: int):
+    """Add delta to the stored counter of a reaction type, in the caller's transaction"""
+    column = REACTION_COUNTERS[reaction_type]
+    db.execute(
+        update(Tweet).where(Tweet.id == tweet_id).values({column: column + delta})
+    )
+
+def adjust_replies_count(db: Session, tweet_id: int, delta: int):
+    """Add delta to the stored replies counter, in the caller's transaction"""
+    db.execute(
+        update(Tweet).where(Tweet.id == tweet_id).values(replies_count=Tweet.replies_count + delta)
+    )
+
+def adjust_follow_counts(db: Session, follower_id: int, followed_id: int, delta: int):
+    """Add delta to both sides' follow counters, in the caller's transaction"""
+    db.execute(
+        update(User).where(User.id == follower_id).values(following_count=User.following_count + delta)
+    )
+    db.execute(
+        update(User).where(User.id == followed_id).values(followers_count=User.followers_count + delta)
+    )
+
+def tweet_counters_update():
+    """Build the UPDATE statement recomputing every tweet counter from the source tables"""
+    replies = Tweet.__table__.alias("replies")
+
+    def reaction_count(reaction_type):
+        return select(func.count()).where(
+            tweet_reactions.c.tweet_id == Tweet.id,
+            tweet_reactions.c.reaction_type == reaction_type
+        ).scalar_subquery()
+
+    return update(Tweet).values(
+        replies_count=select(func.count()).where(replies.c.parent_id == Tweet.id).scalar_subquery(),
+        likes_count=reaction_count("like"),
+        dislikes_count=reaction_count("dislike"),
+    )
+
+def repair_tweet_counters(db: Session):
+    """Recompute every tweet counter from the reactions and replies tables"""
+    result = db.execute(tweet_counters_update())
+    db.commit()
+    return result.rowcount
+
+def user_counters_update():
+    """Build the UPDATE statement recomputing every user's follow counters"""
+    return update(User).values(
+        followers_count=select(func.count()).where(followers.c.followed_id == User.id).scalar_subquery(),
+        following_count=select(func.count()).where(followers.c.follower_id == User.id).scalar_subquery(),
+    )
+
+def repair_user_counters(db: Session):
+    """Recompute every user's follow counters from the followers table"""
+    result = db.execute(user_counters_update())
+    db.commit()
+    return result.rowcount
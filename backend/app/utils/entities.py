@@ -0,0 +1,86 @@
+"""Hashtags and mentions in tweet content.
+
+``#tag`` and ``@username`` are extracted when a tweet is written and stored in
+the ``tweet_hashtags`` and ``tweet_mentions`` tables, so listing the tweets of
+a tag or mentioning a user is an index range scan instead of a content scan.
+Tags are stored lowercase; mentions of unknown usernames are dropped.
+"""
+from sqlalchemy import Integer, String, bindparam, insert, select
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Set, Tuple
+import os
+import re
+
+from ..models.models import Tweet, User, tweet_hashtags, tweet_mentions
+from .feed import get_tweets_by_ids
+from .pagination import paginate_keyset
+
+# Tweets read and indexed per transaction by the backfill
+ENTITY_BACKFILL_CHUNK_SIZE = int(os.environ.get("ENTITY_BACKFILL_CHUNK_SIZE", "1000"))
+
+# Not preceded by a word character, so e-mail addresses and "C#" don't match
+HASHTAG_PATTERN = re.compile(r"(?<!\w)#(\w+)")
+MENTION_PATTERN = re.compile(r"(?<!\w)@(\w+)")
+
+# One row per (value, tweet) pair, with created_at copied from the tweet as stored
+hashtag_insert = insert(tweet_hashtags).prefix_with("OR IGNORE").from_select(
+    ["tag", "tweet_id", "created_at"],
+    select(bindparam("tag", type_=String), Tweet.id, Tweet.created_at)
+    .where(Tweet.id == bindparam("tweet_id", type_=Integer))
+)
+mention_insert = insert(tweet_mentions).prefix_with("OR IGNORE").from_select(
+    ["user_id", "tweet_id", "created_at"],
+    select(User.id, Tweet.id, Tweet.created_at)
+    .join(Tweet, Tweet.id == bindparam("tweet_id", type_=Integer))
+    .where(User.username == bindparam("username", type_=String))
+)
+
+def extract_hashtags(content: str) -> Set[str]:
+    return {tag.lower() for tag in HASHTAG_PATTERN.findall(content)}
+
+def extract_mentions(content: str) -> Set[str]:
+    return set(MENTION_PATTERN.findall(content))
+
+def index_tweet_entities(db: Session, tweets: Iterable[Tuple[int, str]]):
+    """Index the hashtags and mentions of (tweet id, content) pairs, in the caller's transaction"""
+    hashtag_rows = []
+    mention_rows = []
+    for tweet_id, content in tweets:
+        hashtag_rows.extend({"tag": tag, "tweet_id": tweet_id} for tag in extract_hashtags(content))
+        mention_rows.extend({"username": username, "tweet_id": tweet_id} for username in extract_mentions(content))
+
+    # Each is a single executemany
+    if hashtag_rows:
+        db.execute(hashtag_insert, hashtag_rows)
+    if mention_rows:
+        db.execute(mention_insert, mention_rows)
+
+def backfill_tweet_entities(db: Session, chunk_size: int = ENTITY_BACKFILL_CHUNK_SIZE) -> int:
+    """Index the hashtags and mentions of every existing tweet.
+
+    Tweets are read in id order, chunk_size at a time, committing after each
+    chunk so the write lock is never held for long. Already indexed pairs are
+    skipped, so the backfill can be interrupted and run again.
+    """
+    last_id = 0
+    processed = 0
+    while True:
+        chunk = db.query(Tweet.id, Tweet.content).filter(Tweet.id > last_id).order_by(Tweet.id).limit(chunk_size).all()
+        if not chunk:
+            return processed
+        index_tweet_entities(db, chunk)
+        db.commit()
+        last_id = chunk[-1][0]
+        processed += len(chunk)
+
+def get_hashtag_tweets(db: Session, tag: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Tweet], Optional[str]]:
+    """Fetch one page of the tweets with a hashtag, newest first"""
+    query = db.query(tweet_hashtags.c.tweet_id).filter(tweet_hashtags.c.tag == tag.lstrip("#").lower())
+    rows, next_cursor = paginate_keyset(query, tweet_hashtags.c.created_at, tweet_hashtags.c.tweet_id, limit, cursor=cursor)
+    return get_tweets_by_ids(db, [tweet_id for tweet_id, in rows]), next_cursor
+
+def get_mention_tweets(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[Tweet], Optional[str]]:
+    """Fetch one page of the tweets mentioning a user, newest first"""
+    query = db.query(tweet_mentions.c.tweet_id).filter(tweet_mentions.c.user_id == user_id)
+    rows, next_cursor = paginate_keyset(query, tweet_mentions.c.created_at, tweet_mentions.c.tweet_id, limit, cursor=cursor)
+    return get_tweets_by_ids(db, [tweet_id for tweet_id, in rows]), next_cursor
@@ -0,0 +1,301 @@
+"""Pub/sub hub pushing new tweets and reaction counts to streaming clients.
+
+Routes are plain functions running in the threadpool, while stream consumers
+are coroutines waiting on the event loop, so ``publish`` is thread-safe: it
+hands each event to the loop with ``call_soon_threadsafe``. An event is
+serialized once by the publisher and the same string is queued for every
+subscriber.
+
+Reaction counts can change many times a second on a popular tweet, so events
+published with a ``coalesce_key`` are held for EVENTS_COALESCE_SECONDS and only
+the latest one per key is sent.
+
+Every subscriber has a send queue of EVENTS_QUEUE_SIZE events. A client that
+falls that far behind is dropped instead of buffered without bound; its stream
+ends and it can reconnect and reload.
+
+The hub lives in one process. With several workers and CACHE_BACKEND=redis,
+events go through Redis pub/sub instead, so every worker delivers every event
+to its own subscribers. Events published while Redis is unreachable are lost,
+which clients recover from like any dropped stream.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Hashable, Optional, Set
+
+from .cache import CACHE_BACKEND
+from .redis_cache import RedisClient, RedisConnection, RedisError, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "64"))
+EVENTS_COALESCE_SECONDS = float(os.environ.get("EVENTS_COALESCE_SECONDS", "0.5"))
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "20000"))
+# Heartbeats sent on idle streams so proxies don't time them out
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# Event types
+TWEET_EVENT = "tweet"
+REACTION_EVENT = "reaction"
+
+# Redis pub/sub channel carrying events between workers
+RELAY_CHANNEL = "events"
+RELAY_RETRY_SECONDS = 1.0
+
+@dataclass(frozen=True)
+class Event:
+    type: str
+    data: str
+
+    @cached_property
+    def sse(self) -> bytes:
+        """The event as a Server-Sent Events message, encoded once for all subscribers"""
+        if self is HEARTBEAT:
+            return b": ping\n\n"
+        return f"event: {self.type}\ndata: {self.data}\n\n".encode()
+
+# Queued for every subscriber of a loop at once, by one timer rather than a
+# timeout per stream
+HEARTBEAT = Event("heartbeat", "")
+
+class TooManySubscribers(Exception):
+    """Raised when EVENTS_MAX_SUBSCRIBERS streams are already open"""
+
+class Subscription:
+    """One client's send queue; ``get`` returns None once it has been dropped"""
+
+    def __init__(self, channel: "_LoopChannel", queue_size: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = False
+
+    def put(self, event: Event) -> bool:
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.drop()
+            return False
+
+    def drop(self):
+        self.dropped = True
+        self.channel.remove(self)
+        self.channel.hub._count("dropped")
+        # Discard the backlog and wake the consumer so its stream ends
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Event]:
+        return await self.queue.get()
+
+class _LoopChannel:
+    """Subscribers waiting on one event loop; only touched from that loop"""
+
+    def __init__(self, hub: "EventHub", loop: asyncio.AbstractEventLoop):
+        self.hub = hub
+        self.loop = loop
+        self.subscribers: Set[Subscription] = set()
+        self.pending: Dict[Hashable, Event] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.heartbeat_handle = loop.call_later(hub.heartbeat_seconds, self.heartbeat)
+
+    def remove(self, subscription: Subscription):
+        if subscription in self.subscribers:
+            self.subscribers.discard(subscription)
+            self.hub._removed(self)
+
+    def receive(self, event: Event, coalesce_key: Optional[Hashable]):
+        if coalesce_key is None:
+            self.deliver(event)
+            return
+        if coalesce_key in self.pending:
+            self.hub._count("coalesced")
+        self.pending[coalesce_key] = event
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.hub.coalesce_seconds, self.flush)
+
+    def flush(self):
+        self.flush_handle = None
+        pending, self.pending = self.pending, {}
+        for event in pending.values():
+            self.deliver(event)
+
+    def heartbeat(self):
+        self.heartbeat_handle = self.loop.call_later(self.hub.heartbeat_seconds, self.heartbeat)
+        for subscription in list(self.subscribers):
+            subscription.put(HEARTBEAT)
+
+    def close(self):
+        self.heartbeat_handle.cancel()
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+
+    def deliver(self, event: Event):
+        delivered = sum(subscription.put(event) for subscription in list(self.subscribers))
+        self.hub._count("delivered", delivered)
+
+class EventHub:
+    """Fans events out to the subscribers of every event loop in the process"""
+
+    def __init__(
+        self,
+        queue_size: int = EVENTS_QUEUE_SIZE,
+        coalesce_seconds: float = EVENTS_COALESCE_SECONDS,
+        max_subscribers: int = EVENTS_MAX_SUBSCRIBERS,
+        heartbeat_seconds: float = EVENTS_HEARTBEAT_SECONDS,
+        relay: Optional["RedisEventRelay"] = None
+    ):
+        self.queue_size = queue_size
+        self.coalesce_seconds = coalesce_seconds
+        self.max_subscribers = max_subscribers
+        self.heartbeat_seconds = heartbeat_seconds
+        self.relay = relay
+        if relay is not None:
+            relay.hub = self
+        self._lock = threading.Lock()
+        self._channels: Dict[asyncio.AbstractEventLoop, _LoopChannel] = {}
+        self._subscribers = 0
+        self._counts = {"published": 0, "delivered": 0, "coalesced": 0, "dropped": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    @property
+    def active(self) -> bool:
+        """Whether published events can reach anyone, so publishers can skip building them"""
+        return self.relay is not None or self._subscribers > 0
+
+    def subscribe(self) -> Subscription:
+        """Open a send queue on the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                raise TooManySubscribers()
+            channel = self._channels.get(loop)
+            if channel is None:
+                channel = self._channels[loop] = _LoopChannel(self, loop)
+            self._subscribers += 1
+        subscription = Subscription(channel, self.queue_size)
+        channel.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Close a send queue; called from its event loop"""
+        subscription.channel.remove(subscription)
+
+    def _removed(self, channel: _LoopChannel):
+        with self._lock:
+            self._subscribers -= 1
+            if not channel.subscribers and self._channels.get(channel.loop) is channel:
+                del self._channels[channel.loop]
+                channel.close()
+
+    def publish(self, event_type: str, data: str, coalesce_key: Optional[Hashable] = None):
+        """Send a serialized event to every subscriber; safe to call from any thread"""
+        self._count("published")
+        if self.relay is not None and self.relay.publish(event_type, data, coalesce_key):
+            return
+        self.dispatch(Event(event_type, data), coalesce_key)
+
+    def dispatch(self, event: Event, coalesce_key: Optional[Hashable] = None):
+        """Deliver an event to this process' subscribers"""
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            try:
+                channel.loop.call_soon_threadsafe(channel.receive, event, coalesce_key)
+            except RuntimeError:
+                # The loop was closed without unsubscribing, e.g. a test client's
+                pass
+
+    def start(self):
+        if self.relay is not None:
+            self.relay.start()
+
+    def stop(self):
+        if self.relay is not None:
+            self.relay.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": self._subscribers,
+                "relay": self.relay is not None,
+                **self._counts,
+            }
+
+class RedisEventRelay:
+    """Carries events between worker processes over Redis pub/sub"""
+
+    def __init__(self, client: RedisClient, channel: str = RELAY_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self.hub: Optional[EventHub] = None
+        self._stopping = threading.Event()
+        self._conn: Optional[RedisConnection] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, event_type: str, data: str, coalesce_key: Optional[Hashable]) -> bool:
+        """Publish to every worker, returning False when Redis can't be reached"""
+        try:
+            self.client.execute("PUBLISH", self.channel, json.dumps([event_type, data, coalesce_key]))
+            return True
+        except (OSError, RedisError):
+            logger.warning("Could not publish a %s event to Redis, delivering it locally only", event_type, exc_info=True)
+            return False
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, name="event-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        conn = self._conn
+        if conn is not None:
+            # Wakes the listener from its blocking read
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            try:
+                self._conn = self.client.connect()
+                self._conn.send("SUBSCRIBE", self.channel)
+                self._conn.read()
+                # Messages arrive whenever anyone publishes, so wait without a timeout
+                self._conn.sock.settimeout(None)
+                while True:
+                    kind, _, message = self._conn.read()
+                    if kind == b"message":
+                        event_type, data, coalesce_key = json.loads(message)
+                        self.hub.dispatch(Event(event_type, data), coalesce_key)
+            except (OSError, RedisError, ValueError):
+                if self._stopping.is_set():
+                    return
+                logger.warning("Lost the event relay subscription, reconnecting", exc_info=True)
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+            self._stopping.wait(RELAY_RETRY_SECONDS)
+
+def create_event_hub() -> EventHub:
+    """Hub for this process, relayed through Redis when the caches are shared there"""
+    return EventHub(relay=RedisEventRelay(get_redis_client()) if CACHE_BACKEND == "redis" else None)
+
+event_hub = create_event_hub()
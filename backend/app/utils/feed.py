@@ -0,0 +1,89 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Set
+
+from ..models.models import Tweet, User, tweet_reactions
+from .images import avatar_thumbnail
+
+# Related objects listing endpoints embed on request, as ?expand=author
+EXPANDABLE = {"author"}
+
+def parse_expand(expand: Optional[str]) -> Set[str]:
+    """The comma-separated names of an expand parameter, rejecting unknown ones"""
+    names = {name.strip() for name in (expand or "").split(",") if name.strip()}
+    unknown = names - EXPANDABLE
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot expand {', '.join(sorted(unknown))}"
+        )
+    return names
+
+def author_summary(user: User) -> dict:
+    """The compact author object embedded in expanded tweets"""
+    return {
+        "username": user.username,
+        "profile_picture": user.profile_picture,
+        "avatar_thumbnail": avatar_thumbnail(user.profile_picture)
+    }
+
+def get_tweets_by_ids(db: Session, tweet_ids: List[int]) -> List[Tweet]:
+    """Load tweets in a single query, in the order of tweet_ids, skipping missing ones"""
+    if not tweet_ids:
+        return []
+    tweets = {tweet.id: tweet for tweet in db.query(Tweet).filter(Tweet.id.in_(tweet_ids))}
+    return [tweets[tweet_id] for tweet_id in tweet_ids if tweet_id in tweets]
+
+def get_authors(db: Session, author_ids) -> Dict[int, User]:
+    """Load the authors of a page of tweets in a single query, keyed by user id"""
+    author_ids = set(author_ids)
+    if not author_ids:
+        return {}
+    users = db.query(User).filter(User.id.in_(author_ids)).all()
+    return {user.id: user for user in users}
+
+def get_user_reactions(db: Session, tweet_ids, user: Optional[User]) -> Dict[int, str]:
+    """Get the viewer's reaction for each tweet id in a single query"""
+    if not tweet_ids or user is None:
+        return {}
+    rows = db.query(tweet_reactions.c.tweet_id, tweet_reactions.c.reaction_type).filter(
+        tweet_reactions.c.user_id == user.id,
+        tweet_reactions.c.tweet_id.in_(tweet_ids)
+    ).all()
+    return {tweet_id: reaction_type for tweet_id, reaction_type in rows}
+
+def hydrate_tweets(db: Session, tweets: List[Tweet], current_user: Optional[User] = None, expand_author: bool = False) -> List[dict]:
+    """Build the API representation of a page of tweets.
+
+    Counts are read from the tweets' stored counter columns, while authors and
+    the viewer's reactions are fetched with one query each, so the number of
+    statements does not depend on the number of tweets in the page. With
+    expand_author, each tweet also gets an "author" object from the same
+    authors query, saving clients a profile request per author.
+    """
+    if not tweets:
+        return []
+
+    tweet_ids = [tweet.id for tweet in tweets]
+    authors = get_authors(db, [tweet.author_id for tweet in tweets])
+    user_reactions = get_user_reactions(db, tweet_ids, current_user)
+
+    result = []
+    for tweet in tweets:
+        author = authors.get(tweet.author_id)
+        result.append({
+            "id": tweet.id,
+            "content": tweet.content,
+            "created_at": tweet.created_at,
+            "author_id": tweet.author_id,
+            "author_username": author.username if author else "Unknown",
+            "parent_id": tweet.parent_id,
+            "replies_count": tweet.replies_count or 0,
+            "likes_count": tweet.likes_count or 0,
+            "dislikes_count": tweet.dislikes_count or 0,
+            "user_reaction": user_reactions.get(tweet.id)
+        })
+        if expand_author:
+            result[-1]["author"] = author_summary(author) if author else None
+
+    return result
@@ -0,0 +1,224 @@
+"""Profile pictures: size-capped multipart parsing, Pillow re-encoding and storage.
+
+Uploads are parsed from the request stream as it arrives, with file parts
+spooled to temporary files by Starlette, and the request is rejected as soon
+as its body passes AVATAR_MAX_BYTES instead of after it has been received.
+
+Accepted images are decoded, re-encoded as JPEG (which drops metadata and
+anything else that isn't pixels) and resized into AVATAR_SIZES square
+thumbnails. Decoding and resizing are CPU bound, so they run in a small pool
+of their own rather than in the request threadpool.
+
+Files are named by the hash of their content and never change, so they are
+served with a year-long immutable Cache-Control and a new picture gets a new
+URL. Replaced pictures are deleted by ``collect_avatars`` once no user points
+at them and AVATAR_GC_GRACE_SECONDS have passed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Request
+from hashlib import blake2b
+from pathlib import Path
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.orm import Session
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from typing import BinaryIO, Dict, List, Optional
+import io
+import logging
+import os
+import re
+import threading
+import time
+import warnings
+
+from ..models.models import User
+
+logger = logging.getLogger(__name__)
+
+# Largest accepted upload, and largest image by pixel count (decompression bombs
+# are small files that decode to huge images)
+AVATAR_MAX_BYTES = int(os.environ.get("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.environ.get("AVATAR_MAX_PIXELS", str(40_000_000)))
+# Thumbnail edges in pixels, and the longest edge kept of the original
+AVATAR_SIZES = tuple(int(size) for size in os.environ.get("AVATAR_SIZES", "48,128,400").split(","))
+AVATAR_MAX_EDGE = int(os.environ.get("AVATAR_MAX_EDGE", "1024"))
+AVATAR_JPEG_QUALITY = int(os.environ.get("AVATAR_JPEG_QUALITY", "85"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+# Thumbnail embedded in tweets expanded with their author, sharp on 2x screens
+AVATAR_FEED_SIZE = int(os.environ.get("AVATAR_FEED_SIZE", "128"))
+# Seconds an unused picture is kept, and seconds between collections (0 disables)
+AVATAR_GC_GRACE_SECONDS = float(os.environ.get("AVATAR_GC_GRACE_SECONDS", "3600"))
+AVATAR_GC_INTERVAL_SECONDS = float(os.environ.get("AVATAR_GC_INTERVAL_SECONDS", "3600"))
+
+# Stored pictures are served from here, see AVATARS_DIR
+AVATAR_URL_PREFIX = "/uploads/avatars/"
+AVATAR_URL_RE = re.compile(r"^/uploads/avatars/([0-9a-f]{32})\.jpg$")
+AVATAR_FILE_RE = re.compile(r"^([0-9a-f]{32})(?:_\d+)?\.jpg$")
+
+ACCEPTED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16 * 1024
+
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+class UploadTooLarge(MultiPartException):
+    """The request body passed the size cap; a MultiPartException so the parser closes its files"""
+
+class InvalidImage(Exception):
+    """The upload isn't an image in an accepted format and size"""
+
+async def read_upload(request: Request, field: str, max_bytes: Optional[int] = None) -> UploadFile:
+    """Parse a multipart request with one file, failing with UploadTooLarge past max_bytes.
+
+    max_bytes defaults to AVATAR_MAX_BYTES. Raises MultiPartException for
+    malformed bodies and KeyError when the field is missing; the caller closes
+    the returned file.
+    """
+    if max_bytes is None:
+        max_bytes = AVATAR_MAX_BYTES
+    limit = max_bytes + MULTIPART_OVERHEAD
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+
+    async def capped_stream():
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+            yield chunk
+
+    form = await MultiPartParser(request.headers, capped_stream(), max_files=1, max_fields=10).parse()
+    upload = form.get(field)
+    if not isinstance(upload, UploadFile):
+        await form.close()
+        raise KeyError(field)
+    if upload.size is not None and upload.size > max_bytes:
+        await upload.close()
+        raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+    return upload
+
+def _encode_jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=AVATAR_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+def _write_once(path: Path, data: bytes):
+    # Content-addressed, so an existing file already holds these bytes; touched
+    # so the collector gives it a fresh grace period until the upload commits
+    try:
+        os.utime(path)
+        return
+    except FileNotFoundError:
+        pass
+    # Written next to the target and renamed, so readers never see half a file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+def _process_avatar(source: BinaryIO, directory: Path) -> Dict[str, str]:
+    try:
+        with warnings.catch_warnings():
+            # Treat Pillow's decompression bomb warning as the error it is here
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(source) as image:
+                if image.format not in ACCEPTED_FORMATS:
+                    raise InvalidImage(f"Unsupported image format {image.format}")
+                if image.width * image.height > AVATAR_MAX_PIXELS:
+                    raise InvalidImage(f"Image larger than {AVATAR_MAX_PIXELS} pixels")
+                image.load()
+                image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning, OSError, SyntaxError) as e:
+        raise InvalidImage(f"Could not read the image: {e}")
+
+    # Flatten transparency onto white, as JPEG has none
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Files are named after the re-encoded original, so a new picture always
+    # gets new URLs and the same picture uploaded twice shares its files
+    original = image.copy()
+    original.thumbnail((AVATAR_MAX_EDGE, AVATAR_MAX_EDGE), Image.LANCZOS)
+    data = _encode_jpeg(original)
+    digest = blake2b(data, digest_size=16).hexdigest()
+
+    files = {"original": f"{digest}.jpg"}
+    for size in AVATAR_SIZES:
+        files[str(size)] = f"{digest}_{size}.jpg"
+        _write_once(directory / files[str(size)], _encode_jpeg(ImageOps.fit(image, (size, size), Image.LANCZOS)))
+    # The original last, as its presence means the thumbnails are complete
+    _write_once(directory / files["original"], data)
+    return files
+
+def process_avatar(source: BinaryIO, directory: Path) -> Dict[str, str]:
+    """Validate an image and store it as <hash>.jpg plus <hash>_<size>.jpg thumbnails.
+
+    Runs in the image pool and waits for it; returns file names by size, with
+    the re-encoded original under "original". Raises InvalidImage.
+    """
+    return image_executor.submit(_process_avatar, source, directory).result()
+
+def avatar_files(directory: Path, picture_url: str) -> List[Path]:
+    """The stored files of a content-addressed picture URL; empty for other URLs"""
+    match = AVATAR_URL_RE.match(picture_url or "")
+    if match is None:
+        return []
+    digest = match.group(1)
+    return [directory / f"{digest}.jpg"] + [directory / f"{digest}_{size}.jpg" for size in AVATAR_SIZES]
+
+def avatar_thumbnail(picture_url: Optional[str], size: int = AVATAR_FEED_SIZE) -> Optional[str]:
+    """URL of a picture's square thumbnail, or the picture itself when it has none
+    (pictures stored before thumbnails, or a size that isn't generated)"""
+    match = AVATAR_URL_RE.match(picture_url or "")
+    if match is None or size not in AVATAR_SIZES:
+        return picture_url
+    return f"{AVATAR_URL_PREFIX}{match.group(1)}_{size}.jpg"
+
+def mark_superseded(directory: Path, picture_url: str):
+    """Restart the grace period of a replaced picture's files, as cached
+    profiles and pages may still point at them for a while"""
+    for path in avatar_files(directory, picture_url):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+def collect_avatars(db: Session, directory: Path, grace_seconds: float = AVATAR_GC_GRACE_SECONDS) -> int:
+    """Delete stored pictures no user points at, untouched for grace_seconds.
+
+    The grace period covers uploads that are written but not committed yet,
+    and references to replaced pictures in caches. Returns the files deleted.
+    """
+    referenced = {
+        match.group(1)
+        for (url,) in db.query(User.profile_picture).filter(User.profile_picture.like(f"{AVATAR_URL_PREFIX}%")).distinct()
+        for match in [AVATAR_URL_RE.match(url)] if match
+    }
+    cutoff = time.time() - grace_seconds
+    deleted = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        # Leftovers of interrupted writes go too
+        match = AVATAR_FILE_RE.match(entry.name)
+        if not entry.name.endswith(".tmp") and (match is None or match.group(1) in referenced):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+        except FileNotFoundError:
+            # Collected by another worker
+            pass
+    if deleted:
+        logger.info("Deleted %s unused avatar files", deleted)
+    return deleted
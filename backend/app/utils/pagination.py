@@ -0,0 +1,77 @@
+from fastapi import HTTPException, status
+from sqlalchemy import String, tuple_, type_coerce
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import ColumnElement
+from typing import List, Optional, Tuple, Union
+import base64
+import json
+
+from ..models.models import Tweet
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_key: Union[str, float], row_id: int) -> str:
+    """Encode a (sort key, id) position, such as (created_at, id), as an opaque cursor string"""
+    payload = json.dumps([sort_key, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Union[str, float], int]:
+    """Decode a cursor produced by encode_cursor, raising a 400 if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(sort_key, bool) or not isinstance(sort_key, (str, int, float)) or not isinstance(row_id, int):
+            raise ValueError("Unexpected cursor payload")
+        return sort_key, row_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def paginate_keyset(
+    query: Query,
+    created_at_column: ColumnElement,
+    id_column: ColumnElement,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None
+) -> Tuple[List[tuple], Optional[str]]:
+    """Fetch one page of a query ordered by (created_at, id), newest first.
+
+    With a cursor the page starts right after the (created_at, id) position it
+    encodes, which is an index range scan; without one the legacy skip offset
+    is used. Returns the rows as selected by the query and the cursor of the
+    next page, or None when there are no more rows. A limit below 1 gives an
+    empty page.
+    """
+    if limit <= 0:
+        return [], None
+
+    # created_at compared as stored, so the cursor round-trips exactly what SQLite holds
+    created_at_raw = type_coerce(created_at_column, String)
+    query = query.add_columns(created_at_raw, id_column)
+
+    if cursor is not None:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_at_raw, id_column) < tuple_(created_at, row_id))
+
+    query = query.order_by(created_at_column.desc(), id_column.desc())
+    if cursor is None and skip:
+        query = query.offset(skip)
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+
+    return [tuple(row)[:-2] for row in rows], next_cursor
+
+def paginate_tweets(query: Query, limit: int, skip: int = 0, cursor: Optional[str] = None) -> Tuple[List[Tweet], Optional[str]]:
+    """Fetch one page of a tweet query, newest first; see paginate_keyset"""
+    rows, next_cursor = paginate_keyset(query, Tweet.created_at, Tweet.id, limit, skip=skip, cursor=cursor)
+    return [tweet for tweet, in rows], next_cursor
@@ -0,0 +1,234 @@
+"""Cache backend on a Redis server.
+
+``RedisClient`` is a small client for the Redis wire protocol (RESP), with a
+pool of sockets so threadpool workers don't share a connection. It only needs
+the standard library and works with Redis and compatible servers (Valkey,
+KeyDB, Dragonfly).
+
+``RedisCache`` stores JSON-encoded values under "<namespace>:<key>". The cache
+is an optimization, so when the server can't be reached, gets count as misses
+and sets and deletes are skipped, with a warning logged. ``incr`` raises, as
+its callers depend on the count.
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from typing import Any, Hashable, Iterable, List, Optional
+from urllib.parse import unquote, urlparse
+
+from .cache import CACHE_URL, CacheBackend
+
+logger = logging.getLogger(__name__)
+
+CACHE_SOCKET_TIMEOUT = float(os.environ.get("CACHE_SOCKET_TIMEOUT", "0.5"))
+CACHE_POOL_SIZE = int(os.environ.get("CACHE_POOL_SIZE", "16"))
+
+class RedisError(Exception):
+    """Error reply from the server, or a reply the client can't parse"""
+
+class RedisConnection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by the cache server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self.read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisClient:
+    """Thread-safe client for a redis://[:password@]host[:port][/db] URL"""
+
+    def __init__(self, url: str, timeout: float = CACHE_SOCKET_TIMEOUT, pool_size: int = CACHE_POOL_SIZE):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported cache URL {url!r}, expected redis://")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+
+    def connect(self) -> RedisConnection:
+        """A new authenticated connection outside the pool, for commands that
+        take it over, like SUBSCRIBE; the caller closes it"""
+        conn = RedisConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.send("AUTH", self.password)
+                conn.read()
+            if self.db:
+                conn.send("SELECT", self.db)
+                conn.read()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def execute(self, *args):
+        """Send one command and return its reply"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            conn.send(*args)
+            reply = conn.read()
+        except RedisError:
+            # The connection is still in a clean state after an error reply
+            self._release(conn)
+            raise
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn: RedisConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class RedisCache(CacheBackend):
+    """CacheBackend storing JSON values on a Redis server"""
+
+    def __init__(self, client: RedisClient, namespace: str, ttl: float):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _ttl_ms(self, ttl: Optional[float]) -> int:
+        return max(1, int((self.ttl if ttl is None else ttl) * 1000))
+
+    def _failed(self, command: str):
+        with self._lock:
+            self._errors += 1
+        logger.warning("Cache %s %s failed", self.namespace, command, exc_info=True)
+
+    def _count(self, values: List[Optional[Any]]):
+        hits = sum(1 for value in values if value is not None)
+        with self._lock:
+            self._hits += hits
+            self._misses += len(values) - hits
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        keys = [self._key(key) for key in keys]
+        if not keys:
+            return []
+        try:
+            raw = self.client.execute("MGET", *keys)
+            values = [None if item is None else json.loads(item) for item in raw]
+        except (OSError, RedisError, ValueError):
+            self._failed("MGET")
+            values = [None] * len(keys)
+        self._count(values)
+        return values
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        try:
+            self.client.execute("SET", self._key(key), json.dumps(value), "PX", self._ttl_ms(ttl))
+        except (OSError, RedisError):
+            self._failed("SET")
+
+    def delete(self, key: Hashable):
+        try:
+            self.client.execute("DEL", self._key(key))
+        except (OSError, RedisError):
+            self._failed("DEL")
+
+    def incr(self, key: Hashable, amount: int = 1, ttl: Optional[float] = None) -> int:
+        key = self._key(key)
+        value = self.client.execute("INCRBY", key, amount)
+        if value == amount:
+            # The key was just created
+            self.client.execute("PEXPIRE", key, self._ttl_ms(ttl))
+        return value
+
+    def clear(self):
+        """Delete every key of this namespace"""
+        cursor = "0"
+        while True:
+            cursor, keys = self.client.execute("SCAN", cursor, "MATCH", f"{self.namespace}:*", "COUNT", 1000)
+            if keys:
+                self.client.execute("DEL", *keys)
+            if cursor in (b"0", "0"):
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "redis",
+                "hits": self._hits,
+                "misses": self._misses,
+                "errors": self._errors,
+            }
+
+_client_lock = threading.Lock()
+_client: Optional[RedisClient] = None
+
+def get_redis_client() -> RedisClient:
+    """Client for CACHE_URL shared by every RedisCache; connects on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RedisClient(CACHE_URL)
+        return _client
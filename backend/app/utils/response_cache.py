@@ -0,0 +1,115 @@
+"""Cache of serialized responses for anonymous feed requests.
+
+Anonymous responses are identical for every caller, so their JSON bytes are
+kept, keyed by path and query string. Writes that change what the feed shows
+call ``invalidate``, which bumps a version number; entries of older versions
+are never served again.
+
+An entry is fresh for RESPONSE_CACHE_TTL seconds, and then stale for another
+RESPONSE_CACHE_STALE_TTL seconds. The first request to find it stale rebuilds
+it, while concurrent requests keep getting the stale bytes instead of piling
+onto the database. Requests that miss wait on a per-key lock, so a burst of
+misses for the same key is computed once. The cache and its version are per
+process, so another worker's writes show up once the TTL runs out.
+"""
+from dataclasses import dataclass, field
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+from .cache import TTLCache
+
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "5"))
+RESPONSE_CACHE_STALE_TTL = float(os.environ.get("RESPONSE_CACHE_STALE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1000"))
+
+# Keys hash onto a fixed set of locks, so the locks don't grow with the keys
+LOCK_STRIPES = 64
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    version: int = 0
+    fresh_until: float = 0.0
+
+class ResponseCache:
+    """Versioned response cache with stale-while-revalidate and single-flight misses"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, stale_ttl: float = RESPONSE_CACHE_STALE_TTL, max_size: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = TTLCache(max_size, ttl + stale_ttl)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._counter_lock = threading.Lock()
+        self._version = 0
+        self._counts = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._counts[name] += 1
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self._version:
+            return None
+        return entry
+
+    def _compute(self, key: str, compute: Callable[[], CachedResponse]) -> CachedResponse:
+        # A write during the computation leaves the result already outdated
+        version = self._version
+        entry = compute()
+        entry.version = version
+        entry.fresh_until = time.monotonic() + self.ttl
+        self._entries.set(key, entry)
+        return entry
+
+    def get_or_compute(self, key: str, compute: Callable[[], CachedResponse]) -> CachedResponse:
+        """Return the cached response for key, calling compute to build it when needed"""
+        lock = self._locks[hash(key) % LOCK_STRIPES]
+
+        entry = self._lookup(key)
+        if entry is not None:
+            if entry.fresh_until > time.monotonic():
+                self._count("hits")
+                return entry
+            # Stale: one request refreshes it, the others are served the old bytes
+            if not lock.acquire(blocking=False):
+                self._count("stale_hits")
+                return entry
+            try:
+                self._count("refreshes")
+                return self._compute(key, compute)
+            finally:
+                lock.release()
+
+        with lock:
+            # Another request may have computed it while this one waited
+            entry = self._lookup(key)
+            if entry is not None and entry.fresh_until > time.monotonic():
+                self._count("hits")
+                return entry
+            self._count("misses")
+            return self._compute(key, compute)
+
+    def invalidate(self):
+        """Stop serving every entry stored so far"""
+        with self._counter_lock:
+            self._version += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self._counts)
+            stats["version"] = self._version
+        stats["size"] = self._entries.stats()["size"]
+        return stats
+
+feed_cache = ResponseCache()
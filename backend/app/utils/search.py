@@ -0,0 +1,62 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+
+from ..models.models import Tweet
+from .feed import get_tweets_by_ids
+from .pagination import decode_cursor, encode_cursor
+
+def build_match_query(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching tweets containing every word.
+
+    Each word is quoted, so FTS5 operators and punctuation in user input are
+    searched for literally instead of raising syntax errors.
+    """
+    terms = q.split()
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def search_tweets(db: Session, q: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Tweet], Optional[str]]:
+    """Fetch one page of tweets matching q, best matches first.
+
+    Results are ordered by bm25 score (lower is better), then newest first,
+    and the cursor encodes the (score, id) of the last result. Returns the
+    tweets and the cursor of the next page, or None when there are no more.
+
+    Cursors are approximate: scores depend on the whole index, so tweets
+    added or deleted between pages shift them, and the next page may repeat
+    or skip a few results. Unlike the feeds' cursors, they are only meant for
+    paging through results shortly after the first page.
+    """
+    match = build_match_query(q)
+    if match is None or limit <= 0:
+        return [], None
+
+    params = {"match": match, "limit": limit + 1}
+    after_cursor = ""
+    if cursor is not None:
+        params["score"], params["tweet_id"] = decode_cursor(cursor)
+        after_cursor = (
+            "AND (bm25(tweets_fts) > :score "
+            "OR (bm25(tweets_fts) = :score AND tweets_fts.rowid < :tweet_id))"
+        )
+
+    # Fetch one extra row to know whether another page exists
+    rows = db.execute(text(
+        "SELECT tweets_fts.rowid, bm25(tweets_fts) FROM tweets_fts "
+        f"WHERE tweets_fts MATCH :match {after_cursor} "
+        "ORDER BY bm25(tweets_fts), tweets_fts.rowid DESC LIMIT :limit"
+    ), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    return get_tweets_by_ids(db, [tweet_id for tweet_id, _ in rows]), next_cursor
+
+def rebuild_search_index(db: Session):
+    """Reindex the content of every tweet"""
+    db.execute(text("INSERT INTO tweets_fts (tweets_fts) VALUES ('rebuild')"))
+    db.commit()
@@ -1,12 +1,79 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import logging
+import os
+import threading
 from ..schemas.user import TokenData
 
+logger = logging.getLogger(__name__)
+
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Password hashing pool: bcrypt threads, and hashes allowed running or queued
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_IN_FLIGHT = int(os.environ.get("PASSWORD_HASH_MAX_IN_FLIGHT", str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool has no room for more work"""
+
+class PasswordHasher:
+    """Run bcrypt work in a dedicated thread pool with bounded queueing.
+
+    At most ``workers`` hashes run at once and at most ``max_in_flight`` are
+    running or queued; beyond that calls fail fast with PasswordHasherBusy
+    instead of piling up request threads behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_in_flight: int):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def run(self, func, *args):
+        """Run func(*args) in the pool and wait for its result"""
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+
+        try:
+            result = self._executor.submit(func, *args).result()
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+                self._failed += 1
+            raise
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        return result
+
+    def stats(self):
+        """Snapshot of the pool's queue depth and counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_IN_FLIGHT)
+
 # JWT settings
 SECRET_KEY = "YOUR_SECRET_KEY_HERE"  # In production, use a secure randomly generated key
 ALGORITHM = "HS256"
@@ -14,11 +81,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 def verify_password(plain_password, hashed_password):
     """Verify that the plain password matches the hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.run(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password):
     """Hash a password for storing"""
-    return pwd_context.hash(password)
+    return password_hasher.run(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT token with an optional expiration time"""
@@ -37,30 +104,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def verify_token(token: str):
     """Verify a JWT token and return the token data"""
     if not token:
-        print("DEBUG - Empty token provided to verify_token")
+        logger.debug("Empty token provided to verify_token")
         return None
         
     try:
-        # Print the token for debugging (just first 10 chars)
-        token_preview = token[:10] + "..." if len(token) > 10 else token
-        print(f"DEBUG - Verifying token: {token_preview}")
-        
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"DEBUG - Decoded token payload: {payload}")
         
         username: str = payload.get("sub")
         user_id: int = payload.get("id")
         
         if username is None or user_id is None:
-            print(f"DEBUG - Missing fields in token payload: username={username}, user_id={user_id}")
+            logger.debug("Missing fields in token payload: username=%s, user_id=%s", username, user_id)
             return None
             
-        # Add debug output
-        print(f"DEBUG - Token verification successful: user_id={user_id}, username={username}")
+        logger.debug("Token verification successful: user_id=%s", user_id)
         return TokenData(username=username, user_id=user_id)
     except JWTError as e:
-        print(f"DEBUG - JWT error in token verification: {str(e)}")
+        logger.debug("JWT error in token verification: %s", e)
+        return None
+    except Exception:
+        logger.warning("Unexpected error in token verification", exc_info=True)
         return None
-    except Exception as e:
-        print(f"DEBUG - Unexpected error in token verification: {str(e)}")
-        return None
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""Static file serving: caching headers, precompressed assets and the SPA shell.
+
+Build assets are compressed once, at startup, into .gz and .br files next to
+them (.br files only when the ``brotli`` module from requirements.txt is
+installed, or when the frontend build already produced them). Clients that accept an encoding get
+the compressed file as it is, instead of the server compressing it on every
+request.
+
+The React app's index.html is kept in memory with its gzipped form and an
+ETag, and reloaded in a worker thread when the file on disk changes, so page
+loads neither read the file nor, when the browser's copy is current, send it.
+"""
+from email.utils import formatdate
+from hashlib import blake2b
+from mimetypes import guess_type
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from typing import Dict, List, Optional, Set, Tuple
+import gzip
+import logging
+import os
+import threading
+
+from anyio import to_thread
+
+from .conditional import etag_matches, not_modified_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# A year, the longest max-age caches are expected to honor
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Encodings served from precompressed files, by preference, with their suffixes
+PRECOMPRESSED_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+# Text formats worth compressing, and the smallest file worth it
+COMPRESSIBLE_EXTENSIONS = {".css", ".html", ".ico", ".js", ".json", ".map", ".svg", ".txt", ".xml"}
+PRECOMPRESS_MIN_BYTES = 1024
+
+def accepted_encodings(headers: Headers) -> Set[str]:
+    """Content codings allowed by a request's Accept-Encoding, leaving out those with q=0"""
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in PRECOMPRESSED_ENCODINGS)
+    return accepted
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # No timestamp, so every worker writes the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def available_encodings() -> List[Tuple[str, str]]:
+    """The precompressed encodings this process can generate"""
+    return [(encoding, suffix) for encoding, suffix in PRECOMPRESSED_ENCODINGS if encoding != "br" or brotli is not None]
+
+def precompress_directory(directory: str, min_bytes: int = PRECOMPRESS_MIN_BYTES) -> int:
+    """Write compressed copies of the compressible files in directory that lack an up-to-date one.
+
+    Copies that wouldn't be smaller are skipped. Safe to run from several
+    workers at once. Returns the number of files written.
+    """
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            stat = os.stat(path)
+            if stat.st_size < min_bytes:
+                continue
+            data = None
+            for encoding, suffix in available_encodings():
+                try:
+                    if os.stat(path + suffix).st_mtime >= stat.st_mtime:
+                        continue
+                except FileNotFoundError:
+                    pass
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                compressed = compress(data, encoding)
+                if len(compressed) >= len(data):
+                    continue
+                # Written next to the target and renamed, so readers never see half a file
+                tmp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path + suffix)
+                written += 1
+    if written:
+        logger.info("Precompressed %s static files in %s", written, directory)
+    return written
+
+class ImmutableStaticFiles(StaticFiles):
+    """Serves files whose names change with their content, so clients can
+    keep them without ever revalidating"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+class PrecompressedStaticFiles(ImmutableStaticFiles):
+    """Serves a file's .br or .gz copy to clients accepting that encoding.
+
+    Meant for build output with content hashes in the file names, so the
+    responses are immutable too. Copies older than their file are ignored.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers)
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            if variant_stat.st_mtime < stat_result.st_mtime:
+                continue
+            # Its own ETag, from the compressed file, as it's a different representation
+            response = FileResponse(
+                f"{full_path}{suffix}",
+                status_code=status_code,
+                stat_result=variant_stat,
+                media_type=guess_type(str(full_path))[0] or "text/plain",
+                headers={"Content-Encoding": encoding}
+            )
+            if self.is_not_modified(response.headers, request_headers):
+                response = NotModifiedResponse(response.headers)
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            break
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+class SpaShell:
+    """A single-page app's index.html, kept in memory and reloaded when the file changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._key = None
+        # Body and ETag by encoding, with the Last-Modified date, swapped as one
+        self._state: Tuple[Dict[Optional[str], Tuple[bytes, str]], str] = ({}, "")
+
+    def _load(self):
+        # One stat per request; the file is only read again when it changed
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._key:
+            return
+        with self._lock:
+            if key == self._key:
+                return
+            with open(self.path, "rb") as f:
+                body = f.read()
+            digest = blake2b(body, digest_size=8).hexdigest()
+            variants = {None: (body, f'"{digest}"')}
+            compressed = compress(body, "gzip")
+            if len(compressed) < len(body):
+                variants["gzip"] = (compressed, f'"{digest}-gzip"')
+            self._state = (variants, formatdate(stat.st_mtime, usegmt=True))
+            self._key = key
+        logger.info("Loaded %s", self.path)
+
+    async def response(self, request: Request) -> Response:
+        """The shell for request, gzipped if accepted, or a 304 when the client's copy is current"""
+        # Off the event loop, as a new build means reading and compressing the file
+        await to_thread.run_sync(self._load)
+        variants, last_modified = self._state
+        encoding = "gzip" if "gzip" in variants and "gzip" in accepted_encodings(request.headers) else None
+        body, etag = variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Last-Modified": last_modified,
+            # It names the current asset bundles, so it is revalidated on every load
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return not_modified_response(headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type="text/html", headers=headers)
@@ -0,0 +1,70 @@
+"""Loading whole conversation threads.
+
+A thread is a tweet and every reply below it. Its tweet ids are collected with
+one recursive CTE over tweets.parent_id, walking the tree level by level (using
+the parent_id prefix of ix_tweets_feed), and then loaded and hydrated in
+batch, so a thread costs the same few statements however deep it is.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import os
+
+from ..models.models import User
+from .feed import get_tweets_by_ids, hydrate_tweets
+
+# Upper bounds on the levels of replies and the tweets returned per thread
+THREAD_MAX_DEPTH = int(os.environ.get("THREAD_MAX_DEPTH", "20"))
+THREAD_MAX_NODES = int(os.environ.get("THREAD_MAX_NODES", "500"))
+
+# ORDER BY in the recursive step makes SQLite expand the queue breadth first,
+# and LIMIT stops the recursion once max_nodes rows were produced, so a capped
+# thread keeps its shallowest replies
+THREAD_IDS_QUERY = text(
+    "WITH RECURSIVE thread(id, depth) AS ("
+    " SELECT id, 0 FROM tweets WHERE id = :tweet_id"
+    " UNION ALL"
+    " SELECT tweets.id, thread.depth + 1 FROM tweets JOIN thread ON tweets.parent_id = thread.id"
+    " WHERE thread.depth < :max_depth"
+    " ORDER BY 2"
+    " LIMIT :max_nodes"
+    ") SELECT id FROM thread"
+)
+
+def get_thread_tweet_ids(db: Session, tweet_id: int, max_depth: int = THREAD_MAX_DEPTH, max_nodes: int = THREAD_MAX_NODES) -> List[int]:
+    """Ids of a tweet and its replies down to max_depth levels, at most max_nodes of them, root first"""
+    rows = db.execute(THREAD_IDS_QUERY, {"tweet_id": tweet_id, "max_depth": max_depth, "max_nodes": max_nodes})
+    return [row[0] for row in rows]
+
+def get_thread(
+    db: Session,
+    tweet_id: int,
+    current_user: Optional[User] = None,
+    max_depth: int = THREAD_MAX_DEPTH,
+    max_nodes: int = THREAD_MAX_NODES
+) -> Optional[dict]:
+    """Build the nested TweetDetail representation of a thread, or None if the tweet does not exist.
+
+    Replies are ordered oldest first at every level. The caps are clamped to
+    THREAD_MAX_DEPTH and THREAD_MAX_NODES. Tweets cut off by them are left
+    out; their parents still report the full replies_count.
+    """
+    max_depth = max(0, min(max_depth, THREAD_MAX_DEPTH))
+    max_nodes = max(1, min(max_nodes, THREAD_MAX_NODES))
+    tweet_ids = get_thread_tweet_ids(db, tweet_id, max_depth, max_nodes)
+    if not tweet_ids:
+        return None
+
+    tweets = get_tweets_by_ids(db, tweet_ids)
+    tweets.sort(key=lambda tweet: (tweet.created_at, tweet.id))
+    nodes: Dict[int, dict] = {}
+    for node in hydrate_tweets(db, tweets, current_user):
+        node["replies"] = []
+        nodes[node["id"]] = node
+
+    # Tweets are in creation order, so each parent's replies are appended oldest first
+    for node in nodes.values():
+        if node["id"] != tweet_id and node["parent_id"] in nodes:
+            nodes[node["parent_id"]]["replies"].append(node)
+
+    return nodes[tweet_id]
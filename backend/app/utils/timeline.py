@@ -0,0 +1,154 @@
+"""Home timelines of followed accounts.
+
+Timelines are materialized on write: a new top-level tweet is copied into
+its author's and followers' ``timeline_entries`` (fan-out-on-write), following
+someone copies their recent tweets in and unfollowing removes them. Authors
+with more than FANOUT_FOLLOWER_THRESHOLD followers are not fanned out; their
+tweets are merged into each follower's page when it is read
+(fan-out-on-read); when unfollows bring an author back to the threshold,
+their recent tweets are copied into their followers' timelines. Either way a page is a few index range scans of at most
+``limit`` rows, however many accounts the reader follows.
+"""
+from sqlalchemy import String, delete, func, insert, literal, select, type_coerce, union_all
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+import os
+
+from ..models.models import TimelineEntry, Tweet, User, followers
+from .feed import get_tweets_by_ids
+from .pagination import encode_cursor, paginate_keyset
+
+# Authors above this many followers are merged in on read instead of fanned out
+FANOUT_FOLLOWER_THRESHOLD = int(os.environ.get("FANOUT_FOLLOWER_THRESHOLD", "10000"))
+
+# Most recent tweets per followed account copied in on follow and on rebuild
+TIMELINE_BACKFILL_LIMIT = int(os.environ.get("TIMELINE_BACKFILL_LIMIT", "200"))
+
+ENTRY_COLUMNS = ["user_id", "tweet_id", "author_id", "created_at"]
+
+def fan_out_tweet(db: Session, tweet_id: int):
+    """Copy a new top-level tweet into its author's and followers' timelines, in the caller's transaction"""
+    own_entry = select(Tweet.author_id, Tweet.id, Tweet.author_id, Tweet.created_at).where(Tweet.id == tweet_id)
+    follower_entries = (
+        select(followers.c.follower_id, Tweet.id, Tweet.author_id, Tweet.created_at)
+        .select_from(followers)
+        .join(Tweet, Tweet.author_id == followers.c.followed_id)
+        .join(User, User.id == Tweet.author_id)
+        .where(Tweet.id == tweet_id, User.followers_count <= FANOUT_FOLLOWER_THRESHOLD)
+    )
+    db.execute(insert(TimelineEntry).from_select(ENTRY_COLUMNS, union_all(own_entry, follower_entries)))
+
+def backfill_timeline(db: Session, user_id: int, author_id: int):
+    """Copy an author's recent tweets into a new follower's timeline, in the caller's transaction"""
+    recent_tweets = (
+        select(literal(user_id), Tweet.id, Tweet.author_id, Tweet.created_at)
+        .join(User, User.id == Tweet.author_id)
+        .where(
+            Tweet.author_id == author_id,
+            Tweet.parent_id == None,
+            User.followers_count <= FANOUT_FOLLOWER_THRESHOLD
+        )
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(TIMELINE_BACKFILL_LIMIT)
+    )
+    db.execute(insert(TimelineEntry).prefix_with("OR IGNORE").from_select(ENTRY_COLUMNS, recent_tweets))
+
+def resume_fan_out(db: Session, author_id: int):
+    """Copy an author's recent tweets into every follower's timeline if an
+    unfollow just brought them back to FANOUT_FOLLOWER_THRESHOLD followers,
+    in the caller's transaction.
+
+    Their tweets were merged in on read until now, so none of those posted
+    above the threshold were fanned out.
+    """
+    followers_count = db.execute(select(User.followers_count).where(User.id == author_id)).scalar()
+    if followers_count != FANOUT_FOLLOWER_THRESHOLD:
+        return
+    recent_tweets = (
+        select(Tweet.id, Tweet.author_id, Tweet.created_at)
+        .where(Tweet.author_id == author_id, Tweet.parent_id == None)
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(TIMELINE_BACKFILL_LIMIT)
+        .subquery()
+    )
+    entries = (
+        select(followers.c.follower_id, recent_tweets.c.id, recent_tweets.c.author_id, recent_tweets.c.created_at)
+        .select_from(followers)
+        .join(recent_tweets, recent_tweets.c.author_id == followers.c.followed_id)
+    )
+    db.execute(insert(TimelineEntry).prefix_with("OR IGNORE").from_select(ENTRY_COLUMNS, entries))
+
+def prune_timeline(db: Session, user_id: int, author_id: int):
+    """Remove an unfollowed author's tweets from a timeline, in the caller's transaction"""
+    db.execute(
+        delete(TimelineEntry).where(TimelineEntry.user_id == user_id, TimelineEntry.author_id == author_id)
+    )
+
+def timeline_rebuild_select():
+    """Select the entries of every timeline: recent tweets of each followed or own account"""
+    fanned_out = select(User.id).where(User.followers_count <= FANOUT_FOLLOWER_THRESHOLD)
+    pairs = union_all(
+        select(followers.c.follower_id.label("user_id"), followers.c.followed_id.label("author_id"))
+        .where(followers.c.followed_id.in_(fanned_out)),
+        select(User.id.label("user_id"), User.id.label("author_id")),
+    ).subquery()
+
+    position = func.row_number().over(
+        partition_by=(pairs.c.user_id, pairs.c.author_id),
+        order_by=(Tweet.created_at.desc(), Tweet.id.desc())
+    )
+    ranked = (
+        select(pairs.c.user_id, Tweet.id.label("tweet_id"), Tweet.author_id, Tweet.created_at, position.label("position"))
+        .select_from(pairs)
+        .join(Tweet, Tweet.author_id == pairs.c.author_id)
+        .where(Tweet.parent_id == None)
+        .subquery()
+    )
+    return (
+        select(ranked.c.user_id, ranked.c.tweet_id, ranked.c.author_id, ranked.c.created_at)
+        .where(ranked.c.position <= TIMELINE_BACKFILL_LIMIT)
+    )
+
+def rebuild_timelines(db: Session) -> int:
+    """Recreate every materialized timeline from the followers and tweets tables"""
+    db.execute(delete(TimelineEntry))
+    result = db.execute(insert(TimelineEntry).from_select(ENTRY_COLUMNS, timeline_rebuild_select()))
+    db.commit()
+    return result.rowcount
+
+def get_home_timeline(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[Tweet], Optional[str]]:
+    """Fetch one page of a user's home timeline, newest first.
+
+    Returns the tweets and the cursor of the next page, or None when there
+    are no more tweets.
+    """
+    # Keys are (created_at as stored, tweet id), the order of both sources
+    entries, next_cursor = paginate_keyset(
+        db.query(type_coerce(TimelineEntry.created_at, String), TimelineEntry.tweet_id)
+        .filter(TimelineEntry.user_id == user_id),
+        TimelineEntry.created_at, TimelineEntry.tweet_id, limit, cursor=cursor
+    )
+    candidates = set(entries)
+    has_more = next_cursor is not None
+
+    # Merge in the followed accounts that are not fanned out, one page each
+    unfanned_authors = db.query(User.id).join(
+        followers, (followers.c.followed_id == User.id) & (followers.c.follower_id == user_id)
+    ).filter(User.followers_count > FANOUT_FOLLOWER_THRESHOLD).all()
+    for author_id, in unfanned_authors:
+        rows, next_cursor = paginate_keyset(
+            db.query(type_coerce(Tweet.created_at, String), Tweet.id)
+            .filter(Tweet.author_id == author_id, Tweet.parent_id == None),
+            Tweet.created_at, Tweet.id, limit, cursor=cursor
+        )
+        # The set drops tweets fanned out before their author crossed the threshold
+        candidates.update(rows)
+        has_more = has_more or next_cursor is not None
+
+    page = sorted(candidates, reverse=True)
+    if len(page) > limit:
+        page = page[:limit]
+        has_more = True
+    next_cursor = encode_cursor(*page[-1]) if has_more and page else None
+
+    return get_tweets_by_ids(db, [tweet_id for _, tweet_id in page]), next_cursor
@@ -0,0 +1,217 @@
+"""Trending hashtags over a sliding window of recent tweets.
+
+Hashtag uses are counted in per-minute buckets covering the last
+TRENDS_WINDOW_MINUTES. Alongside the buckets, a running total per tag holds
+the sum of its uses weighted by 2 ** (minute / half-life), so recent uses
+count more ("forward decay"). Ranking those totals is the same as ranking
+exponentially decayed scores. Recording a use only touches one bucket and one
+total, and expiring a bucket subtracts what it added, so updates cost O(1)
+amortized however many tweets the window holds.
+
+The top-K list is taken from the totals at most every TRENDS_REFRESH_SECONDS
+and served from that snapshot.
+
+Buckets are kept in TRENDS_SNAPSHOT_FILE, so trends survive restarts and are
+shared by the worker processes of a server: every TRENDS_SNAPSHOT_SECONDS a
+worker adds the uses it recorded since its last save to the file, under a
+file lock, and takes the merged buckets as its own. Each worker thus ranks
+the uses of all of them, at most one save interval behind.
+"""
+from collections import Counter, deque
+import fcntl
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..models.database import CONFIG_DIR
+
+logger = logging.getLogger(__name__)
+
+TRENDS_WINDOW_MINUTES = int(os.environ.get("TRENDS_WINDOW_MINUTES", "60"))
+TRENDS_HALF_LIFE_MINUTES = float(os.environ.get("TRENDS_HALF_LIFE_MINUTES", "15"))
+TRENDS_TOP_K = int(os.environ.get("TRENDS_TOP_K", "10"))
+TRENDS_REFRESH_SECONDS = float(os.environ.get("TRENDS_REFRESH_SECONDS", "5"))
+TRENDS_SNAPSHOT_FILE = os.environ.get("TRENDS_SNAPSHOT_FILE", os.path.join(CONFIG_DIR, "trends.json"))
+TRENDS_SNAPSHOT_SECONDS = float(os.environ.get("TRENDS_SNAPSHOT_SECONDS", "10"))
+
+# Rescale the totals before the weights of new minutes grow past 2 ** 64
+RESCALE_HALVINGS = 64
+
+class TrendingHashtags:
+    """Sliding-window, decayed hashtag counters with a cached top-K snapshot"""
+
+    def __init__(
+        self,
+        window_minutes: int = TRENDS_WINDOW_MINUTES,
+        half_life_minutes: float = TRENDS_HALF_LIFE_MINUTES,
+        top_k: int = TRENDS_TOP_K,
+        refresh_seconds: float = TRENDS_REFRESH_SECONDS,
+        clock: Callable[[], float] = time.time
+    ):
+        self.window_minutes = window_minutes
+        self.half_life_minutes = half_life_minutes
+        self.top_k = top_k
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._reset()
+        # Uses by bucket minute recorded since the last save_snapshot
+        self._pending: Dict[int, Counter] = {}
+
+    def _reset(self):
+        self._buckets = deque()  # (minute, Counter of tag uses), oldest first
+        self._counts: Dict[str, int] = {}  # raw uses in the window
+        self._scores: Dict[str, float] = {}  # uses weighted by _weight(minute)
+        self._landmark = int(self.clock() // 60)
+        self._snapshot: List[dict] = []
+        self._snapshot_at: Optional[float] = None
+
+    def _weight(self, minute: int) -> float:
+        return 2.0 ** ((minute - self._landmark) / self.half_life_minutes)
+
+    def _advance(self, minute: int):
+        """Expire the buckets that fell out of the window ending at minute"""
+        while self._buckets and self._buckets[0][0] <= minute - self.window_minutes:
+            bucket_minute, uses = self._buckets.popleft()
+            weight = self._weight(bucket_minute)
+            for tag, count in uses.items():
+                remaining = self._counts[tag] - count
+                if remaining:
+                    self._counts[tag] = remaining
+                    self._scores[tag] -= count * weight
+                else:
+                    del self._counts[tag]
+                    del self._scores[tag]
+
+        if (minute - self._landmark) / self.half_life_minutes > RESCALE_HALVINGS:
+            factor = 2.0 ** (-(minute - self._landmark) / self.half_life_minutes)
+            self._scores = {tag: score * factor for tag, score in self._scores.items()}
+            self._landmark = minute
+
+    def record(self, tags: Iterable[str], at: Optional[float] = None):
+        """Count one use of each tag at time at (now by default)"""
+        tags = list(tags)
+        if not tags:
+            return
+        minute = int((self.clock() if at is None else at) // 60)
+        with self._lock:
+            self._advance(minute)
+            if not self._buckets or self._buckets[-1][0] < minute:
+                self._buckets.append((minute, Counter()))
+            # Late events land in the newest bucket
+            bucket_minute, uses = self._buckets[-1]
+            weight = self._weight(bucket_minute)
+            pending = self._pending.setdefault(bucket_minute, Counter())
+            for tag in tags:
+                uses[tag] += 1
+                pending[tag] += 1
+                self._counts[tag] = self._counts.get(tag, 0) + 1
+                self._scores[tag] = self._scores.get(tag, 0.0) + weight
+
+    def top(self, limit: Optional[int] = None) -> List[dict]:
+        """Return the top tags as [{"tag", "count"}], from a snapshot refreshed every refresh_seconds"""
+        now = self.clock()
+        with self._lock:
+            if self._snapshot_at is None or now - self._snapshot_at >= self.refresh_seconds:
+                self._advance(int(now // 60))
+                best = heapq.nlargest(self.top_k, self._scores.items(), key=lambda item: item[1])
+                self._snapshot = [{"tag": tag, "count": self._counts[tag]} for tag, _ in best]
+                self._snapshot_at = now
+            snapshot = self._snapshot
+        return snapshot[:limit] if limit is not None else snapshot
+
+    def dump(self) -> dict:
+        """Compact snapshot of the buckets still in the window"""
+        with self._lock:
+            self._advance(int(self.clock() // 60))
+            return {"buckets": [[minute, dict(uses)] for minute, uses in self._buckets]}
+
+    def _load_buckets(self, buckets: Dict[int, Counter]):
+        # Called with the lock held
+        self._reset()
+        for minute in sorted(buckets):
+            uses = buckets[minute]
+            if not uses:
+                continue
+            self._buckets.append((minute, Counter(uses)))
+            weight = self._weight(minute)
+            for tag, count in uses.items():
+                self._counts[tag] = self._counts.get(tag, 0) + count
+                self._scores[tag] = self._scores.get(tag, 0.0) + count * weight
+        self._advance(int(self.clock() // 60))
+
+    def load(self, data: dict):
+        """Replace the counters with a snapshot produced by dump, dropping expired buckets"""
+        buckets = parse_buckets(data)
+        with self._lock:
+            self._load_buckets(buckets)
+            self._pending = {}
+
+    def save_snapshot(self, path: str = TRENDS_SNAPSHOT_FILE):
+        """Add the uses recorded since the last save to the snapshot at path, and take the merged counts.
+
+        Workers sharing path take turns under a lock on "<path>.lock", so the
+        snapshot holds the uses of every one of them.
+        """
+        with open(f"{path}.lock", "a") as lock_file:
+            # Released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                buckets = read_buckets(path)
+                add_buckets(buckets, pending)
+                oldest = int(self.clock() // 60) - self.window_minutes
+                buckets = {minute: uses for minute, uses in buckets.items() if minute > oldest}
+
+                # Written next to the snapshot and renamed, so readers never see half a file
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "w") as f:
+                    data = {"buckets": [[minute, dict(uses)] for minute, uses in sorted(buckets.items())]}
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(temp_path, path)
+            except BaseException:
+                # Keep the uses for the next save
+                with self._lock:
+                    add_buckets(self._pending, pending)
+                raise
+
+            with self._lock:
+                # Uses recorded during the save are still pending, and counted
+                add_buckets(buckets, self._pending)
+                self._load_buckets(buckets)
+
+    def load_snapshot(self, path: str = TRENDS_SNAPSHOT_FILE):
+        """Restore the buckets saved at path, if there is a readable snapshot"""
+        with self._lock:
+            self._load_buckets(read_buckets(path))
+            self._pending = {}
+
+def parse_buckets(data: dict) -> Dict[int, Counter]:
+    """Uses by minute from a snapshot produced by dump"""
+    buckets: Dict[int, Counter] = {}
+    for minute, uses in data.get("buckets", []):
+        buckets.setdefault(int(minute), Counter()).update({str(tag): int(count) for tag, count in uses.items()})
+    return buckets
+
+def read_buckets(path: str) -> Dict[int, Counter]:
+    """Uses by minute saved at path; empty if there is no readable snapshot"""
+    try:
+        with open(path) as f:
+            return parse_buckets(json.load(f))
+    except FileNotFoundError:
+        return {}
+    except (ValueError, TypeError, AttributeError):
+        logger.warning("Ignoring unreadable trends snapshot %s", path, exc_info=True)
+        return {}
+
+def add_buckets(buckets: Dict[int, Counter], other: Dict[int, Counter]):
+    """Add the uses of other into buckets"""
+    for minute, uses in other.items():
+        buckets.setdefault(minute, Counter()).update(uses)
+
+trending_hashtags = TrendingHashtags()
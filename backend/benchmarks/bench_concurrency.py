@@ -0,0 +1,160 @@
+"""Concurrency benchmark for the tweet feed.
+
+Runs N simultaneous clients against GET /api/tweets/, mixed with a share of
+reaction writes, and reports throughput, request latency and the latency of
+/api/health probes sent meanwhile, which shows whether database work (including
+waiting for SQLite's write lock) blocks the event loop for unrelated requests.
+
+By default a uvicorn server is started on a temporary, seeded SQLite database:
+
+    python benchmarks/bench_concurrency.py --clients 1 10 50
+
+Pass --url (and --token) to benchmark a running server instead.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed_database(tweets: int):
+    """Create users, tweets and reactions in the app database and return their tokens"""
+    from app.models.database import SessionLocal
+    from app.models.migrations import run_migrations
+    from app.models.models import Tweet, User, tweet_reactions
+    from app.utils.counters import repair_tweet_counters
+    from app.utils.security import create_access_token, get_password_hash
+
+    run_migrations()
+    db = SessionLocal()
+    hashed_password = get_password_hash("x")
+    users = [User(username=f"bench{i}", email=f"bench{i}@example.com", hashed_password=hashed_password) for i in range(20)]
+    db.add_all(users)
+    db.commit()
+    db.add_all([Tweet(content=f"Benchmark tweet {i}", author_id=users[i % len(users)].id) for i in range(tweets)])
+    db.commit()
+    for user in users:
+        db.execute(tweet_reactions.insert(), [
+            {"user_id": user.id, "tweet_id": tweet_id, "reaction_type": "like"}
+            for tweet_id in range(1, tweets + 1, 3)
+        ])
+    db.commit()
+    repair_tweet_counters(db)
+    tokens = [create_access_token({"sub": user.username, "id": user.id}) for user in users]
+    db.close()
+    return tokens
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run_clients(client: httpx.AsyncClient, clients: int, requests: int, path: str, tokens: list, write_ratio: float, tweets: int):
+    latencies = []
+    probe_latencies = []
+    done = asyncio.Event()
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            headers = {"Authorization": f"Bearer {random.choice(tokens)}"} if tokens else {}
+            start = time.perf_counter()
+            if tokens and random.random() < write_ratio:
+                response = await client.post(
+                    f"/api/tweets/{random.randint(1, tweets)}/reaction",
+                    json={"reaction_type": random.choice(["like", "dislike"])},
+                    headers=headers
+                )
+            else:
+                response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/api/health")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+
+    return {
+        "clients": clients,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "probe_p99_ms": percentile(probe_latencies, 0.99) * 1000 if probe_latencies else float("nan"),
+    }
+
+async def wait_for_server(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            (await client.get("/api/health")).raise_for_status()
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; defaults to serving the app in-process")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50], help="Simultaneous client counts to run")
+    parser.add_argument("--requests", type=int, default=500, help="Feed requests per run")
+    parser.add_argument("--limit", type=int, default=50, help="Feed page size")
+    parser.add_argument("--tweets", type=int, default=1000, help="Tweets to seed for in-process runs (highest tweet id with --url)")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="Share of requests that post a reaction")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the benchmark server")
+    parser.add_argument("--token", nargs="*", default=[], help="Bearer tokens to send with --url")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base_url = args.url
+        tokens = args.token
+    else:
+        config_dir = tempfile.mkdtemp(prefix="bench_")
+        os.environ["CONFIG_DIR"] = config_dir
+        tokens = seed_database(args.tweets)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env={**os.environ, "CONFIG_DIR": config_dir},
+            stdout=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    path = f"/api/tweets/?limit={args.limit}"
+    limits = httpx.Limits(max_connections=max(args.clients) + 1)
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            await wait_for_server(client)
+            print(f"{'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'health p99 ms':>14}")
+            for clients in args.clients:
+                result = await run_clients(client, clients, args.requests, path, tokens, args.write_ratio, args.tweets)
+                print(f"{result['clients']:>8} {result['throughput']:>10.1f} {result['p50_ms']:>10.1f} "
+                      f"{result['p99_ms']:>10.1f} {result['probe_p99_ms']:>14.1f}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+"""Load test for the event stream with many idle connections.
+
+Opens N Server-Sent Events connections to GET /api/events/ and holds them
+idle, reporting the time to open them, the server's memory per connection and
+/api/health latency while they are held. It then posts tweets and measures how
+long each takes to reach every connection, and sends a burst of reactions to
+one tweet to show how many reaction events the coalescing window leaves.
+
+By default a uvicorn server is started on a temporary, seeded SQLite database:
+
+    python benchmarks/bench_stream.py --connections 10000
+
+Each connection needs a file descriptor in both the benchmark and the server,
+so the soft limit is raised to the hard limit (check ``ulimit -Hn``).
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_concurrency import percentile, wait_for_server
+
+def seed_database() -> str:
+    """Create a user and a tweet in the app database and return the user's token"""
+    from app.models.database import SessionLocal
+    from app.models.migrations import run_migrations
+    from app.models.models import Tweet, User
+    from app.utils.security import create_access_token, get_password_hash
+
+    run_migrations()
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", hashed_password=get_password_hash("x"))
+    db.add(user)
+    db.commit()
+    db.add(Tweet(content="Benchmark tweet", author_id=user.id))
+    db.commit()
+    token = create_access_token({"sub": user.username, "id": user.id})
+    db.close()
+    return token
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+class Listener:
+    """One raw SSE connection, recording when each event arrives"""
+
+    def __init__(self):
+        self.arrivals = {b"tweet": [], b"reaction": []}
+        self.closed = False
+
+    async def open(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(f"GET /api/events/ HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        status = await self.reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(f"Stream refused: {status!r}")
+        while await self.reader.readline() not in (b"\r\n", b""):
+            pass
+
+    async def listen(self):
+        # Chunk sizes come on lines of their own, so event lines can be matched directly
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                self.closed = True
+                return
+            if line.startswith(b"event: "):
+                self.arrivals.setdefault(line[7:].strip(), []).append(time.perf_counter())
+
+    def close(self):
+        self.writer.close()
+
+async def open_listeners(host: str, port: int, connections: int, batch: int):
+    listeners = []
+    for start in range(0, connections, batch):
+        opened = [Listener() for _ in range(min(batch, connections - start))]
+        await asyncio.gather(*(listener.open(host, port) for listener in opened))
+        listeners.extend(opened)
+    return listeners
+
+async def health_latencies(client: httpx.AsyncClient, probes: int):
+    latencies = []
+    for _ in range(probes):
+        start = time.perf_counter()
+        (await client.get("/api/health")).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+async def wait_for_events(listeners, kind: bytes, count: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while any(len(listener.arrivals[kind]) < count for listener in listeners if not listener.closed):
+        if time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.01)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; defaults to serving the app in-process")
+    parser.add_argument("--token", help="Bearer token to post with --url")
+    parser.add_argument("--tweet-id", type=int, default=1, help="Tweet to react to")
+    parser.add_argument("--connections", type=int, default=10000, help="Idle streams to hold open")
+    parser.add_argument("--batch", type=int, default=500, help="Streams opened at a time")
+    parser.add_argument("--idle", type=float, default=5, help="Seconds to hold the streams idle")
+    parser.add_argument("--tweets", type=int, default=10, help="Tweets to post and time")
+    parser.add_argument("--reactions", type=int, default=100, help="Reactions in the burst")
+    parser.add_argument("--port", type=int, default=8766, help="Port for the benchmark server")
+    args = parser.parse_args()
+
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = None
+    if args.url:
+        base_url = args.url
+        token = args.token
+    else:
+        config_dir = tempfile.mkdtemp(prefix="bench_")
+        os.environ["CONFIG_DIR"] = config_dir
+        token = seed_database()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+             "--log-level", "warning", "--backlog", str(args.batch * 2)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env={**os.environ, "CONFIG_DIR": config_dir, "EVENTS_MAX_SUBSCRIBERS": str(args.connections)},
+            stdout=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    url = httpx.URL(base_url)
+    headers = {"Authorization": f"Bearer {token}"}
+    listeners = []
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            await wait_for_server(client)
+            baseline = await health_latencies(client, 50)
+            rss_before = rss_mb(server.pid) if server else float("nan")
+
+            start = time.perf_counter()
+            listeners = await open_listeners(url.host, url.port or 80, args.connections, args.batch)
+            opened_in = time.perf_counter() - start
+            tasks = [asyncio.create_task(listener.listen()) for listener in listeners]
+            rss_after = rss_mb(server.pid) if server else float("nan")
+
+            await asyncio.sleep(args.idle)
+            held = await health_latencies(client, 50)
+            alive = sum(not listener.closed for listener in listeners)
+            print(f"opened {len(listeners)} streams in {opened_in:.1f} s, {alive} still open after {args.idle:.0f} s idle")
+            print(f"server RSS {rss_before:.0f} MB -> {rss_after:.0f} MB "
+                  f"({(rss_after - rss_before) * 1024 / max(1, len(listeners)):.1f} KB per stream)")
+            print(f"health p50/p99 {statistics.median(baseline) * 1000:.1f}/{percentile(baseline, 0.99) * 1000:.1f} ms idle, "
+                  f"{statistics.median(held) * 1000:.1f}/{percentile(held, 0.99) * 1000:.1f} ms while holding")
+
+            # Fan-out latency: from posting a tweet until the last stream has it
+            fan_out = []
+            for i in range(args.tweets):
+                posted = time.perf_counter()
+                (await client.post("/api/tweets/", json={"content": f"Stream benchmark {i}"}, headers=headers)).raise_for_status()
+                await wait_for_events(listeners, b"tweet", i + 1, timeout=30)
+                fan_out.append(max(listener.arrivals[b"tweet"][i] for listener in listeners if len(listener.arrivals[b"tweet"]) > i) - posted)
+            print(f"tweet fan-out to all streams p50 {statistics.median(fan_out) * 1000:.0f} ms, max {max(fan_out) * 1000:.0f} ms")
+
+            for _ in range(args.reactions):
+                (await client.post(f"/api/tweets/{args.tweet_id}/reaction", json={"reaction_type": "like"}, headers=headers)).raise_for_status()
+            await wait_for_events(listeners, b"reaction", 1, timeout=30)
+            await asyncio.sleep(1)
+            received = statistics.mean(len(listener.arrivals[b"reaction"]) for listener in listeners)
+            dropped = sum(listener.closed for listener in listeners)
+            print(f"{args.reactions} reactions arrived as {received:.1f} reaction events per stream, {dropped} streams dropped")
+
+            metrics = (await client.get("/api/metrics")).json()["events"]
+            print(f"server events: {metrics}")
+            for task in tasks:
+                task.cancel()
+    finally:
+        # Open streams would hold the server in its graceful shutdown
+        for listener in listeners:
+            listener.close()
+        await asyncio.sleep(1)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
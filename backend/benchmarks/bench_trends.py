@@ -0,0 +1,69 @@
+"""Benchmark for the trending hashtag counters.
+
+Feeds a simulated stream of tweets, each with a few hashtags drawn from a
+skewed vocabulary, into TrendingHashtags on a simulated clock, and reports the
+cost per recorded tweet and per top-K read for each interval of simulated
+time. Once the window is full, buckets expire as fast as they are added, so
+the cost per tweet should stay flat however long the stream runs:
+
+    python benchmarks/bench_trends.py --rate 1000 --minutes 90
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.trends import TrendingHashtags
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=1000, help="Simulated tweets per second")
+    parser.add_argument("--minutes", type=int, default=90, help="Simulated minutes to run")
+    parser.add_argument("--interval", type=int, default=10, help="Simulated minutes per report line")
+    parser.add_argument("--tags", type=int, default=50000, help="Distinct hashtags in the vocabulary")
+    parser.add_argument("--window", type=int, default=60, help="Trend window in minutes")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [f"tag{i}" for i in range(args.tags)]
+    # Zipf-like popularity, so a few tags trend and most are rare
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(args.tags)))
+    tweets = [rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 3)) for _ in range(args.rate * 60)]
+    clock = SimulatedClock()
+    trends = TrendingHashtags(window_minutes=args.window, refresh_seconds=5, clock=clock)
+
+    print(f"{'minutes':>8} {'us/tweet':>10} {'us/top':>10} {'tags held':>10}")
+    for start in range(0, args.minutes, args.interval):
+        record_seconds = 0.0
+        top_seconds = 0.0
+        reads = 0
+        for _ in range(args.interval * 60):
+            # One simulated second of tweets, then a read as an endpoint would
+            began = time.perf_counter()
+            for tags in rng.sample(tweets, args.rate):
+                trends.record(tags)
+            record_seconds += time.perf_counter() - began
+
+            began = time.perf_counter()
+            trends.top()
+            top_seconds += time.perf_counter() - began
+            reads += 1
+            clock.now += 1
+
+        recorded = args.rate * args.interval * 60
+        print(f"{start + args.interval:>8} {record_seconds / recorded * 1e6:>10.2f} "
+              f"{top_seconds / reads * 1e6:>10.1f} {len(trends._counts):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Gunicorn settings for serving the backend with several worker processes.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Each worker is a uvicorn event loop with its own threadpool. The deployment
+is prepared (data directories, migrations) once in the master before any
+worker starts. ``kill -HUP`` on the master replaces the workers gracefully:
+old ones finish their requests within GRACEFUL_TIMEOUT seconds. With
+PRELOAD_APP the code is loaded once in the master, so picking up new code
+needs a full restart (or ``kill -USR2`` for a zero-downtime re-exec).
+"""
+import multiprocessing
+import os
+
+# Workers must not migrate on their own; read when the app module is imported
+os.environ.setdefault("MIGRATE_ON_STARTUP", "0")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master and fork the workers from it
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+# Seconds a worker may be silent before it is restarted, and seconds
+# workers get to finish their requests on restart or shutdown
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+
+# Recycle workers after this many requests (0 disables), staggered by the jitter
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.environ.get("ACCESS_LOG") or None
+errorlog = "-"
+
+def on_starting(server):
+    # Once, in the master, before the first worker is forked
+    from app.startup import prepare
+
+    applied = prepare()
+    server.log.info("Prepared the deployment, applied migrations %s", applied or "none")
@@ -11,6 +11,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.main import app
 from app.models.database import Base, get_db
 from app.models.models import User, Tweet
+from app.utils.auth import principal_cache, token_cache
+from app.routers.profile import profile_cache
+from app.utils.response_cache import feed_cache
 from app.utils.security import get_password_hash
 
 # Create an in-memory SQLite database for testing
@@ -74,4 +77,18 @@ def cleanup_database():
     yield
     
     # This will run after each test
-    Base.metadata.drop_all(bind=engine)
\ No newline at end of file
+    Base.metadata.drop_all(bind=engine)
+
+# User ids are reused once the tables are recreated, so forget cached principals
+@pytest.fixture(autouse=True)
+def clear_auth_cache():
+    token_cache.clear()
+    principal_cache.clear()
+    yield
+
+# Each test module seeds its own database, so forget pages and profiles cached by others
+@pytest.fixture(autouse=True)
+def clear_data_caches():
+    feed_cache.clear()
+    profile_cache.clear()
+    yield
@@ -0,0 +1,148 @@
+"""In-memory server speaking the Redis protocol, for tests.
+
+Implements the commands RedisClient uses (PING, AUTH, SELECT, GET, MGET,
+SET with EX/PX, DEL, INCRBY, PEXPIRE, SCAN, FLUSHDB, PUBLISH, SUBSCRIBE) on a
+dict shared by every connection, so several clients see the same data like
+workers sharing Redis.
+"""
+import fnmatch
+import socketserver
+import threading
+import time
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            while True:
+                try:
+                    command = self.read_command()
+                except ConnectionError:
+                    return
+                if command is None:
+                    return
+                if command[0].upper() == b"SUBSCRIBE":
+                    self.server.subscribe(command[1], self.wfile)
+                    continue
+                self.wfile.write(self.server.execute(command))
+        finally:
+            self.server.unsubscribe(self.wfile)
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ConnectionError("Inline commands are not supported")
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+def encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-ERR %s\r\n" % str(reply).encode()
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}  # key -> (value, expires_at or None)
+        self.lock = threading.Lock()
+        self.commands = []
+        self.subscribers = {}  # channel -> connections' output streams
+
+    @property
+    def url(self) -> str:
+        return "redis://127.0.0.1:%d/0" % self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def subscribe(self, channel, wfile):
+        # Reply under the lock, so no message can be published ahead of it
+        with self.lock:
+            wfile.write(encode([b"subscribe", channel, 1]))
+            self.subscribers.setdefault(channel, []).append(wfile)
+
+    def unsubscribe(self, wfile):
+        with self.lock:
+            for subscribers in self.subscribers.values():
+                if wfile in subscribers:
+                    subscribers.remove(wfile)
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args) -> bytes:
+        name, args = args[0].decode().upper(), args[1:]
+        with self.lock:
+            self.commands.append(name)
+            try:
+                return encode(self.run(name, args))
+            except Exception as e:
+                return encode(e)
+
+    def run(self, name, args):
+        if name in ("PING", "AUTH", "SELECT"):
+            return True
+        if name == "GET":
+            return self._get(args[0])
+        if name == "MGET":
+            return [self._get(key) for key in args]
+        if name == "SET":
+            expires_at = None
+            if len(args) == 4:
+                unit = {b"EX": 1.0, b"PX": 0.001}[args[2].upper()]
+                expires_at = time.monotonic() + int(args[3]) * unit
+            self.data[args[0]] = (args[1], expires_at)
+            return True
+        if name == "DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        if name == "INCRBY":
+            value = int(self._get(args[0]) or 0) + int(args[1])
+            expires_at = self.data[args[0]][1] if args[0] in self.data else None
+            self.data[args[0]] = (str(value).encode(), expires_at)
+            return value
+        if name == "PEXPIRE":
+            if self._get(args[0]) is None:
+                return 0
+            self.data[args[0]] = (self.data[args[0]][0], time.monotonic() + int(args[1]) / 1000)
+            return 1
+        if name == "SCAN":
+            # Everything in one batch
+            pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+            keys = [key for key in list(self.data) if self._get(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)]
+            return [b"0", keys]
+        if name == "PUBLISH":
+            subscribers = self.subscribers.get(args[0], [])
+            for wfile in subscribers:
+                wfile.write(encode([b"message", args[0], args[1]]))
+            return len(subscribers)
+        if name == "FLUSHDB":
+            self.data.clear()
+            return True
+        raise ValueError(f"unknown command '{name}'")
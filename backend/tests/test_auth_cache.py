@@ -0,0 +1,156 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from PIL import Image
+import base64
+import io
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.routers import profile
+from app.utils.auth import principal_cache
+from app.utils.cache import TTLCache
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+class UserQueryCounter:
+    """Count the statements reading the users table"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            self.count += 1
+
+# Test fixture with one logged-in user
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add(User(username="user1", email="user1@example.com", hashed_password=get_password_hash("password1")))
+    db.commit()
+    db.close()
+
+    token = client.post(
+        "/api/users/login",
+        json={"username": "user1", "password": "password1"}
+    ).json()
+
+    yield {"user": token, "headers": {"Authorization": f"Bearer {token['access_token']}"}}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+@pytest.fixture
+def user_queries():
+    counter = UserQueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
+
+# Test that repeated authenticated requests reuse the cached principal
+def test_cached_principal_skips_user_query(test_env, user_queries):
+    response = client.post("/api/tweets/", headers=test_env["headers"], json={"content": "First"})
+    assert response.status_code == 201
+    assert user_queries.count == 1
+
+    response = client.post("/api/tweets/", headers=test_env["headers"], json={"content": "Second"})
+    assert response.status_code == 201
+    assert response.json()["author_username"] == "user1"
+    assert user_queries.count == 1
+
+    # Optional authentication on public reads hits the cache as well
+    response = client.get("/api/tweets/", headers=test_env["headers"])
+    assert response.status_code == 200
+    assert user_queries.count == 2  # the author lookup for hydration
+
+# Test that attributes outside the principal still load on demand
+def test_cached_principal_loads_other_attributes(test_env):
+    client.get("/api/profile/me", headers=test_env["headers"])
+    assert principal_cache.get(test_env["user"]["user_id"]) is not None
+
+    response = client.get("/api/profile/me", headers=test_env["headers"])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["username"] == "user1"
+    assert data["is_active"] is True
+    assert data["created_at"] is not None
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+# Test that updating the profile drops the cached principal
+def test_profile_update_invalidates_principal(test_env, tmp_path, monkeypatch):
+    monkeypatch.setattr(profile, "AVATAR_DIR", tmp_path)
+    user_id = test_env["user"]["user_id"]
+
+    client.get("/api/profile/me", headers=test_env["headers"])
+    assert principal_cache.get(user_id) is not None
+
+    response = client.post(
+        "/api/profile/update-profile-picture",
+        headers=test_env["headers"],
+        data={"profile_picture": base64.b64encode(png_bytes()).decode()}
+    )
+    assert response.status_code == 200
+    assert principal_cache.get(user_id) is None
+
+    # The update was written through the session the cached principal was attached to
+    db = TestingSessionLocal()
+    assert response.json()["profile_picture"].startswith("/uploads/avatars/")
+    assert db.get(User, user_id).profile_picture == response.json()["profile_picture"]
+    db.close()
+
+# Test LRU eviction and expiry of the cache itself
+def test_ttl_cache_eviction_and_expiry():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    cache.set("d", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
@@ -0,0 +1,234 @@
+from fastapi.testclient import TestClient
+from PIL import Image
+import base64
+import io
+import pytest
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.routers import profile
+from app.utils import images
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with a logged-in user and a temporary uploads directory
+@pytest.fixture
+def test_env(tmp_path, monkeypatch):
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(profile, "AVATAR_DIR", tmp_path)
+    # Serve the stored files from there too
+    avatars_mount = next(route for route in app.routes if getattr(route, "name", None) == "avatars")
+    monkeypatch.setattr(avatars_mount.app, "directory", tmp_path)
+    monkeypatch.setattr(avatars_mount.app, "all_directories", [tmp_path])
+
+    db = TestingSessionLocal()
+    user = User(username="alice", email="alice@example.com", hashed_password=get_password_hash("password"))
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    token = client.post("/api/users/login", json={"username": "alice", "password": "password"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    yield {"headers": headers, "user_id": user_id, "uploads": tmp_path}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def image_bytes(size=(600, 300), image_format="PNG", mode="RGBA"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (255, 0, 0, 128) if mode == "RGBA" else "red").save(buffer, image_format)
+    return buffer.getvalue()
+
+def stored_digest(url):
+    match = images.AVATAR_URL_RE.match(url)
+    assert match, url
+    return match.group(1)
+
+def upload(headers, data, filename="avatar.png"):
+    return client.post("/api/profile/picture", headers=headers, files={"file": (filename, data, "image/png")})
+
+# Test the multipart upload: re-encoded original, square thumbnails, user updated
+def test_upload_creates_thumbnails(test_env):
+    response = upload(test_env["headers"], image_bytes())
+    assert response.status_code == 200, response.text
+    body = response.json()
+    digest = stored_digest(body["profile_picture"])
+    assert body["thumbnails"] == {str(size): f"/uploads/avatars/{digest}_{size}.jpg" for size in images.AVATAR_SIZES}
+
+    with Image.open(test_env["uploads"] / f"{digest}.jpg") as original:
+        assert original.format == "JPEG"
+        assert original.size == (600, 300)
+    for size in images.AVATAR_SIZES:
+        with Image.open(test_env["uploads"] / f"{digest}_{size}.jpg") as thumbnail:
+            assert thumbnail.size == (size, size)
+    assert not list(test_env["uploads"].glob("*.tmp"))
+
+    profile_data = client.get("/api/profile/alice").json()
+    assert profile_data["profile_picture"] == body["profile_picture"]
+
+# Test that large originals are scaled down
+def test_upload_limits_original_edge(test_env):
+    assert upload(test_env["headers"], image_bytes((3000, 1500), "JPEG", "RGB"), "big.jpg").status_code == 200
+    picture = client.get("/api/profile/alice").json()["profile_picture"]
+    with Image.open(test_env["uploads"] / f"{stored_digest(picture)}.jpg") as original:
+        assert original.size == (images.AVATAR_MAX_EDGE, images.AVATAR_MAX_EDGE // 2)
+
+# Test the size cap, both from Content-Length and while streaming
+def test_upload_size_cap(test_env, monkeypatch):
+    monkeypatch.setattr(images, "AVATAR_MAX_BYTES", 1000)
+    monkeypatch.setattr(images, "MULTIPART_OVERHEAD", 500)
+    assert upload(test_env["headers"], b"x" * 2000).status_code == 413
+
+    # Without a Content-Length the body is cut off as it streams in
+    def chunked_body():
+        yield b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'
+        for _ in range(10):
+            yield b"x" * 1000
+    response = client.post(
+        "/api/profile/picture",
+        headers={**test_env["headers"], "Content-Type": "multipart/form-data; boundary=boundary"},
+        content=chunked_body()
+    )
+    assert response.status_code == 413
+    assert not list(test_env["uploads"].iterdir())
+
+    # A file over the cap in a body within the cap plus overhead
+    assert upload(test_env["headers"], b"x" * 1200).status_code == 413
+
+# Test that anything but a readable image is rejected
+@pytest.mark.parametrize("data", [b"not an image", image_bytes()[:100]])
+def test_upload_rejects_invalid_images(test_env, data):
+    response = upload(test_env["headers"], data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid image file"
+    assert client.get("/api/profile/alice").json()["profile_picture"] is None
+    assert not list(test_env["uploads"].iterdir())
+
+def test_upload_rejects_decompression_bombs(test_env, monkeypatch):
+    monkeypatch.setattr(images, "AVATAR_MAX_PIXELS", 100 * 100)
+    assert upload(test_env["headers"], image_bytes((200, 200))).status_code == 400
+
+def test_upload_requires_file_and_login(test_env):
+    assert client.post("/api/profile/picture", headers=test_env["headers"], data={"other": "x"}).status_code == 400
+    assert client.post("/api/profile/picture", headers=test_env["headers"], json={}).status_code == 400
+    assert upload({}, image_bytes()).status_code == 401
+
+# Test that no session is held while the body is read and the picture stored
+def test_upload_opens_session_last(test_env, monkeypatch):
+    sessions = []
+    def tracking_get_db():
+        sessions.append(True)
+        yield from override_get_db()
+    monkeypatch.setitem(app.dependency_overrides, get_db, tracking_get_db)
+
+    process_avatar = profile.process_avatar
+    def checked_process_avatar(source, directory):
+        assert not sessions
+        return process_avatar(source, directory)
+    monkeypatch.setattr(profile, "process_avatar", checked_process_avatar)
+
+    assert upload(test_env["headers"], image_bytes()).status_code == 200
+    assert sessions
+    assert upload({}, image_bytes()).status_code == 401
+    assert len(sessions) == 1
+
+# Test that old clients sending base64 go through the same processing
+def test_base64_upload(test_env):
+    data = "data:image/png;base64," + base64.b64encode(image_bytes()).decode()
+    response = client.post("/api/profile/update-profile-picture", headers=test_env["headers"], data={"profile_picture": data})
+    assert response.status_code == 200
+    assert (test_env["uploads"] / f"{stored_digest(response.json()['profile_picture'])}_48.jpg").exists()
+
+    invalid = base64.b64encode(b"not an image").decode()
+    response = client.post("/api/profile/update-profile-picture", headers=test_env["headers"], data={"profile_picture": invalid})
+    assert response.status_code == 400
+
+# Test that pictures get URLs by content, served to be cached for good
+def test_content_addressed_urls(test_env):
+    red = upload(test_env["headers"], image_bytes()).json()["profile_picture"]
+    assert upload(test_env["headers"], image_bytes()).json()["profile_picture"] == red
+    opaque = upload(test_env["headers"], image_bytes(mode="RGB")).json()["profile_picture"]
+    assert opaque != red
+
+    response = client.get(red)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    thumbnail = client.get(red.replace(".jpg", "_48.jpg"))
+    assert thumbnail.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert client.get("/uploads/avatars/missing.jpg").status_code == 404
+
+# Test that replaced pictures are collected once unused and past the grace period
+def test_collect_avatars(test_env):
+    first = stored_digest(upload(test_env["headers"], image_bytes()).json()["profile_picture"])
+    second = stored_digest(upload(test_env["headers"], image_bytes(mode="RGB")).json()["profile_picture"])
+    (test_env["uploads"] / "leftover.jpg.1.2.tmp").write_bytes(b"x")
+    (test_env["uploads"] / "notes.txt").write_bytes(b"x")
+
+    db = TestingSessionLocal()
+    try:
+        # The replaced picture was just superseded, so it is kept for now
+        assert images.collect_avatars(db, test_env["uploads"], grace_seconds=60) == 0
+        deleted = images.collect_avatars(db, test_env["uploads"], grace_seconds=0)
+    finally:
+        db.close()
+
+    remaining = sorted(path.name for path in test_env["uploads"].iterdir())
+    assert deleted == 1 + len(images.AVATAR_SIZES) + 1
+    assert remaining == sorted(["notes.txt", f"{second}.jpg"] + [f"{second}_{size}.jpg" for size in images.AVATAR_SIZES])
+    assert first != second
+
+# Test that re-uploading an unreferenced picture protects it from a collection
+# running before the upload commits
+def test_collect_avatars_during_reupload(test_env, monkeypatch):
+    first = stored_digest(upload(test_env["headers"], image_bytes()).json()["profile_picture"])
+    upload(test_env["headers"], image_bytes(mode="RGB"))
+    first_files = [test_env["uploads"] / f"{first}.jpg"] + [test_env["uploads"] / f"{first}_{size}.jpg" for size in images.AVATAR_SIZES]
+    for path in first_files:
+        os.utime(path, (0, 0))
+
+    process_avatar = profile.process_avatar
+    def process_then_collect(source, directory):
+        files = process_avatar(source, directory)
+        db = TestingSessionLocal()
+        try:
+            assert images.collect_avatars(db, directory, grace_seconds=60) == 0
+        finally:
+            db.close()
+        return files
+    monkeypatch.setattr(profile, "process_avatar", process_then_collect)
+
+    response = upload(test_env["headers"], image_bytes())
+    assert response.status_code == 200, response.text
+    assert stored_digest(response.json()["profile_picture"]) == first
+    assert all(path.exists() for path in first_files)
@@ -0,0 +1,191 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.routers import profile
+from app.utils import auth
+from app.utils.cache import CacheBackend, TTLCache
+from app.utils.redis_cache import RedisCache, RedisClient
+from app.utils.security import get_password_hash
+from tests.fake_redis import FakeRedisServer
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        yield TTLCache(max_size=100, ttl=60)
+        return
+    server = FakeRedisServer().start()
+    client = RedisClient(server.url)
+    yield RedisCache(client, "test", 60)
+    client.close()
+    server.stop()
+
+# Test fixture with two logged-in users
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    for name in ("alice", "bob"):
+        db.add(User(username=name, email=f"{name}@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    headers = {}
+    for name in ("alice", "bob"):
+        token = client.post("/api/users/login", json={"username": name, "password": "password"}).json()
+        headers[name] = {"Authorization": f"Bearer {token['access_token']}"}
+
+    yield headers
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def count_statements(func):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return result, statements
+
+# Test the operations every backend implements
+def test_backend_operations(cache):
+    cache.set("a", {"name": "alice", "ids": [1, 2]})
+    cache.set(7, [7, "bob", True])
+    assert cache.get("a") == {"name": "alice", "ids": [1, 2]}
+    assert cache.get(7) == [7, "bob", True]
+    assert cache.get_many(["a", "missing", 7]) == [{"name": "alice", "ids": [1, 2]}, None, [7, "bob", True]]
+
+    cache.delete("a")
+    assert cache.get("a") is None
+
+    assert cache.incr("counter") == 1
+    assert cache.incr("counter", 5) == 6
+
+    cache.set("short", 1, ttl=0.05)
+    cache.incr("short_counter", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.incr("short_counter") == 1
+
+    cache.clear()
+    assert cache.get_many([7, "counter"]) == [None, None]
+    assert cache.stats()["hits"] > 0
+
+# Test that a backend missing part of the interface can't be created
+def test_incomplete_backend():
+    class GetOnlyCache(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
+
+# Test that workers sharing a server see each other's writes, and namespaces stay apart
+def test_redis_cache_is_shared(redis_server):
+    worker1 = RedisCache(RedisClient(redis_server.url), "principal", 60)
+    worker2 = RedisCache(RedisClient(redis_server.url), "principal", 60)
+    other = RedisCache(RedisClient(redis_server.url), "profile", 60)
+
+    worker1.set(1, [1, "alice", True])
+    other.set(1, {"username": "alice"})
+    assert worker2.get(1) == [1, "alice", True]
+
+    worker2.delete(1)
+    assert worker1.get(1) is None
+
+    worker1.clear()
+    assert other.get(1) == {"username": "alice"}
+
+# Test that an unreachable server makes reads miss instead of failing requests
+def test_redis_cache_unavailable(redis_server):
+    url = redis_server.url
+    redis_server.stop()
+    cache = RedisCache(RedisClient(url, timeout=0.1), "test", 60)
+
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    cache.delete("a")
+    assert cache.stats()["errors"] == 3
+
+# Test the principal lookup on a shared server: an invalidation in one worker reaches the others
+def test_principal_cache_on_redis(test_env, redis_server, monkeypatch):
+    shared = RedisCache(RedisClient(redis_server.url), "principal", 60)
+    monkeypatch.setattr(auth, "principal_cache", shared)
+
+    assert client.get("/api/profile/me", headers=test_env["alice"]).status_code == 200
+    user_id = client.get("/api/profile/me", headers=test_env["alice"]).json()["id"]
+    assert shared.get(user_id) == [user_id, "alice", True]
+
+    # Another worker drops it, e.g. after a profile update there
+    RedisCache(RedisClient(redis_server.url), "principal", 60).delete(user_id)
+    assert shared.get(user_id) is None
+
+# Test profile reads are cached and follows invalidate both profiles
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_profile_cache(test_env, redis_server, monkeypatch, backend):
+    if backend == "redis":
+        monkeypatch.setattr(profile, "profile_cache", RedisCache(RedisClient(redis_server.url), "profile", 60))
+
+    first = client.get("/api/profile/bob")
+    assert first.status_code == 200
+    second, statements = count_statements(lambda: client.get("/api/profile/bob"))
+    # Only the change version behind the ETag is read
+    assert len(statements) == 1
+    assert "change_versions" in statements[0]
+    assert second.json() == first.json()
+
+    client.post("/api/profile/follow/bob", headers=test_env["alice"])
+    response = client.get("/api/profile/bob", headers=test_env["alice"])
+    assert response.json()["follower_count"] == 1
+    assert response.json()["is_followed"] is True
+    assert client.get("/api/profile/me", headers=test_env["alice"]).json()["following_count"] == 1
+
+    # The viewer's flag is not stored in the shared profile
+    assert client.get("/api/profile/bob").json()["is_followed"] is False
+
+    client.post("/api/profile/unfollow/bob", headers=test_env["alice"])
+    assert client.get("/api/profile/bob").json()["follower_count"] == 0
+    assert client.get("/api/profile/missing").status_code == 404
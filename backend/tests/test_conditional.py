@@ -0,0 +1,176 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, change_versions
+from app.utils.conditional import USERS, bump_versions, etag_matches
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with two logged-in users and a tweet
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    for name in ("alice", "bob"):
+        db.add(User(username=name, email=f"{name}@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    headers = {}
+    for name in ("alice", "bob"):
+        token = client.post("/api/users/login", json={"username": name, "password": "password"}).json()
+        headers[name] = {"Authorization": f"Bearer {token['access_token']}"}
+    tweet_id = client.post("/api/tweets/", headers=headers["alice"], json={"content": "Hello"}).json()["id"]
+
+    yield {"headers": headers, "tweet_id": tweet_id}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def revalidate(url, response, headers=None):
+    return client.get(url, headers={**(headers or {}), "If-None-Match": response.headers["ETag"]})
+
+def test_etag_matching():
+    assert etag_matches('W/"1-abc"', 'W/"1-abc"')
+    assert etag_matches('"1-abc"', 'W/"1-abc"')
+    assert etag_matches('"0-zzz", W/"1-abc"', 'W/"1-abc"')
+    assert etag_matches("*", 'W/"1-abc"')
+    assert not etag_matches('W/"2-abc"', 'W/"1-abc"')
+
+# Test 304s on the feed, anonymous (cached) and authenticated
+@pytest.mark.parametrize("viewer", [None, "bob"])
+def test_feed_not_modified_until_a_write(test_env, viewer):
+    headers = test_env["headers"][viewer] if viewer else {}
+    first = client.get("/api/tweets/", headers=headers)
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"')
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert first.headers["Vary"] == "Authorization"
+
+    unchanged = revalidate("/api/tweets/", first, headers)
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == first.headers["ETag"]
+
+    # A reaction changes the counts, a new tweet the page
+    client.post(f"/api/tweets/{test_env['tweet_id']}/reaction", headers=test_env["headers"]["alice"], json={"reaction_type": "like"})
+    changed = revalidate("/api/tweets/", first, headers)
+    assert changed.status_code == 200
+    assert changed.json()[0]["likes_count"] == 1
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+    client.post("/api/tweets/", headers=test_env["headers"]["alice"], json={"content": "Again"})
+    assert revalidate("/api/tweets/", changed, headers).status_code == 200
+
+# Test that a 304 skips loading and hydrating the tweets
+def test_not_modified_short_circuits(test_env):
+    headers = test_env["headers"]["bob"]
+    url = f"/api/tweets/{test_env['tweet_id']}"
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = revalidate(url, first, headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 304
+    # The tweet's existence and the change versions
+    assert len(statements) == 2
+    assert "change_versions" in statements[1]
+
+    assert client.get("/api/tweets/9999", headers={"If-None-Match": "*"}).status_code == 404
+
+# Test that viewers and pages get their own tags
+def test_etags_vary_by_viewer_and_query(test_env):
+    anonymous = client.get("/api/tweets/user/alice")
+    alice = client.get("/api/tweets/user/alice", headers=test_env["headers"]["alice"])
+    page = client.get("/api/tweets/user/alice?limit=1")
+    assert len({anonymous.headers["ETag"], alice.headers["ETag"], page.headers["ETag"]}) == 3
+    assert revalidate("/api/tweets/user/alice", alice).status_code == 200
+
+# Test profiles and the home timeline change with follows
+def test_profile_and_timeline_follow_changes(test_env):
+    headers = test_env["headers"]
+    profile = client.get("/api/profile/alice", headers=headers["bob"])
+    timeline = client.get("/api/tweets/timeline", headers=headers["bob"])
+    assert revalidate("/api/profile/alice", profile, headers["bob"]).status_code == 304
+    assert revalidate("/api/tweets/timeline", timeline, headers["bob"]).status_code == 304
+
+    client.post("/api/profile/follow/alice", headers=headers["bob"])
+    response = revalidate("/api/profile/alice", profile, headers["bob"])
+    assert response.status_code == 200
+    assert response.json()["is_followed"] is True
+    response = revalidate("/api/tweets/timeline", timeline, headers["bob"])
+    assert [tweet["content"] for tweet in response.json()] == ["Hello"]
+
+# Test that a cached profile older than the validators isn't sent under them
+def test_profile_cache_follows_versions(test_env):
+    profile = client.get("/api/profile/alice")
+    assert profile.json()["follower_count"] == 0
+
+    # A write by another worker, whose invalidation this process never sees
+    db = TestingSessionLocal()
+    db.query(User).filter(User.username == "alice").update({"followers_count": 5})
+    bump_versions(db, USERS)
+    db.commit()
+    db.close()
+
+    response = revalidate("/api/profile/alice", profile)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != profile.headers["ETag"]
+    assert response.json()["follower_count"] == 5
+    assert client.get("/api/profile/me", headers=test_env["headers"]["alice"]).json()["follower_count"] == 5
+
+# Test Last-Modified and If-Modified-Since
+def test_last_modified(test_env):
+    # Last-Modified is left out during the second of the last change
+    db = TestingSessionLocal()
+    db.execute(change_versions.update().values(modified_at=time.time() - 60))
+    db.commit()
+    db.close()
+
+    first = client.get("/api/tweets/search?q=hello")
+    last_modified = first.headers["Last-Modified"]
+    assert client.get("/api/tweets/search?q=hello", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/api/tweets/search?q=hello", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert client.get("/api/tweets/search?q=hello", headers={"If-Modified-Since": "garbage"}).status_code == 200
+    # If-None-Match wins over If-Modified-Since
+    response = client.get("/api/tweets/search?q=hello", headers={"If-Modified-Since": last_modified, "If-None-Match": 'W/"0-0"'})
+    assert response.status_code == 200
@@ -0,0 +1,206 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import re
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet
+from app.utils.counters import repair_tweet_counters, repair_user_counters
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Helper function to create a test user and get a token
+def create_test_user(username="testuser", email="test@example.com", password="password"):
+    hashed_password = get_password_hash(password)
+    db = TestingSessionLocal()
+    db_user = User(username=username, email=email, hashed_password=hashed_password)
+    db.add(db_user)
+    db.commit()
+    db.close()
+
+    response = client.post(
+        "/api/users/login",
+        json={"username": username, "password": password}
+    )
+    return response.json()
+
+def get_counters(tweet_id):
+    db = TestingSessionLocal()
+    tweet = db.query(Tweet).filter(Tweet.id == tweet_id).first()
+    counters = (tweet.replies_count, tweet.likes_count, tweet.dislikes_count)
+    db.close()
+    return counters
+
+# Test fixture with two users and one tweet
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    user1 = create_test_user("user1", "user1@example.com", "password1")
+    user2 = create_test_user("user2", "user2@example.com", "password2")
+
+    response = client.post(
+        "/api/tweets/",
+        headers={"Authorization": f"Bearer {user1['access_token']}"},
+        json={"content": "Counted tweet"}
+    )
+
+    yield {
+        "user1": user1,
+        "user2": user2,
+        "tweet_id": response.json()["id"]
+    }
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def react(user, tweet_id, reaction_type):
+    response = client.post(
+        f"/api/tweets/{tweet_id}/reaction",
+        headers={"Authorization": f"Bearer {user['access_token']}"},
+        json={"reaction_type": reaction_type}
+    )
+    assert response.status_code == 201
+
+# Test that replying increments the parent's replies counter
+def test_reply_updates_counter(test_env):
+    tweet_id = test_env["tweet_id"]
+
+    for i in range(2):
+        response = client.post(
+            "/api/tweets/",
+            headers={"Authorization": f"Bearer {test_env['user2']['access_token']}"},
+            json={"content": f"Reply {i}", "parent_id": tweet_id}
+        )
+        assert response.status_code == 201
+
+    assert get_counters(tweet_id) == (2, 0, 0)
+    assert client.get(f"/api/tweets/{tweet_id}").json()["replies_count"] == 2
+
+# Test the insert, update and toggle-off reaction paths
+def test_reactions_update_counters(test_env):
+    tweet_id = test_env["tweet_id"]
+
+    react(test_env["user1"], tweet_id, "like")
+    react(test_env["user2"], tweet_id, "like")
+    assert get_counters(tweet_id) == (0, 2, 0)
+
+    # Switching reaction moves the count to the other counter
+    react(test_env["user2"], tweet_id, "dislike")
+    assert get_counters(tweet_id) == (0, 1, 1)
+
+    # Reacting the same way again removes the reaction
+    react(test_env["user1"], tweet_id, "like")
+    assert get_counters(tweet_id) == (0, 0, 1)
+
+    data = client.get("/api/tweets/").json()[0]
+    assert data["likes_count"] == 0
+    assert data["dislikes_count"] == 1
+
+# Test that the repair command recomputes drifted counters
+def test_repair_tweet_counters(test_env):
+    tweet_id = test_env["tweet_id"]
+    react(test_env["user1"], tweet_id, "like")
+
+    db = TestingSessionLocal()
+    db.query(Tweet).filter(Tweet.id == tweet_id).update({"likes_count": 42, "replies_count": 7})
+    db.commit()
+
+    assert repair_tweet_counters(db) == 1
+    db.close()
+
+    assert get_counters(tweet_id) == (0, 1, 0)
+
+def get_follow_counters(user_id):
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.id == user_id).first()
+    counters = (user.followers_count, user.following_count)
+    db.close()
+    return counters
+
+def follow(user, username, action="follow"):
+    response = client.post(
+        f"/api/profile/{action}/{username}",
+        headers={"Authorization": f"Bearer {user['access_token']}"}
+    )
+    assert response.status_code == 200
+
+# Test that follow and unfollow maintain both users' counters
+def test_follow_updates_counters(test_env):
+    user1, user2 = test_env["user1"], test_env["user2"]
+
+    follow(user1, "user2")
+    assert get_follow_counters(user1["user_id"]) == (0, 1)
+    assert get_follow_counters(user2["user_id"]) == (1, 0)
+
+    data = client.get("/api/profile/user2").json()
+    assert data["follower_count"] == 1
+    assert data["following_count"] == 0
+
+    follow(user1, "user2", "unfollow")
+    assert get_follow_counters(user1["user_id"]) == (0, 0)
+    assert get_follow_counters(user2["user_id"]) == (0, 0)
+
+# Test that profile views read the counters instead of the follower lists
+def test_profile_view_does_not_load_followers(test_env):
+    follow(test_env["user1"], "user2")
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        data = client.get(
+            "/api/profile/user2",
+            headers={"Authorization": f"Bearer {test_env['user1']['access_token']}"}
+        ).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert data["follower_count"] == 1
+    assert data["is_followed"] is True
+    # Only the EXISTS check touches the followers table
+    assert len([statement for statement in statements if re.search(r"(FROM|JOIN|,)\s*followers\b", statement)]) == 1
+
+# Test that the repair command recomputes drifted follow counters
+def test_repair_user_counters(test_env):
+    follow(test_env["user1"], "user2")
+
+    db = TestingSessionLocal()
+    db.query(User).update({"followers_count": 5, "following_count": 5})
+    db.commit()
+
+    assert repair_user_counters(db) == 2
+    db.close()
+
+    assert get_follow_counters(test_env["user1"]["user_id"]) == (0, 1)
+    assert get_follow_counters(test_env["user2"]["user_id"]) == (1, 0)
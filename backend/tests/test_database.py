@@ -0,0 +1,91 @@
+from fastapi.routing import APIRoute
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool, StaticPool
+import inspect
+import os
+import sys
+import threading
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import create_db_engine, get_db, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB
+
+def pragma(conn, name):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+# Test fixture providing a tuned engine on a temporary database file
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    engine.dispose()
+
+# Test the pragmas applied to file database connections
+def test_file_engine_pragmas(file_engine):
+    assert isinstance(file_engine.pool, QueuePool)
+
+    with file_engine.connect() as conn:
+        assert pragma(conn, "journal_mode") == "wal"
+        assert pragma(conn, "synchronous") == 1  # NORMAL
+        assert pragma(conn, "busy_timeout") == DB_BUSY_TIMEOUT_MS
+        assert pragma(conn, "cache_size") == -DB_CACHE_SIZE_KB
+
+# Test that in-memory databases share one connection across threads
+def test_memory_engine_is_shared_across_threads():
+    engine = create_db_engine("sqlite:///:memory:")
+    assert isinstance(engine.pool, StaticPool)
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO items VALUES (1)"))
+
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(engine.connect().execute(text("SELECT count(*) FROM items")).scalar())
+    )
+    thread.start()
+    thread.join()
+
+    assert result == [1]
+
+# Test that readers are not blocked while a write transaction is open
+def test_readers_not_blocked_by_writer(file_engine):
+    with file_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (name) VALUES ('committed')"))
+
+    with file_engine.connect() as writer:
+        writer.execute(text("BEGIN EXCLUSIVE"))
+        writer.execute(text("INSERT INTO items (name) VALUES ('pending')"))
+
+        # In rollback-journal mode this read would fail once the busy timeout expires
+        with file_engine.connect() as reader:
+            names = reader.execute(text("SELECT name FROM items")).scalars().all()
+        assert names == ["committed"]
+
+        writer.execute(text("ROLLBACK"))
+
+def blocking_coroutines(dependant):
+    """Yield the async callables of a dependency tree that use a database session"""
+    uses_db = False
+    for dependency in dependant.dependencies:
+        if dependency.call is get_db:
+            uses_db = True
+        else:
+            sub_uses_db = yield from blocking_coroutines(dependency)
+            uses_db = uses_db or sub_uses_db
+    if uses_db and inspect.iscoroutinefunction(dependant.call):
+        yield dependant.call
+    return uses_db
+
+# Test that nothing using a session runs on the event loop
+def test_database_routes_run_in_threadpool():
+    offenders = []
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            offenders.extend(call.__name__ for call in blocking_coroutines(route.dependant))
+
+    assert offenders == []
@@ -0,0 +1,143 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet, tweet_hashtags, tweet_mentions
+from app.utils.entities import backfill_tweet_entities, extract_hashtags, extract_mentions
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with two logged-in users
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    for name in ("alice", "bob"):
+        db.add(User(username=name, email=f"{name}@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    headers = {}
+    for name in ("alice", "bob"):
+        token = client.post("/api/users/login", json={"username": name, "password": "password"}).json()
+        headers[name] = {"Authorization": f"Bearer {token['access_token']}"}
+
+    yield headers
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def post(headers, content):
+    response = client.post("/api/tweets/", headers=headers, json={"content": content})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def fetch_all_pages(url, limit, headers=None):
+    contents = []
+    cursor = None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        contents.extend(tweet["content"] for tweet in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return contents
+
+# Test which tokens count as hashtags and mentions
+def test_extraction():
+    content = "#Python and #python3 with @alice, mail bob@example.com, C# and #"
+    assert extract_hashtags(content) == {"python", "python3"}
+    assert extract_mentions(content) == {"alice"}
+
+# Test the tag and mention endpoints over tweets indexed on write
+def test_tag_and_mention_pages(test_env):
+    for i in range(5):
+        post(test_env["alice"], f"Tweet {i} about #FastAPI")
+    post(test_env["alice"], "Hey @bob, try #sqlite")
+    post(test_env["alice"], "Hey @nobody")
+
+    expected = [f"Tweet {i} about #FastAPI" for i in reversed(range(5))]
+    assert fetch_all_pages("/api/tweets/hashtag/fastapi", 2) == expected
+    assert fetch_all_pages("/api/tweets/hashtag/%23FASTAPI", 10) == expected
+    assert fetch_all_pages("/api/tweets/hashtag/missing", 10) == []
+
+    response = client.get("/api/tweets/hashtag/sqlite")
+    assert response.json()[0]["author_username"] == "alice"
+
+    assert fetch_all_pages("/api/tweets/mentions", 10, test_env["bob"]) == ["Hey @bob, try #sqlite"]
+    assert fetch_all_pages("/api/tweets/mentions", 10, test_env["alice"]) == []
+    assert client.get("/api/tweets/mentions").status_code == 401
+
+# Test that tag pages read only the index and the page's tweets
+def test_tag_page_is_an_index_lookup(test_env):
+    for i in range(20):
+        post(test_env["alice"], f"Filler {i}" if i % 4 else f"Tagged {i} #rare")
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/tweets/hashtag/rare?limit=3")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len(response.json()) == 3
+    # Change versions, index page, tweets by id, authors
+    assert len(statements) == 4
+    assert "tweets.content LIKE" not in " ".join(statements)
+
+# Test indexing existing tweets in chunks, idempotently
+def test_backfill_in_chunks(test_env):
+    db = TestingSessionLocal()
+    alice_id = db.query(User.id).filter(User.username == "alice").scalar()
+    db.add_all([Tweet(content=f"Old tweet {i} #legacy @bob", author_id=alice_id) for i in range(7)])
+    db.commit()
+
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(True))
+    assert backfill_tweet_entities(db, chunk_size=3) == 7
+    assert len(commits) == 3
+
+    # Running it again adds nothing
+    assert backfill_tweet_entities(db, chunk_size=3) == 7
+    assert db.query(tweet_hashtags).count() == 7
+    assert db.query(tweet_mentions).count() == 7
+    db.close()
+
+    assert len(fetch_all_pages("/api/tweets/hashtag/legacy", 4)) == 7
+    assert len(fetch_all_pages("/api/tweets/mentions", 4, test_env["bob"])) == 7
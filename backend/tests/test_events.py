@@ -0,0 +1,254 @@
+from fastapi.testclient import TestClient
+import asyncio
+import httpx
+import json
+import pytest
+import socket
+import threading
+import time
+import uvicorn
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.routers import events
+from app.utils.events import EventHub, HEARTBEAT, RedisEventRelay, TooManySubscribers, event_hub
+from app.utils.redis_cache import RedisClient
+from app.utils.security import get_password_hash
+from tests.fake_redis import FakeRedisServer
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with a logged-in user and a tweet
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add(User(username="alice", email="alice@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    token = client.post("/api/users/login", json={"username": "alice", "password": "password"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    tweet_id = client.post("/api/tweets/", headers=headers, json={"content": "Hello"}).json()["id"]
+
+    yield {"headers": headers, "tweet_id": tweet_id}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+# The test client can't read a response that never ends, so streams are read from a real server
+@pytest.fixture
+def server_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield "http://127.0.0.1:%d" % sock.getsockname()[1]
+    server.should_exit = True
+    server.force_exit = True
+    thread.join()
+
+def read_events(response, count):
+    """The first count events of a stream as (type, data) pairs, skipping comments"""
+    events = []
+    event_type = None
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event_type = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event_type, json.loads(line[len("data: "):])))
+            if len(events) == count:
+                return events
+    return events
+
+async def next_event(subscription, timeout=1):
+    return await asyncio.wait_for(subscription.get(), timeout)
+
+# Test that events published from worker threads reach subscribers on the loop
+def test_publish_from_threads():
+    async def scenario():
+        hub = EventHub()
+        subscription = hub.subscribe()
+        threads = [threading.Thread(target=hub.publish, args=("tweet", str(i))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        received = sorted([(await next_event(subscription)).data for _ in range(5)])
+        hub.unsubscribe(subscription)
+        assert received == ["0", "1", "2", "3", "4"]
+        assert hub.stats()["subscribers"] == 0
+        assert not hub.active
+
+    asyncio.run(scenario())
+
+# Test that updates with the same key within the window are sent once, with the latest data
+def test_coalescing():
+    async def scenario():
+        hub = EventHub(coalesce_seconds=0.05)
+        subscription = hub.subscribe()
+        for likes in range(1, 4):
+            hub.publish("reaction", f"1:{likes}", coalesce_key=1)
+        hub.publish("reaction", "2:1", coalesce_key=2)
+        hub.publish("tweet", "new")
+
+        # Uncoalesced events don't wait for the window
+        assert (await next_event(subscription)).data == "new"
+        assert {(await next_event(subscription)).data for _ in range(2)} == {"1:3", "2:1"}
+        with pytest.raises(asyncio.TimeoutError):
+            await next_event(subscription, 0.1)
+        assert hub.stats()["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+# Test that a subscriber whose queue fills up is dropped, without affecting the others
+def test_slow_consumer_is_dropped():
+    async def scenario():
+        hub = EventHub(queue_size=2)
+        slow = hub.subscribe()
+        fast = hub.subscribe()
+        for i in range(3):
+            hub.publish("tweet", str(i))
+            await asyncio.sleep(0)
+            assert (await next_event(fast)).data == str(i)
+        await asyncio.sleep(0)
+
+        # The backlog is discarded and the consumer told to stop
+        assert await next_event(slow) is None
+        assert hub.stats()["dropped"] == 1
+        assert hub.stats()["subscribers"] == 1
+        hub.publish("tweet", "3")
+        assert (await next_event(fast)).data == "3"
+
+    asyncio.run(scenario())
+
+# Test that idle streams get heartbeats
+def test_heartbeat():
+    async def scenario():
+        hub = EventHub(heartbeat_seconds=0.05)
+        subscription = hub.subscribe()
+        assert await next_event(subscription) is HEARTBEAT
+        assert HEARTBEAT.sse == b": ping\n\n"
+        hub.unsubscribe(subscription)
+
+    asyncio.run(scenario())
+
+def test_subscriber_limit():
+    async def scenario():
+        hub = EventHub(max_subscribers=1)
+        subscription = hub.subscribe()
+        with pytest.raises(TooManySubscribers):
+            hub.subscribe()
+        hub.unsubscribe(subscription)
+        hub.unsubscribe(hub.subscribe())
+
+    asyncio.run(scenario())
+
+# Test that a stream whose body is never sent still gives up its subscription
+def test_event_stream_unsent_body(monkeypatch):
+    hub = EventHub()
+    monkeypatch.setattr(events, "event_hub", hub)
+
+    async def scenario():
+        response = await events.stream_events()
+        assert hub.stats()["subscribers"] == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # The client went away before the response started
+            raise OSError("connection lost")
+
+        # Raised from the response's task group
+        with pytest.raises((OSError, ExceptionGroup)):
+            await response({"type": "http", "method": "GET"}, receive, send)
+        assert hub.stats()["subscribers"] == 0
+
+    asyncio.run(scenario())
+
+# Test that workers sharing Redis deliver each other's events
+def test_redis_relay():
+    server = FakeRedisServer().start()
+    hubs = [EventHub(coalesce_seconds=0.01, relay=RedisEventRelay(RedisClient(server.url))) for _ in range(2)]
+    for hub in hubs:
+        hub.start()
+    deadline = time.monotonic() + 5
+    while len(server.subscribers.get(b"events", [])) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    async def scenario():
+        subscriptions = [hub.subscribe() for hub in hubs]
+        hubs[0].publish("tweet", "from worker 1")
+        hubs[1].publish("reaction", "7", coalesce_key=7)
+        for subscription in subscriptions:
+            assert (await next_event(subscription)).data == "from worker 1"
+            assert (await next_event(subscription)).data == "7"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        for hub in hubs:
+            hub.stop()
+        server.stop()
+
+# Test the Server-Sent Events endpoint end to end
+def test_event_stream(test_env, server_url, monkeypatch):
+    monkeypatch.setattr(event_hub, "coalesce_seconds", 0.05)
+    with httpx.stream("GET", f"{server_url}/api/events/", timeout=5) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["x-accel-buffering"] == "no"
+        deadline = time.monotonic() + 5
+        while not event_hub.active and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Published from the test client's thread, like a route in the threadpool
+        tweet_id = test_env["tweet_id"]
+        client.post("/api/tweets/", headers=test_env["headers"], json={"content": "Live #news"})
+        client.post(f"/api/tweets/{tweet_id}/reaction", headers=test_env["headers"], json={"reaction_type": "like"})
+        client.post(f"/api/tweets/{tweet_id}/reaction", headers=test_env["headers"], json={"reaction_type": "dislike"})
+
+        (tweet_type, tweet), (reaction_type, counts) = read_events(response, 2)
+        assert tweet_type == "tweet"
+        assert tweet["content"] == "Live #news"
+        assert tweet["author_username"] == "alice"
+        assert tweet["author"] == {"username": "alice", "profile_picture": None, "avatar_thumbnail": None}
+        assert tweet["user_reaction"] is None
+        # Both reactions within the window arrive as the final counts
+        assert reaction_type == "reaction"
+        assert counts == {"tweet_id": tweet_id, "likes_count": 0, "dislikes_count": 1}
+
+    deadline = time.monotonic() + 5
+    while event_hub.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not event_hub.active
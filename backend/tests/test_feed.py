@@ -0,0 +1,202 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet, tweet_reactions
+from app.utils.counters import repair_tweet_counters
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Count the SQL statements executed against the test database
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(engine, "before_cursor_execute", self)
+
+# Helper function to create a test user and get a token
+def create_test_user(username="testuser", email="test@example.com", password="password"):
+    hashed_password = get_password_hash(password)
+    db = TestingSessionLocal()
+    db_user = User(username=username, email=email, hashed_password=hashed_password)
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    db.close()
+
+    response = client.post(
+        "/api/users/login",
+        json={"username": username, "password": password}
+    )
+    return response.json()
+
+# Test fixture with two users, a page of tweets, replies and reactions
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    user1 = create_test_user("user1", "user1@example.com", "password1")
+    user2 = create_test_user("user2", "user2@example.com", "password2")
+
+    db = TestingSessionLocal()
+    tweets = [
+        Tweet(content=f"Feed tweet {i}", author_id=user1["user_id"] if i % 2 else user2["user_id"])
+        for i in range(30)
+    ]
+    db.add_all(tweets)
+    db.commit()
+
+    # Replies and reactions on the first tweets
+    db.add_all([
+        Tweet(content="Reply 1", author_id=user2["user_id"], parent_id=tweets[0].id),
+        Tweet(content="Reply 2", author_id=user1["user_id"], parent_id=tweets[0].id),
+    ])
+    db.execute(tweet_reactions.insert().values(user_id=user1["user_id"], tweet_id=tweets[0].id, reaction_type="like"))
+    db.execute(tweet_reactions.insert().values(user_id=user2["user_id"], tweet_id=tweets[0].id, reaction_type="like"))
+    db.execute(tweet_reactions.insert().values(user_id=user2["user_id"], tweet_id=tweets[1].id, reaction_type="dislike"))
+    db.commit()
+
+    # Rows were inserted directly, so backfill the stored counters
+    repair_tweet_counters(db)
+    first_id, second_id = tweets[0].id, tweets[1].id
+    db.close()
+
+    yield {
+        "user1": user1,
+        "user2": user2,
+        "first_id": first_id,
+        "second_id": second_id
+    }
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def count_queries(url, headers=None):
+    with QueryCounter() as counter:
+        response = client.get(url, headers=headers or {})
+    assert response.status_code == 200
+    return counter.count, response.json()
+
+# Test that hydrated counts and reactions are correct
+def test_feed_hydration(test_env):
+    token = test_env["user1"]["access_token"]
+    response = client.get("/api/tweets/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    data = {tweet["id"]: tweet for tweet in response.json()}
+    assert len(data) == 30
+
+    first = data[test_env["first_id"]]
+    assert first["author_username"] == "user2"
+    assert first["replies_count"] == 2
+    assert first["likes_count"] == 2
+    assert first["dislikes_count"] == 0
+    assert first["user_reaction"] == "like"
+
+    second = data[test_env["second_id"]]
+    assert second["author_username"] == "user1"
+    assert second["dislikes_count"] == 1
+    assert second["user_reaction"] is None
+
+# Test that the feed issues the same number of statements regardless of page size
+def test_feed_query_count_is_constant(test_env):
+    token = test_env["user1"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    # Warm the authentication cache so both page sizes resolve the user the same way
+    client.get("/api/profile/me", headers=headers)
+
+    for url in ("/api/tweets/?limit={}", "/api/tweets/user/user1?limit={}"):
+        small, small_data = count_queries(url.format(2))
+        large, large_data = count_queries(url.format(30))
+        assert len(small_data) == 2
+        assert len(large_data) > 2
+        assert small == large
+
+        small_authed, _ = count_queries(url.format(2), headers)
+        large_authed, _ = count_queries(url.format(30), headers)
+        assert small_authed == large_authed
+
+# Test that a tweet with replies is hydrated in a fixed number of statements
+def test_tweet_detail_hydration(test_env):
+    queries, data = count_queries(f"/api/tweets/{test_env['first_id']}")
+
+    assert data["replies_count"] == 2
+    assert data["likes_count"] == 2
+    assert [reply["content"] for reply in data["replies"]] == ["Reply 1", "Reply 2"]
+    assert data["replies"][0]["author_username"] == "user2"
+    assert all(reply["replies"] == [] for reply in data["replies"])
+
+    # Tweet, change versions, replies and authors
+    assert queries <= 4
+
+# Test that ?expand=author embeds the authors from the same batched query
+def test_expand_author(test_env):
+    digest = "0123456789abcdef0123456789abcdef"
+    db = TestingSessionLocal()
+    db.get(User, test_env["user1"]["user_id"]).profile_picture = f"/uploads/avatars/{digest}.jpg"
+    db.get(User, test_env["user2"]["user_id"]).profile_picture = "/uploads/profile_2.jpg"
+    db.commit()
+    db.close()
+
+    headers = {"Authorization": f"Bearer {test_env['user1']['access_token']}"}
+    client.get("/api/profile/me", headers=headers)
+    plain_queries, plain = count_queries("/api/tweets/?limit=30", headers)
+    expanded_queries, expanded = count_queries("/api/tweets/?limit=30&expand=author", headers)
+    assert all("author" not in tweet for tweet in plain)
+    assert expanded_queries == plain_queries
+
+    authors = {tweet["author_username"]: tweet["author"] for tweet in expanded}
+    assert authors["user1"] == {
+        "username": "user1",
+        "profile_picture": f"/uploads/avatars/{digest}.jpg",
+        "avatar_thumbnail": f"/uploads/avatars/{digest}_128.jpg"
+    }
+    # Pictures stored before thumbnails have no thumbnail to point at
+    assert authors["user2"]["avatar_thumbnail"] == "/uploads/profile_2.jpg"
+
+    # Anonymous pages are cached with the authors embedded
+    assert client.get("/api/tweets/?limit=30&expand=author").json() == [dict(tweet, user_reaction=None) for tweet in expanded]
+
+    small, _ = count_queries("/api/tweets/user/user1?limit=2&expand=author", headers)
+    large, page = count_queries("/api/tweets/user/user1?limit=30&expand=author", headers)
+    assert small == large
+    assert {tweet["author"]["username"] for tweet in page} == {"user1"}
+
+    assert client.get("/api/tweets/?expand=author,replies").status_code == 400
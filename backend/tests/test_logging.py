@@ -0,0 +1,110 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy.orm import sessionmaker
+import json
+import logging
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.utils.logging_config import configure_logging, JsonFormatter, LOG_FORMAT, LOG_LEVEL
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+class FormatCounter:
+    """Log argument counting how often it is rendered"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "formatted"
+
+# Test fixture with two users, one following the other
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    for name in ("user1", "user2"):
+        db.add(User(username=name, email=f"{name}@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    token = client.post("/api/users/login", json={"username": "user1", "password": "password"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    client.post("/api/profile/follow/user2", headers=headers)
+
+    yield {"headers": headers}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+@pytest.fixture
+def app_logger():
+    yield logging.getLogger("app")
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+
+# Test that JSON output carries the formatted message and extra fields
+def test_json_formatter():
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "user %s logged in", (42,), None)
+    record.request_id = "abc"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["message"] == "user 42 logged in"
+    assert entry["request_id"] == "abc"
+    assert "time" in entry
+
+# Test that messages below the configured level are never formatted
+def test_disabled_debug_is_not_formatted(app_logger):
+    configure_logging("INFO", "json")
+    argument = FormatCounter()
+
+    logging.getLogger("app.utils.security").debug("token %s", argument)
+    assert argument.count == 0
+
+    configure_logging("DEBUG", "json")
+    logging.getLogger("app.utils.security").debug("token %s", argument)
+    assert argument.count > 0
+
+# Test that the authenticated request path writes nothing to stdout
+def test_profile_view_does_not_print(test_env, app_logger, capsys):
+    configure_logging("INFO")
+    capsys.readouterr()
+
+    response = client.get("/api/profile/user2", headers=test_env["headers"])
+    assert response.status_code == 200
+    assert response.json()["is_followed"] is True
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == ""
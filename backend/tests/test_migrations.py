@@ -0,0 +1,198 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import create_db_engine, get_db
+from app.models.migrations import run_migrations, get_schema_version, MIGRATIONS
+from app.models.models import User, Tweet, tweet_reactions, followers
+from app.utils.counters import tweet_counters_update
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.timeline import rebuild_timelines
+from app.utils.security import create_access_token, get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with a migrated database holding a few users, tweets and replies
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    run_migrations(engine)
+
+    db = TestingSessionLocal()
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+    tweets = [Tweet(content=f"Tweet {i}", author_id=users[i % 3].id) for i in range(20)]
+    db.add_all(tweets)
+    db.commit()
+    db.add_all([Tweet(content=f"Reply {i}", author_id=users[1].id, parent_id=tweets[0].id) for i in range(3)])
+    db.commit()
+    tweet_id = tweets[0].id
+    db.close()
+
+    yield {"tweet_id": tweet_id}
+
+    with engine.begin() as conn:
+        for table in reversed(inspect(conn).get_table_names()):
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def capture_statements(url, headers=None):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return statements, response
+
+def query_plan(statement, parameters=()):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+def find_statement(statements, *fragments):
+    return next(
+        (statement, parameters) for statement, parameters in statements
+        if all(fragment in statement for fragment in fragments)
+    )
+
+# Test that migrations are recorded and only applied once
+def test_migrations_are_versioned(test_env):
+    assert get_schema_version(engine) == MIGRATIONS[-1][0]
+    assert run_migrations(engine) == []
+
+# Test upgrading a database created before columns and indexes existed
+def test_migrations_upgrade_legacy_database():
+    legacy_engine = create_db_engine("sqlite:///:memory:")
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, email VARCHAR, hashed_password VARCHAR, created_at DATETIME, is_active BOOLEAN)")
+        conn.exec_driver_sql("CREATE TABLE tweets (id INTEGER PRIMARY KEY, content VARCHAR(256) NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), author_id INTEGER)")
+        conn.exec_driver_sql("CREATE TABLE tweet_reactions (user_id INTEGER, tweet_id INTEGER, reaction_type VARCHAR NOT NULL, PRIMARY KEY (user_id, tweet_id))")
+        conn.exec_driver_sql("CREATE TABLE followers (follower_id INTEGER, followed_id INTEGER, PRIMARY KEY (follower_id, followed_id))")
+        conn.exec_driver_sql("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'author', 'author@example.com', 'x'), (2, 'reader', 'reader@example.com', 'x')")
+        conn.exec_driver_sql("INSERT INTO followers VALUES (2, 1)")
+        conn.exec_driver_sql("INSERT INTO tweets (content, author_id) VALUES ('Old tweet', 1)")
+        conn.exec_driver_sql("INSERT INTO tweet_reactions VALUES (1, 1, 'like')")
+
+    applied = run_migrations(legacy_engine)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+
+    inspector = inspect(legacy_engine)
+    tweet_columns = {column["name"] for column in inspector.get_columns("tweets")}
+    assert {"parent_id", "replies_count", "likes_count", "dislikes_count"} <= tweet_columns
+    user_columns = {column["name"] for column in inspector.get_columns("users")}
+    assert {"profile_picture", "followers_count", "following_count"} <= user_columns
+    assert inspector.has_table("followers")
+    assert "created_at" in {column["name"] for column in inspector.get_columns("followers")}
+    assert inspector.has_table("tweet_hashtags") and inspector.has_table("tweet_mentions")
+    assert "ix_tweets_feed" in {index["name"] for index in inspector.get_indexes("tweets")}
+
+    with legacy_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT likes_count FROM tweets").scalar() == 1
+        # Tweets written before the search index existed are indexed
+        assert conn.exec_driver_sql("SELECT rowid FROM tweets_fts WHERE tweets_fts MATCH 'old'").scalar() == 1
+        # Existing follows are materialized into the home timelines
+        entries = conn.exec_driver_sql("SELECT user_id, tweet_id FROM timeline_entries ORDER BY user_id").all()
+        assert [tuple(entry) for entry in entries] == [(1, 1), (2, 1)]
+
+# Test that feed pages are index range scans
+def test_feed_queries_use_indexes(test_env):
+    first_page, response = capture_statements("/api/tweets/?limit=5")
+    statements, _ = capture_statements(f"/api/tweets/?limit=5&cursor={response.headers[NEXT_CURSOR_HEADER]}")
+
+    for captured in (first_page, statements):
+        plan = query_plan(*find_statement(captured, "FROM tweets", "ORDER BY"))
+        assert "USING INDEX ix_tweets_feed" in plan or "USING COVERING INDEX ix_tweets_feed" in plan
+        assert "TEMP B-TREE" not in plan
+
+    statements, _ = capture_statements("/api/tweets/user/user1?limit=5")
+    plan = query_plan(*find_statement(statements, "FROM tweets", "ORDER BY"))
+    assert "INDEX ix_tweets_author_feed" in plan
+    assert "TEMP B-TREE" not in plan
+
+# Test that follower and following pages are index range scans
+def test_follow_list_queries_use_indexes(test_env):
+    for url, index_name in (
+        ("/api/profile/user0/followers?limit=5", "ix_followers_followed_feed"),
+        ("/api/profile/user0/following?limit=5", "ix_followers_follower_feed"),
+    ):
+        statements, response = capture_statements(url)
+        assert response.status_code == 200
+
+        plan = query_plan(*find_statement(statements, "JOIN followers", "ORDER BY"))
+        assert f"INDEX {index_name}" in plan
+        assert "TEMP B-TREE" not in plan
+
+# Test that home timeline pages are index range scans
+def test_timeline_query_uses_index(test_env):
+    # The fixture inserts tweets directly, so materialize the timelines first
+    db = TestingSessionLocal()
+    rebuild_timelines(db)
+    db.close()
+
+    token = create_access_token(data={"sub": "user0", "id": 1})
+    statements, response = capture_statements("/api/tweets/timeline?limit=5", {"Authorization": f"Bearer {token}"})
+    assert len(response.json()) == 5
+
+    plan = query_plan(*find_statement(statements, "FROM timeline_entries", "ORDER BY"))
+    assert "INDEX ix_timeline_entries_feed" in plan
+    assert "TEMP B-TREE" not in plan
+
+# Test that loading replies searches by parent_id
+def test_reply_query_uses_index(test_env):
+    statements, response = capture_statements(f"/api/tweets/{test_env['tweet_id']}")
+    assert len(response.json()["replies"]) == 3
+
+    plan = query_plan(*find_statement(statements, "FROM tweets", "tweets.parent_id = ?"))
+    assert "INDEX ix_tweets_feed (parent_id=?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+# Test that reaction and follower lookups by tweet or followed user use indexes
+def test_reaction_queries_use_indexes(test_env):
+    with engine.connect() as conn:
+        count_likes = select(func.count()).where(tweet_reactions.c.tweet_id == 1, tweet_reactions.c.reaction_type == "like")
+        compiled = count_likes.compile(conn)
+        plan = query_plan(str(compiled), tuple(compiled.params[key] for key in compiled.positiontup))
+        assert "INDEX ix_tweet_reactions_tweet_id" in plan
+
+        compiled = tweet_counters_update().compile(conn)
+        plan = query_plan(str(compiled), tuple(compiled.params[key] for key in compiled.positiontup))
+        assert "INDEX ix_tweet_reactions_tweet_id" in plan
+        assert "INDEX ix_tweets_feed" in plan
+
+        count_followers = select(func.count()).where(followers.c.followed_id == 1)
+        compiled = count_followers.compile(conn)
+        plan = query_plan(str(compiled), tuple(compiled.params[key] for key in compiled.positiontup))
+        assert "INDEX ix_followers_followed_feed" in plan
@@ -0,0 +1,186 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet, followers
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Helper function to create a test user and get a token
+def create_test_user(username="testuser", email="test@example.com", password="password"):
+    hashed_password = get_password_hash(password)
+    db = TestingSessionLocal()
+    db_user = User(username=username, email=email, hashed_password=hashed_password)
+    db.add(db_user)
+    db.commit()
+    db.close()
+
+    response = client.post(
+        "/api/users/login",
+        json={"username": username, "password": password}
+    )
+    return response.json()
+
+# Test fixture with two users and a feed of tweets sharing created_at values
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    user1 = create_test_user("user1", "user1@example.com", "password1")
+    user2 = create_test_user("user2", "user2@example.com", "password2")
+
+    # Timestamps have one second resolution, so many tweets share one
+    db = TestingSessionLocal()
+    db.add_all([
+        Tweet(content=f"Tweet {i}", author_id=user1["user_id"] if i % 3 else user2["user_id"])
+        for i in range(25)
+    ])
+    db.commit()
+    db.close()
+
+    yield {
+        "user1": user1,
+        "user2": user2
+    }
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def fetch_all_pages(url, limit):
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        ids.extend(tweet["id"] for tweet in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids
+
+# Test walking the whole feed with cursors
+def test_cursor_pagination(test_env):
+    ids = fetch_all_pages("/api/tweets/", 10)
+
+    assert len(ids) == 25
+    assert ids == sorted(ids, reverse=True)
+
+    user_ids = fetch_all_pages("/api/tweets/user/user1", 4)
+    assert len(user_ids) == 16
+    assert len(set(user_ids)) == 16
+
+# Test that tweets posted between pages don't shift the next page
+def test_cursor_stable_with_new_tweets(test_env):
+    first = client.get("/api/tweets/?limit=10")
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    client.post(
+        "/api/tweets/",
+        headers={"Authorization": f"Bearer {test_env['user2']['access_token']}"},
+        json={"content": "Posted while scrolling"}
+    )
+
+    second = client.get("/api/tweets/", params={"limit": 10, "cursor": cursor})
+    first_ids = [tweet["id"] for tweet in first.json()]
+    second_ids = [tweet["id"] for tweet in second.json()]
+
+    assert len(second_ids) == 10
+    assert not set(first_ids) & set(second_ids)
+    assert max(second_ids) < min(first_ids)
+
+# Test that skip keeps working and the last page has no cursor
+def test_skip_pagination(test_env):
+    response = client.get("/api/tweets/?skip=20&limit=10")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+    response = client.get("/api/tweets/?skip=0&limit=10")
+    assert NEXT_CURSOR_HEADER in response.headers
+
+# Test that a malformed cursor is rejected
+def test_invalid_cursor(test_env):
+    response = client.get("/api/tweets/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+# Test that limits below 1 give empty pages without a cursor
+@pytest.mark.parametrize("url", ["/api/tweets/", "/api/tweets/user/user1", "/api/tweets/search?q=tweet", "/api/profile/user1/followers"])
+@pytest.mark.parametrize("limit", [0, -1])
+def test_empty_limit(test_env, url, limit):
+    response = client.get(url, params={"limit": limit})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+def fetch_all_follow_pages(url, limit, headers=None):
+    usernames = []
+    cursor = None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        usernames.extend(user["username"] for user in response.json())
+        assert all(set(user) == {"username", "profile_picture"} for user in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return usernames
+
+# Test paging through followers and following, most recent follows first
+def test_follow_list_pagination(test_env):
+    db = TestingSessionLocal()
+    fans = [User(username=f"fan{i}", email=f"fan{i}@example.com", hashed_password="x") for i in range(7)]
+    db.add_all(fans)
+    db.commit()
+    # Follows share a timestamp here, so the follower id breaks the tie
+    db.execute(followers.insert(), [
+        {"follower_id": fan.id, "followed_id": test_env["user1"]["user_id"]} for fan in fans
+    ] + [
+        {"follower_id": test_env["user1"]["user_id"], "followed_id": fan.id} for fan in fans[:3]
+    ])
+    db.commit()
+    db.close()
+
+    expected = [f"fan{i}" for i in reversed(range(7))]
+    assert fetch_all_follow_pages("/api/profile/user1/followers", 3) == expected
+    assert fetch_all_follow_pages("/api/profile/user1/following", 2) == ["fan2", "fan1", "fan0"]
+
+    headers = {"Authorization": f"Bearer {test_env['user1']['access_token']}"}
+    assert fetch_all_follow_pages("/api/profile/followers/list", 4, headers) == expected
+    assert fetch_all_follow_pages("/api/profile/following/list", 10, headers) == ["fan2", "fan1", "fan0"]
+
+    assert client.get("/api/profile/nobody/followers").status_code == 404
@@ -0,0 +1,123 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+import threading
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.utils.security import (
+    get_password_hash, password_hasher, PasswordHasher, PasswordHasherBusy, PASSWORD_HASH_RETRY_AFTER
+)
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with one registered user
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add(User(username="user1", email="user1@example.com", hashed_password=get_password_hash("password1")))
+    db.commit()
+    db.close()
+
+    yield
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+# Test that work beyond the in-flight limit is rejected rather than queued
+def test_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(workers=1, max_in_flight=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return "hashed"
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(hasher.run(slow_hash)))
+    thread.start()
+    started.wait(5)
+
+    stats = hasher.stats()
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == 0
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher.run(lambda: "never runs")
+
+    release.set()
+    thread.join()
+
+    assert result == ["hashed"]
+    stats = hasher.stats()
+    assert stats["in_flight"] == 0
+    assert stats["completed"] == 1
+    assert stats["rejected"] == 1
+
+    def failing_hash():
+        raise ValueError("malformed hash")
+
+    with pytest.raises(ValueError):
+        hasher.run(failing_hash)
+    stats = hasher.stats()
+    assert stats["in_flight"] == 0
+    assert stats["completed"] == 1
+    assert stats["failed"] == 1
+
+# Test that a saturated hasher turns logins into a fast 503
+def test_login_returns_503_when_saturated(test_env, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_in_flight", 0)
+
+    response = client.post(
+        "/api/users/login",
+        json={"username": "user1", "password": "password1"}
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(PASSWORD_HASH_RETRY_AFTER)
+
+    monkeypatch.undo()
+    response = client.post(
+        "/api/users/login",
+        json={"username": "user1", "password": "password1"}
+    )
+    assert response.status_code == 200
+
+# Test that the metrics endpoint exposes the hashing queue
+def test_metrics_expose_password_hashing():
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+
+    stats = response.json()["password_hashing"]
+    assert stats["workers"] == password_hasher.workers
+    assert stats["max_in_flight"] == password_hasher.max_in_flight
+    assert {"in_flight", "queued", "completed", "failed", "rejected"} <= stats.keys()
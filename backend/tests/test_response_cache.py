@@ -0,0 +1,163 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.response_cache import CachedResponse, ResponseCache
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with one logged-in user
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add(User(username="alice", email="alice@example.com", hashed_password=get_password_hash("password")))
+    db.commit()
+    db.close()
+
+    token = client.post("/api/users/login", json={"username": "alice", "password": "password"}).json()
+    yield {"Authorization": f"Bearer {token['access_token']}"}
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def counting_compute(calls, body=b"[]", delay=0):
+    def compute():
+        calls.append(True)
+        time.sleep(delay)
+        return CachedResponse(body)
+    return compute
+
+# Test hits, misses and version invalidation
+def test_hits_and_invalidation():
+    cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+    calls = []
+
+    assert cache.get_or_compute("a", counting_compute(calls)).body == b"[]"
+    assert cache.get_or_compute("a", counting_compute(calls)).body == b"[]"
+    assert len(calls) == 1
+
+    cache.invalidate()
+    cache.get_or_compute("a", counting_compute(calls, b"[1]"))
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["version"], stats["size"]) == (1, 2, 1, 1)
+
+# Test that concurrent misses for a key compute it once
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+    calls = []
+    bodies = []
+
+    def request():
+        bodies.append(cache.get_or_compute("feed", counting_compute(calls, delay=0.05)).body)
+
+    threads = [threading.Thread(target=request) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert bodies == [b"[]"] * 10
+
+# Test that a stale entry is refreshed by one request while others get the old bytes
+def test_stale_while_revalidate():
+    cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+    cache.get_or_compute("feed", counting_compute([], b"old")).fresh_until = 0
+
+    refreshing = threading.Event()
+    release = threading.Event()
+    def slow_compute():
+        refreshing.set()
+        release.wait(5)
+        return CachedResponse(b"new")
+
+    refreshed = []
+    refresher = threading.Thread(target=lambda: refreshed.append(cache.get_or_compute("feed", slow_compute).body))
+    refresher.start()
+    refreshing.wait(5)
+
+    calls = []
+    assert cache.get_or_compute("feed", counting_compute(calls, b"other")).body == b"old"
+    assert calls == []
+
+    release.set()
+    refresher.join()
+    assert refreshed == [b"new"]
+    assert cache.get_or_compute("feed", counting_compute(calls, b"other")).body == b"new"
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["refreshes"] == 1
+
+# Test the anonymous feed is served from the cache until a write
+def test_anonymous_feed_cache(test_env):
+    for i in range(3):
+        client.post("/api/tweets/", headers=test_env, json={"content": f"Tweet {i}"})
+
+    first = client.get("/api/tweets/?limit=2")
+    assert first.status_code == 200
+    assert [tweet["content"] for tweet in first.json()] == ["Tweet 2", "Tweet 1"]
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        second = client.get("/api/tweets/?limit=2")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert statements == []
+    assert second.json() == first.json()
+    assert second.headers[NEXT_CURSOR_HEADER] == first.headers[NEXT_CURSOR_HEADER]
+    assert second.headers["content-type"] == "application/json"
+
+    # Writes invalidate the cached pages
+    tweet_id = first.json()[0]["id"]
+    client.post(f"/api/tweets/{tweet_id}/reaction", headers=test_env, json={"reaction_type": "like"})
+    assert client.get("/api/tweets/?limit=2").json()[0]["likes_count"] == 1
+
+    client.post("/api/tweets/", headers=test_env, json={"content": "Tweet 3"})
+    assert client.get("/api/tweets/?limit=2").json()[0]["content"] == "Tweet 3"
+
+    # Authenticated requests skip the cache and see their own reactions
+    response = client.get("/api/tweets/?limit=2", headers=test_env)
+    assert response.json()[1]["user_reaction"] == "like"
+    assert client.get("/api/tweets/?limit=2").json()[1]["user_reaction"] is None
+
+    assert client.get("/api/metrics").json()["feed_cache"]["hits"] >= 1
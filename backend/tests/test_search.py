@@ -0,0 +1,128 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.search import build_match_query, rebuild_search_index
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with one user and a handful of tweets
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    user = User(username="user1", email="user1@example.com", hashed_password=get_password_hash("password1"))
+    db.add(user)
+    db.commit()
+    db.add_all([
+        Tweet(content="Coffee first, then code", author_id=user.id),
+        Tweet(content="Coffee coffee coffee!", author_id=user.id),
+        Tweet(content="Tea is fine too", author_id=user.id),
+        Tweet(content="Café culture and coffee", author_id=user.id),
+    ] + [Tweet(content=f"Daily standup notes {i}", author_id=user.id) for i in range(7)])
+    db.commit()
+    db.close()
+
+    yield
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def search(q, **params):
+    response = client.get("/api/tweets/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response
+
+# Test ranked matches hydrated like the feed
+def test_search_ranks_matches(test_env):
+    results = search("coffee").json()
+
+    assert [tweet["content"] for tweet in results][0] == "Coffee coffee coffee!"
+    assert {tweet["content"] for tweet in results} == {
+        "Coffee first, then code", "Coffee coffee coffee!", "Café culture and coffee"
+    }
+    assert results[0]["author_username"] == "user1"
+    assert results[0]["likes_count"] == 0
+
+    # Every word must match, and diacritics are folded
+    assert [tweet["content"] for tweet in search("cafe coffee").json()] == ["Café culture and coffee"]
+    assert search("espresso").json() == []
+
+# Test walking all results with cursors
+def test_search_cursor_pagination(test_env):
+    first = search("standup", limit=3)
+    ids = [tweet["id"] for tweet in first.json()]
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    while cursor:
+        response = search("standup", limit=3, cursor=cursor)
+        ids.extend(tweet["id"] for tweet in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+
+    assert len(ids) == 7
+    assert len(set(ids)) == 7
+
+# Test that FTS syntax in the query is searched literally
+def test_search_escapes_query_syntax(test_env):
+    assert build_match_query('tea "OR* coffee') == '"tea" """OR*" "coffee"'
+    assert build_match_query("   ") is None
+
+    assert search('coffee AND OR (').json() == []
+    assert search("   ").json() == []
+
+# Test that the triggers keep the index in sync with new and edited tweets
+def test_search_index_follows_writes(test_env):
+    token = client.post("/api/users/login", json={"username": "user1", "password": "password1"}).json()
+    response = client.post(
+        "/api/tweets/",
+        headers={"Authorization": f"Bearer {token['access_token']}"},
+        json={"content": "Searching for matcha"}
+    )
+    tweet_id = response.json()["id"]
+    assert [tweet["id"] for tweet in search("matcha").json()] == [tweet_id]
+
+    db = TestingSessionLocal()
+    db.query(Tweet).filter(Tweet.id == tweet_id).update({"content": "Searching for oolong"})
+    db.commit()
+    assert search("matcha").json() == []
+    assert [tweet["id"] for tweet in search("oolong").json()] == [tweet_id]
+
+    # A rebuild recovers from an index that drifted out of sync
+    db.execute(text("INSERT INTO tweets_fts (tweets_fts) VALUES ('delete-all')"))
+    db.commit()
+    assert search("oolong").json() == []
+    rebuild_search_index(db)
+    db.close()
+    assert [tweet["id"] for tweet in search("oolong").json()] == [tweet_id]
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import startup
+from app.models.database import create_db_engine
+from app.models.migrations import MIGRATIONS, get_schema_version, run_migrations
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Test that importing the app creates no directories or database
+def test_import_has_no_side_effects(tmp_path):
+    config_dir = tmp_path / "config"
+    uploads_dir = tmp_path / "uploads"
+    env = {**os.environ, "CONFIG_DIR": str(config_dir), "UPLOADS_DIR": str(uploads_dir)}
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert not config_dir.exists()
+    assert not uploads_dir.exists()
+
+# Test the one-shot preparation step
+def test_prepare(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'prepare.db'}")
+    monkeypatch.setattr(startup, "CONFIG_DIR", str(tmp_path / "config"))
+    monkeypatch.setattr(startup, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(startup, "AVATARS_DIR", str(tmp_path / "uploads" / "avatars"))
+    monkeypatch.setattr(startup, "engine", engine)
+    monkeypatch.setattr(startup, "run_migrations", lambda: run_migrations(engine))
+
+    assert startup.prepare() == [version for version, _, _ in MIGRATIONS]
+    assert (tmp_path / "config").is_dir()
+    assert (tmp_path / "uploads" / "avatars").is_dir()
+    assert get_schema_version(engine) == MIGRATIONS[-1][0]
+
+    # Running it again, e.g. on the next deploy, has nothing left to do
+    assert startup.prepare() == []
+    engine.dispose()
@@ -0,0 +1,111 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+import gzip
+import os
+import pytest
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.static import IMMUTABLE_CACHE_CONTROL, PrecompressedStaticFiles, SpaShell, available_encodings, precompress_directory
+
+SCRIPT = b"console.log('hello');\n" * 200
+
+# Test fixture with a small frontend build served like app.main serves it
+@pytest.fixture
+def build(tmp_path):
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    (static / "js" / "main.abc123.js").write_bytes(SCRIPT)
+    (static / "js" / "tiny.js").write_bytes(b"1;")
+    (static / "logo.png").write_bytes(b"\x89PNG" * 500)
+    (tmp_path / "index.html").write_bytes(b"<html><body>" + b"<div></div>" * 200 + b"</body></html>")
+
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=static), name="static")
+    shell = SpaShell(str(tmp_path / "index.html"))
+
+    @app.get("/{full_path:path}")
+    async def serve(request: Request, full_path: str = ""):
+        return await shell.response(request)
+
+    return {"static": static, "index": tmp_path / "index.html", "client": TestClient(app)}
+
+def touch_later(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+# Test that only compressible files worth it get copies, and only once
+def test_precompress_directory(build):
+    static = build["static"]
+    assert precompress_directory(str(static)) == len(available_encodings())
+    assert gzip.decompress((static / "js" / "main.abc123.js.gz").read_bytes()) == SCRIPT
+    assert not (static / "js" / "tiny.js.gz").exists()
+    assert not (static / "logo.png.gz").exists()
+    assert precompress_directory(str(static)) == 0
+
+    # A rebuilt file gets a new copy
+    touch_later(static / "js" / "main.abc123.js")
+    assert precompress_directory(str(static)) == len(available_encodings())
+    assert not list(static.rglob("*.tmp"))
+
+def test_precompressed_assets(build):
+    precompress_directory(str(build["static"]))
+    client = build["client"]
+
+    response = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/javascript")
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert int(response.headers["content-length"]) < len(SCRIPT)
+    assert response.content == SCRIPT
+
+    # Revalidating the compressed copy
+    etag = response.headers["etag"]
+    response = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+
+    for accept_encoding in ("identity", "gzip;q=0, br;q=0"):
+        response = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": accept_encoding})
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] != etag
+        assert response.content == SCRIPT
+
+    # Brotli copies from the build are preferred when accepted
+    (build["static"] / "js" / "main.abc123.js.br").write_bytes(b"brotli bytes")
+    response = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+
+    # Outdated copies are ignored
+    touch_later(build["static"] / "js" / "main.abc123.js", 20)
+    response = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+
+# Test that the shell is served from memory, revalidated, and reloaded when it changes
+def test_spa_shell(build):
+    client = build["client"]
+    response = client.get("/profile/alice", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.text.startswith("<html>")
+    etag = response.headers["etag"]
+
+    response = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] != etag
+
+    # A new build replaces the file
+    build["index"].write_bytes(b"<html>new build</html>")
+    touch_later(build["index"])
+    response = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.text == "<html>new build</html>"
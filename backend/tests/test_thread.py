@@ -0,0 +1,128 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, Tweet
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+# Test fixture with a conversation:
+#   root
+#   ├── a
+#   │   ├── a1
+#   │   │   └── a1x
+#   │   └── a2
+#   └── b
+#       └── b1
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    alice = User(username="alice", email="alice@example.com", hashed_password=get_password_hash("password"))
+    bob = User(username="bob", email="bob@example.com", hashed_password=get_password_hash("password"))
+    db.add_all([alice, bob])
+    db.flush()
+
+    start = datetime(2024, 1, 1)
+    tree = [("root", None), ("a", "root"), ("b", "root"), ("a1", "a"), ("b1", "b"), ("a2", "a"), ("a1x", "a1")]
+    ids = {}
+    for i, (content, parent) in enumerate(tree):
+        tweet = Tweet(
+            content=content,
+            author_id=alice.id if i % 2 == 0 else bob.id,
+            parent_id=ids.get(parent),
+            created_at=start + timedelta(minutes=i),
+            replies_count=sum(1 for _, p in tree if p == content)
+        )
+        db.add(tweet)
+        db.flush()
+        ids[content] = tweet.id
+    # An unrelated tweet that must not show up
+    db.add(Tweet(content="other", author_id=alice.id, created_at=start))
+    db.commit()
+    db.close()
+
+    yield ids
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def shape(node):
+    return {node["content"]: [shape(reply) for reply in node["replies"]]}
+
+# Test that the whole tree is returned, nested and oldest first
+def test_full_thread(test_env):
+    response = client.get(f"/api/tweets/{test_env['root']}/thread")
+    assert response.status_code == 200
+    thread = response.json()
+
+    assert shape(thread) == {"root": [{"a": [{"a1": [{"a1x": []}]}, {"a2": []}]}, {"b": [{"b1": []}]}]}
+    assert thread["replies"][0]["author_username"] == "bob"
+    assert thread["replies"][0]["replies_count"] == 2
+
+    # A thread can start below the root of the conversation
+    response = client.get(f"/api/tweets/{test_env['a1']}/thread")
+    assert shape(response.json()) == {"a1": [{"a1x": []}]}
+
+    assert client.get("/api/tweets/9999/thread").status_code == 404
+
+# Test that the depth and size caps keep the shallowest replies
+def test_thread_caps(test_env):
+    response = client.get(f"/api/tweets/{test_env['root']}/thread?max_depth=1")
+    assert shape(response.json()) == {"root": [{"a": []}, {"b": []}]}
+
+    response = client.get(f"/api/tweets/{test_env['root']}/thread?max_depth=0")
+    assert shape(response.json()) == {"root": []}
+
+    # Breadth first: both direct replies, then the first of the second level
+    response = client.get(f"/api/tweets/{test_env['root']}/thread?max_nodes=4")
+    tree = shape(response.json())
+    assert [list(reply)[0] for reply in tree["root"]] == ["a", "b"]
+    assert sum(len(list(reply.values())[0]) for reply in tree["root"]) == 1
+
+# Test that a thread costs the same statements however deep it is
+def test_thread_statement_count(test_env):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"/api/tweets/{test_env['root']}/thread")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    # Change versions, thread ids, tweets by id, authors
+    assert len(statements) == 4
+    assert "WITH RECURSIVE" in statements[1]
@@ -0,0 +1,195 @@
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User, TimelineEntry
+from app.utils import timeline
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.security import get_password_hash
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+USERNAMES = ["alice", "bob", "carol", "dave", "erin", "frank"]
+
+# Test fixture with a few users, logged in, following nobody
+@pytest.fixture
+def test_env():
+    # Each test module overrides get_db at import time, so claim it for this test
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    hashed_password = get_password_hash("password")
+    db.add_all([
+        User(username=name, email=f"{name}@example.com", hashed_password=hashed_password)
+        for name in USERNAMES
+    ])
+    db.commit()
+    db.close()
+
+    headers = {}
+    for name in USERNAMES:
+        token = client.post("/api/users/login", json={"username": name, "password": "password"}).json()
+        headers[name] = {"Authorization": f"Bearer {token['access_token']}"}
+
+    yield headers
+
+    Base.metadata.drop_all(bind=engine)
+    if previous_override is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous_override
+
+def post(headers, content, parent_id=None):
+    response = client.post("/api/tweets/", headers=headers, json={"content": content, "parent_id": parent_id})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def follow(headers, username, action="follow"):
+    assert client.post(f"/api/profile/{action}/{username}", headers=headers).status_code == 200
+
+def timeline_contents(headers, limit=100):
+    contents = []
+    cursor = None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/tweets/timeline", headers=headers, params=params)
+        assert response.status_code == 200
+        contents.extend(tweet["content"] for tweet in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return contents
+
+def entry_count(user_headers_name):
+    db = TestingSessionLocal()
+    user_id = db.query(User.id).filter(User.username == user_headers_name).scalar()
+    count = db.query(TimelineEntry).filter(TimelineEntry.user_id == user_id).count()
+    db.close()
+    return count
+
+# Test that new tweets reach followers and the author, but not replies or strangers
+def test_fan_out_on_write(test_env):
+    follow(test_env["bob"], "alice")
+
+    tweet_id = post(test_env["alice"], "Hello followers")
+    post(test_env["bob"], "Reply", parent_id=tweet_id)
+    post(test_env["bob"], "Bob's own tweet")
+
+    assert timeline_contents(test_env["bob"]) == ["Bob's own tweet", "Hello followers"]
+    assert timeline_contents(test_env["alice"]) == ["Hello followers"]
+    assert timeline_contents(test_env["carol"]) == []
+
+    assert client.get("/api/tweets/timeline").status_code == 401
+
+# Test backfill on follow and pruning on unfollow
+def test_follow_backfills_and_unfollow_prunes(test_env):
+    for i in range(3):
+        post(test_env["alice"], f"Alice {i}")
+
+    follow(test_env["bob"], "alice")
+    assert timeline_contents(test_env["bob"]) == ["Alice 2", "Alice 1", "Alice 0"]
+
+    follow(test_env["bob"], "alice", "unfollow")
+    assert timeline_contents(test_env["bob"]) == []
+    assert entry_count("bob") == 0
+
+# Test that accounts above the threshold are merged in on read
+def test_fan_out_on_read_above_threshold(test_env, monkeypatch):
+    follow(test_env["bob"], "carol")
+    follow(test_env["carol"], "alice")
+    follow(test_env["dave"], "alice")
+    # alice has two followers, carol has one
+    monkeypatch.setattr(timeline, "FANOUT_FOLLOWER_THRESHOLD", 1)
+
+    follow(test_env["bob"], "alice")
+    for i in range(4):
+        post(test_env["alice"], f"Alice {i}")
+        post(test_env["carol"], f"Carol {i}")
+
+    # alice's tweets were not copied anywhere but her own timeline
+    assert entry_count("bob") == 4
+    assert entry_count("alice") == 4
+
+    expected = [f"{name} {i}" for i in reversed(range(4)) for name in ("Carol", "Alice")]
+    assert timeline_contents(test_env["bob"]) == expected
+    assert timeline_contents(test_env["bob"], limit=3) == expected
+
+# Test that tweets merged in on read stay once their author drops to the threshold
+def test_fan_out_resumes_below_threshold(test_env, monkeypatch):
+    monkeypatch.setattr(timeline, "FANOUT_FOLLOWER_THRESHOLD", 1)
+    follow(test_env["bob"], "alice")
+    follow(test_env["carol"], "alice")
+    post(test_env["alice"], "Above the threshold")
+    assert entry_count("bob") == 0
+
+    follow(test_env["carol"], "alice", "unfollow")
+    assert entry_count("bob") == 1
+    assert entry_count("carol") == 0
+    post(test_env["alice"], "Back at the threshold")
+    assert timeline_contents(test_env["bob"]) == ["Back at the threshold", "Above the threshold"]
+
+# Test that a page costs the same number of queries however many accounts are followed
+def test_timeline_query_count_is_bounded(test_env):
+    for name in USERNAMES[2:]:
+        post(test_env[name], f"Tweet by {name}")
+
+    def count_timeline_queries(headers):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            client.get("/api/tweets/timeline?limit=2", headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        return len(statements)
+
+    follow(test_env["alice"], "carol")
+    for name in USERNAMES[2:]:
+        follow(test_env["bob"], name)
+    # Warm the authentication cache for both readers
+    timeline_contents(test_env["alice"])
+    timeline_contents(test_env["bob"])
+
+    assert count_timeline_queries(test_env["alice"]) == count_timeline_queries(test_env["bob"])
+
+# Test that a rebuild reproduces the incrementally maintained timelines
+def test_rebuild_timelines(test_env):
+    follow(test_env["bob"], "alice")
+    post(test_env["alice"], "Before carol followed")
+    follow(test_env["carol"], "alice")
+    post(test_env["alice"], "After carol followed")
+    post(test_env["carol"], "Carol's tweet")
+
+    before = {name: timeline_contents(test_env[name]) for name in USERNAMES}
+
+    db = TestingSessionLocal()
+    assert timeline.rebuild_timelines(db) == sum(len(contents) for contents in before.values())
+    db.close()
+
+    assert {name: timeline_contents(test_env[name]) for name in USERNAMES} == before
@@ -0,0 +1,202 @@
+from fastapi.testclient import TestClient
+import pytest
+import threading
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.models.database import Base, create_db_engine, get_db
+from app.models.models import User
+from app.routers import tweet
+from app.utils.security import get_password_hash
+from app.utils.trends import TrendingHashtags
+
+# Create an in-memory SQLite database shared by the test client threads
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Override the get_db dependency to use our test database
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Test client
+client = TestClient(app)
+
+class FakeClock:
+    def __init__(self, now=1_000_000 * 60):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += minutes * 60
+
+def make_trends(clock, **kwargs):
+    kwargs.setdefault("window_minutes", 60)
+    kwargs.setdefault("half_life_minutes", 15)
+    kwargs.setdefault("top_k", 3)
+    kwargs.setdefault("refresh_seconds", 0)
+    return TrendingHashtags(clock=clock, **kwargs)
+
+# Test ranking and expiry of uses that leave the window
+def test_window_counts_and_expiry():
+    clock = FakeClock()
+    trends = make_trends(clock)
+
+    for _ in range(3):
+        trends.record(["python"])
+    trends.record(["sqlite", "python"])
+    clock.advance(1)
+    trends.record(["sqlite"])
+
+    assert trends.top() == [{"tag": "python", "count": 4}, {"tag": "sqlite", "count": 2}]
+
+    # The first minute's uses expire, leaving the later sqlite use
+    clock.advance(59)
+    assert trends.top() == [{"tag": "sqlite", "count": 1}]
+
+    clock.advance(60)
+    assert trends.top() == []
+
+# Test that recent uses outweigh older ones of the same count
+def test_recent_uses_rank_higher():
+    clock = FakeClock()
+    trends = make_trends(clock)
+
+    trends.record(["old"])
+    trends.record(["old"])
+    clock.advance(45)
+    trends.record(["new"])
+    trends.record(["new"])
+
+    assert [trend["tag"] for trend in trends.top()] == ["new", "old"]
+
+    # Three halvings later, one fresh use still beats two 45 minute old ones
+    trends.record(["newer"])
+    assert trends.top(2) == [{"tag": "new", "count": 2}, {"tag": "newer", "count": 1}]
+
+# Test that the top list is a snapshot refreshed on an interval
+def test_top_is_cached_between_refreshes():
+    clock = FakeClock()
+    trends = make_trends(clock, refresh_seconds=5)
+
+    trends.record(["first"])
+    assert trends.top() == [{"tag": "first", "count": 1}]
+
+    trends.record(["second", "second"])
+    assert trends.top() == [{"tag": "first", "count": 1}]
+
+    clock.now += 5
+    assert trends.top()[0] == {"tag": "second", "count": 2}
+
+# Test that rescaling the decay weights keeps the ranking
+def test_rescaling_keeps_ranking():
+    clock = FakeClock()
+    trends = make_trends(clock, half_life_minutes=1, window_minutes=120)
+
+    trends.record(["steady"] * 3)
+    clock.advance(70)  # past RESCALE_HALVINGS half-lives
+    trends.record(["late"])
+
+    assert trends.top() == [{"tag": "late", "count": 1}, {"tag": "steady", "count": 3}]
+
+# Test that bucket snapshots survive a restart
+def test_snapshot_round_trip(tmp_path):
+    clock = FakeClock()
+    trends = make_trends(clock)
+    trends.record(["python", "python", "sqlite"])
+    clock.advance(10)
+    trends.record(["sqlite"])
+
+    path = str(tmp_path / "trends.json")
+    trends.save_snapshot(path)
+
+    restored = make_trends(clock)
+    restored.load_snapshot(path)
+    assert restored.top() == trends.top()
+
+    # Buckets that expired while the server was down are dropped
+    clock.advance(55)
+    restored = make_trends(clock)
+    restored.load_snapshot(path)
+    assert restored.top() == [{"tag": "sqlite", "count": 1}]
+
+    # A missing or corrupt snapshot starts empty
+    restored.load_snapshot(str(tmp_path / "missing.json"))
+    (tmp_path / "corrupt.json").write_text("{not json")
+    restored.load_snapshot(str(tmp_path / "corrupt.json"))
+
+# Test that workers sharing a snapshot each serve the uses of all of them
+def test_snapshot_merges_workers(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "trends.json")
+    workers = [make_trends(clock) for _ in range(3)]
+    workers[0].record(["python", "python"])
+    workers[1].record(["python", "sqlite"])
+    workers[2].record(["sqlite"])
+    for worker in workers + workers[:2]:
+        worker.save_snapshot(path)
+
+    expected = [{"tag": "python", "count": 3}, {"tag": "sqlite", "count": 2}]
+    assert [worker.top() for worker in workers] == [expected] * 3
+
+    # Saving again adds nothing, and a restarted worker picks up the total
+    workers[0].save_snapshot(path)
+    restored = make_trends(clock)
+    restored.load_snapshot(path)
+    assert restored.top() == expected
+
+    # Concurrent saves don't lose each other's uses
+    def record_and_save(worker):
+        for _ in range(50):
+            worker.record(["fastapi"])
+            worker.save_snapshot(path)
+    threads = [threading.Thread(target=record_and_save, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    restored.load_snapshot(path)
+    assert restored.top()[0] == {"tag": "fastapi", "count": 150}
+
+# Test the endpoint fed by tweet creation
+def test_trends_endpoint(monkeypatch):
+    previous_override = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+
+    trends = make_trends(FakeClock())
+    monkeypatch.setattr(tweet, "trending_hashtags", trends)
+    monkeypatch.setattr("app.routers.trends.trending_hashtags", trends)
+
+    try:
+        db = TestingSessionLocal()
+        db.add(User(username="user1", email="user1@example.com", hashed_password=get_password_hash("password1")))
+        db.commit()
+        db.close()
+
+        token = client.post("/api/users/login", json={"username": "user1", "password": "password1"}).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        for content in ("Learning #FastAPI", "More #fastapi and #SQLite", "Just #sqlite", "#fastapi again"):
+            client.post("/api/tweets/", headers=headers, json={"content": content})
+
+        response = client.get("/api/trends/")
+        assert response.status_code == 200
+        assert response.json() == [{"tag": "fastapi", "count": 3}, {"tag": "sqlite", "count": 2}]
+        assert client.get("/api/trends/?limit=1").json() == [{"tag": "fastapi", "count": 3}]
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        if previous_override is None:
+            app.dependency_overrides.pop(get_db, None)
+        else:
+            app.dependency_overrides[get_db] = previous_override
@@ -48,9 +48,15 @@ const Tweet = ({ tweet, isDetailView = false }) => {
   const navigate = useNavigate();
   const [localTweet, setLocalTweet] = useState(tweet);
   
-  // Update local state when tweet prop changes
+  // Update local state when tweet prop changes. Fetched tweets carry this
+  // user's current reaction; streamed counts don't, so the one they just
+  // made is kept
   useEffect(() => {
-    setLocalTweet(tweet);
+    setLocalTweet((prev) =>
+      prev.id === tweet.id && tweet.user_reaction === undefined
+        ? { ...tweet, user_reaction: prev.user_reaction }
+        : tweet
+    );
   }, [tweet]);
   
   // Use author_username if available (from backend API), fallback to username for compatibility
@@ -181,7 +187,7 @@ const Tweet = ({ tweet, isDetailView = false }) => {
           <Col xs={2} md={1}>
             <Link to={`/profile/${username}`} onClick={(e) => e.stopPropagation()}>
               <Image 
-                src={tweet.profile_image || defaultAvatarImg} 
+                src={(localTweet.author && localTweet.author.avatar_thumbnail) || defaultAvatarImg} 
                 className="avatar" 
                 alt={`${username}'s avatar`} 
               />
@@ -34,8 +34,39 @@ const Home = ({ currentUser }) => {
     fetchTweets();
   }, []);
 
+  // Show new tweets and reaction counts as they happen instead of re-polling
+  useEffect(() => {
+    return TweetService.subscribeToEvents({
+      onTweet: (tweet) => {
+        if (tweet.parent_id !== null) {
+          return;
+        }
+        setTweets((current) =>
+          current.some((t) => t.id === tweet.id) ? current : [tweet, ...current]
+        );
+      },
+      onReaction: (counts) => {
+        // Without the fetched user_reaction, which may be older than the
+        // reaction made since, so Tweet keeps its own
+        setTweets((current) =>
+          current.map((t) => {
+            if (t.id !== counts.tweet_id) {
+              return t;
+            }
+            const { user_reaction, ...rest } = t;
+            return { ...rest, likes_count: counts.likes_count, dislikes_count: counts.dislikes_count };
+          })
+        );
+      },
+      // Events sent while disconnected are lost, so reload the feed
+      onReconnect: fetchTweets,
+    });
+  }, []);
+
   const handleTweetAdded = (newTweet) => {
-    setTweets([newTweet, ...tweets]);
+    setTweets((current) =>
+      current.some((t) => t.id === newTweet.id) ? current : [newTweet, ...current]
+    );
   };
 
   return (
@@ -166,7 +166,7 @@ const Profile = ({ currentUser }) => {
       .then(
         (response) => {
           setShowImageModal(false);
-          setProfile({...profile, profile_image: response.data.profile_image});
+          setProfile({...profile, profile_image: response.data.profile_picture});
           setSuccessMessage("Profile picture updated successfully!");
           setTimeout(() => setSuccessMessage(""), 3000);
         },
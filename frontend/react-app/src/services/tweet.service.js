@@ -3,8 +3,11 @@ import authHeader from "./auth-header";
 
 const API_URL = "/api";
 
+// Listings embed each tweet's author, avatar included, so no profile is fetched per author
+const LISTING_PARAMS = { expand: "author" };
+
 const getAllTweets = () => {
-  return axios.get(API_URL + "/tweets/", { headers: authHeader() });
+  return axios.get(API_URL + "/tweets/", { headers: authHeader(), params: LISTING_PARAMS });
 };
 
 const createTweet = (content, parentId = null) => {
@@ -16,7 +19,7 @@ const createTweet = (content, parentId = null) => {
 };
 
 const getUserTweets = (username) => {
-  return axios.get(API_URL + `/tweets/user/${username}`, { headers: authHeader() });
+  return axios.get(API_URL + `/tweets/user/${username}`, { headers: authHeader(), params: LISTING_PARAMS });
 };
 
 const getTweet = (tweetId) => {
@@ -31,12 +34,29 @@ const reactToTweet = (tweetId, reactionType) => {
   );
 };
 
+// Streams new tweets and reaction counts; returns a function closing the stream.
+// EventSource reconnects by itself, after which onReconnect should reload.
+const subscribeToEvents = ({ onTweet, onReaction, onReconnect }) => {
+  const source = new EventSource(API_URL + "/events/");
+  let connected = false;
+  source.onopen = () => {
+    if (connected && onReconnect) {
+      onReconnect();
+    }
+    connected = true;
+  };
+  source.addEventListener("tweet", (event) => onTweet(JSON.parse(event.data)));
+  source.addEventListener("reaction", (event) => onReaction(JSON.parse(event.data)));
+  return () => source.close();
+};
+
 const TweetService = {
   getAllTweets,
   createTweet,
   getUserTweets,
   getTweet,
   reactToTweet,
+  subscribeToEvents,
 };
 
 export default TweetService;
\ No newline at end of file